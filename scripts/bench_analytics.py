@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de los indicadores de tendencia (`src/rag/analytics.py`).
+
+Genera una serie sintética (N años × M monedas), mide el precálculo completo,
+la actualización incremental al ingerir un día nuevo por moneda y el costo de
+`resumen` para un rango, y verifica que lo incremental coincida con un recálculo
+desde cero.
+
+    python -m scripts.bench_analytics --anios 10 --monedas 27
+"""
+
+import argparse
+import datetime
+import time
+
+import numpy as np
+
+from src.rag.analytics import RateAnalytics
+from src.rag.timeseries import RateHistoryStore
+
+CAMPOS = ("var_diaria", "var_pct", "min_movil", "max_movil", "media_movil", "volatilidad",
+          "acum", "acum_ret", "acum_ret2", "n_ret")
+
+
+def _serie(rng, dias: int) -> np.ndarray:
+    return 5000 + np.cumsum(rng.normal(0, 8, dias))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--anios", type=int, default=10)
+    ap.add_argument("--monedas", type=int, default=27)
+    ap.add_argument("-n", type=int, default=20000, help="consultas de resumen a medir")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    dias = args.anios * 365
+    inicio = datetime.date(2000, 1, 1)
+    fechas = [inicio + datetime.timedelta(days=i) for i in range(dias + 1)]
+    monedas = [f"M{i:02d}" for i in range(args.monedas)]
+    series = {m: _serie(rng, dias + 1) for m in monedas}
+
+    historial = RateHistoryStore()
+    historial.add_many((m, fechas[i], series[m][i]) for m in monedas for i in range(dias))
+    analitica = RateAnalytics(historial)
+    t = time.perf_counter()
+    analitica.actualizar()
+    print(f"precálculo completo: {(time.perf_counter() - t) * 1e3:.1f} ms "
+          f"({len(monedas)} monedas × {dias} cotizaciones)")
+
+    historial.add_many((m, fechas[dias], series[m][dias]) for m in monedas)
+    antes = analitica.recalculados
+    t = time.perf_counter()
+    analitica.actualizar()
+    print(f"ingesta de un día:   {(time.perf_counter() - t) * 1e3:.1f} ms "
+          f"({analitica.recalculados - antes} cotizaciones recalculadas)")
+
+    completo = RateAnalytics(historial)
+    completo.actualizar()
+    for m in monedas:
+        a, b = analitica._indicadores[m], completo._indicadores[m]
+        for campo in CAMPOS:
+            assert np.allclose(getattr(a, campo), getattr(b, campo), equal_nan=True), (m, campo)
+    print("incremental == recálculo completo: ok")
+
+    desde, hasta = fechas[dias - 30], fechas[dias]
+    t = time.perf_counter()
+    for i in range(args.n):
+        analitica.resumen(monedas[i % len(monedas)], desde, hasta)
+    print(f"resumen de 30 días:  {(time.perf_counter() - t) / args.n * 1e6:.1f} µs por consulta")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark del modo compartido entre workers (`src/rag/embedding_service.py`).
+
+1. Micro-batching: C clientes concurrentes piden encodes de una consulta cada uno
+   al servicio, con batching (`--max-batch`) y sin él (batch de 1). El encoder simula
+   un costo fijo por llamada más un costo por texto, como un modelo real.
+2. Memoria: W procesos "worker" abren el mismo vectorstore (mmap) con `RemoteEncoder`
+   y hacen una consulta; se informa RSS y PSS (la parte proporcional de las páginas
+   compartidas) por worker, que debería mantenerse plana al aumentar W.
+
+    python -m scripts.bench_embedding_service -c 16 -n 200 --workers 1 2 4 --docs 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from scripts.fakes import FakeEmbedder
+from src.rag.embedding_service import EmbeddingServer, RemoteEncoder
+from src.rag.vectorstore import SimpleVectorStore
+
+
+def _servidor(modelo, path: str, max_batch: int, max_wait_ms: float) -> EmbeddingServer:
+    servidor = EmbeddingServer(modelo, path, max_batch, max_wait_ms, model_name="fake")
+    listo = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(servidor.serve_forever(listo)), daemon=True).start()
+    listo.wait(10)
+    return servidor
+
+
+def _micro_batching(args, tmp: str):
+    print(f"micro-batching: {args.clientes} clientes × {args.n} encodes de 1 texto "
+          f"(costo {args.costo_llamada_ms} ms por llamada + {args.costo_texto_ms} ms por texto)")
+    print(f"{'modo':<22}{'encodes/s':>11}{'p50':>10}{'p95':>10}{'textos/batch':>14}")
+    for nombre, max_batch in (("sin batching", 1), (f"batch <= {args.max_batch}", args.max_batch)):
+        modelo = FakeEmbedder(costo_ms=args.costo_texto_ms, costo_llamada_ms=args.costo_llamada_ms)
+        path = os.path.join(tmp, f"emb-{max_batch}.sock")
+        servidor = _servidor(modelo, path, max_batch, args.max_wait_ms)
+        cliente = RemoteEncoder(path)
+        latencias = []
+
+        def trabajador(i):
+            for j in range(args.n):
+                t0 = time.perf_counter()
+                cliente.encode([f"cotización del dólar consulta {i}-{j}"])
+                latencias.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.clientes) as pool:
+            list(pool.map(trabajador, range(args.clientes)))
+        segundos = time.perf_counter() - t0
+        stats = servidor.stats()
+        print(f"{nombre:<22}{len(latencias) / segundos:>11.0f}{np.percentile(latencias, 50):>8.2f}ms"
+              f"{np.percentile(latencias, 95):>8.2f}ms{stats['textos_por_batch']:>14.1f}")
+
+
+_WORKER = r"""
+import json, sys
+from src.rag.embedding_service import RemoteEncoder
+from src.rag.vectorstore import SimpleVectorStore
+vs = SimpleVectorStore(model_name="fake", model=RemoteEncoder(sys.argv[2], model_name="fake"))
+vs.load(sys.argv[1])
+vs.query("cotización del dólar", k=3)
+memoria = {}
+with open("/proc/self/smaps_rollup") as f:
+    for linea in f:
+        clave, _, valor = linea.partition(":")
+        if clave in ("Rss", "Pss"):
+            memoria[clave] = int(valor.split()[0]) / 1024
+print(json.dumps(memoria), flush=True)
+sys.stdin.read()   # seguir vivo hasta que terminen los demás
+"""
+
+
+def _memoria(args, tmp: str):
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("memoria: requiere Linux (/proc/self/smaps_rollup)")
+        return
+    path = os.path.join(tmp, "vectorstore")
+    store = SimpleVectorStore(model_name="fake", model=FakeEmbedder())
+    rng = np.random.default_rng(0)
+    docs = [{"id": str(i), "text": f"doc {i}", "meta": {"moneda": "USD"}} for i in range(args.docs)]
+    store.upsert(docs, embeddings=rng.standard_normal((args.docs, 384), dtype=np.float32))
+    store.save(path)
+    matriz_mb = args.docs * 384 * 4 / 2**20
+    sock = os.path.join(tmp, "emb-mem.sock")
+    _servidor(FakeEmbedder(), sock, args.max_batch, args.max_wait_ms)
+
+    print(f"\nmemoria por worker: {args.docs} docs, matriz de {matriz_mb:.0f} MB en mmap, encode remoto")
+    print(f"{'workers':>8}{'RSS medio':>12}{'PSS medio':>12}")
+    for w in args.workers:
+        procs = [subprocess.Popen([sys.executable, "-c", _WORKER, path, sock], stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE, text=True) for _ in range(w)]
+        medidas = [json.loads(p.stdout.readline()) for p in procs]
+        for p in procs:
+            p.communicate("")
+        print(f"{w:>8}{np.mean([m['Rss'] for m in medidas]):>10.1f}MB{np.mean([m['Pss'] for m in medidas]):>10.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--clientes", type=int, default=16)
+    parser.add_argument("-n", type=int, default=200, help="encodes por cliente")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--costo-llamada-ms", type=float, default=3.0)
+    parser.add_argument("--costo-texto-ms", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--docs", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_emb_") as tmp:
+        _micro_batching(args, tmp)
+        _memoria(args, tmp)
+
+
+if __name__ == "__main__":
+    main()
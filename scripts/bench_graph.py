@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de latencia del grafo del agente: antes (grafo lineal compilado en cada
+request, todos los nodos siempre) vs después (grafo compilado una vez con ruteo condicional).
+
+El scraping, la búsqueda vectorial y el LLM se simulan con latencias fijas para aislar
+el costo del grafo y el efecto de saltear nodos:
+
+    python -m scripts.bench_graph --fetch-ms 80 --rag-ms 15 --llm-ms 0 -n 200
+"""
+
+import argparse
+import datetime
+import statistics
+import time
+from functools import partial
+
+from langgraph.graph import StateGraph, END
+
+from src import agent
+
+PREGUNTAS = {
+    "hoy": "cual es la cotizacion del dólar hoy",
+    "fecha pasada": "cotización del real el 8 de agosto",
+    "abierta": "como estuvo el euro estos días",
+}
+
+
+class _FakeVectorStore:
+    def __init__(self, latencia: float):
+        self.latencia = latencia
+
+    def query(self, text, k=3):
+        time.sleep(self.latencia)
+        fecha = (datetime.date.today() - datetime.timedelta(days=3)).strftime("%Y-%m-%d")
+        return [{"score": 1.0, "doc": {"text": f"El {fecha} la cotización fue 1000 guaraníes."}}]
+
+
+class _FakeMCP:
+    def __init__(self, latencia: float):
+        self.latencia = latencia
+
+    def call(self, name, **kwargs):
+        time.sleep(self.latencia)
+        return "análisis"
+
+
+def _grafo_lineal(question, vectorstore, mcp):
+    """Reproduce el constructor anterior: un StateGraph nuevo y compilado por pregunta."""
+    workflow = StateGraph(agent.AgentState)
+    workflow.add_node("fetch", agent.fetch_cotizaciones)
+    workflow.add_node("process", agent.procesar_datos)
+    workflow.add_node("rag", lambda s: agent.rag_lookup(s, vectorstore))
+    workflow.add_node("analyze", lambda s: agent.analizar_con_llm(s, mcp))
+    workflow.set_entry_point("fetch")
+    workflow.add_edge("fetch", "process")
+    workflow.add_edge("process", "rag")
+    workflow.add_edge("rag", "analyze")
+    workflow.add_edge("analyze", END)
+    return workflow.compile(), agent.estado_inicial(question)
+
+
+def _medir(fn, n):
+    tiempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return statistics.mean(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=100, help="requests por escenario")
+    parser.add_argument("--fetch-ms", type=float, default=80.0, help="latencia simulada de Cambios Chaco")
+    parser.add_argument("--rag-ms", type=float, default=15.0, help="latencia simulada de encode + búsqueda")
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="latencia simulada del LLM")
+    args = parser.parse_args()
+
+    def fake_cotizacion(moneda):
+        time.sleep(args.fetch_ms / 1000)
+        return {"source": "html", "result": {"result": {"moneda": moneda, "compra": 1.0, "venta": 2.0}, "source": "Cambios Chaco"}}
+
+    agent.get_cotizacion = fake_cotizacion
+    vs = _FakeVectorStore(args.rag_ms / 1000)
+    mcp = _FakeMCP(args.llm_ms / 1000)
+    compilado = agent.build_currency_agent_graph(vectorstore=vs, mcp=mcp)
+
+    def antes(q):
+        graph, init = _grafo_lineal(q, vs, mcp)
+        graph.invoke(init)
+
+    def despues(q):
+        compilado.invoke(agent.estado_inicial(q))
+
+    print(f"{'escenario':<14}{'antes media':>13}{'antes p95':>11}{'después media':>16}{'después p95':>13}")
+    for nombre, q in PREGUNTAS.items():
+        a_mean, a_p95 = _medir(partial(antes, q), args.n)
+        d_mean, d_p95 = _medir(partial(despues, q), args.n)
+        print(f"{nombre:<14}{a_mean:>11.2f}ms{a_p95:>9.2f}ms{d_mean:>14.2f}ms{d_p95:>11.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
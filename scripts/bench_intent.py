@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark y corpus dorado del parser de intención (`src/intent.py`).
+
+1. Verifica `parse_intent` contra `scripts/intent_corpus.jsonl` (cada línea fija el
+   "hoy" de referencia y la moneda, monedas, fecha, rango y tipo esperados; las
+   conversiones también el monto, el origen y el destino).
+2. Compara el costo por pregunta de los detectores anteriores (`detectar_moneda` +
+   `detectar_fecha` del agente y `_normalize_moneda` de la herramienta, copiados abajo)
+   contra `parse_intent` sin cache.
+
+    python -m scripts.bench_intent -n 20000
+
+Termina con código 1 si alguna entrada del corpus no coincide.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import time
+from typing import Optional
+
+from src.intent import _parse
+
+CORPUS = os.path.join(os.path.dirname(__file__), "intent_corpus.jsonl")
+CAMPOS = ("moneda", "monedas", "fecha", "desde", "hasta", "tipo", "monto", "origen", "destino")
+
+
+# --- Implementación anterior (referencia para el benchmark) ---
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
+    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12
+}
+
+def viejo_detectar_moneda(texto: str) -> str:
+    mapping = {
+        "dólar": "USD", "usd": "USD",
+        "yen": "JPY", "jpy": "JPY",
+        "libra": "GBP", "gbp": "GBP",
+        "franco suizo": "CHF", "chf": "CHF",
+        "corona sueca": "SEK", "sek": "SEK",
+        "corona danesa": "DKK", "dkk": "DKK",
+        "corona noruega": "NOK", "nok": "NOK",
+        "real": "BRL", "brl": "BRL",
+        "peso argentino": "ARS", "ars": "ARS",
+        "dólar canadiense": "CAD", "cad": "CAD",
+        "rand": "ZAR", "zar": "ZAR",
+        "derechos especiales de giro": "XDR", "deg": "XDR", "xdr": "XDR",
+        "onza de oro": "XAU", "oro": "XAU", "xau": "XAU",
+        "peso chileno": "CLP", "clp": "CLP",
+        "euro": "EUR", "eur": "EUR",
+        "peso uruguayo": "UYU", "uyu": "UYU",
+        "dólar australiano": "AUD", "aud": "AUD",
+        "yuan": "CNY", "renminbi": "CNY", "cny": "CNY",
+        "dólar de singapur": "SGD", "sgd": "SGD",
+        "boliviano": "BOB", "bob": "BOB",
+        "sol peruano": "PEN", "pen": "PEN",
+        "dólar neozelandés": "NZD", "nzd": "NZD",
+        "peso mexicano": "MXN", "mxn": "MXN",
+        "peso colombiano": "COP", "cop": "COP",
+        "dólar taiwanés": "TWD", "twd": "TWD",
+        "dirham": "AED", "emiratos": "AED", "aed": "AED"
+    }
+    texto = texto.lower()
+    for k, v in mapping.items():
+        if k in texto:
+            return v
+    return "USD"  # por defecto
+
+def viejo_detectar_fecha(texto: str) -> Optional[str]:
+    hoy = datetime.date.today()
+    texto = texto.lower().strip()
+
+    # Palabras clave
+    if "hoy" in texto:
+        return hoy.strftime("%Y-%m-%d")
+    elif "ayer" in texto:
+        return (hoy - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+    # Formato DD/MM/YYYY o DD-MM-YYYY
+    match = re.search(r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})", texto)
+    if match:
+        d, m, y = map(int, match.groups())
+        try:
+            return datetime.date(y, m, d).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+
+    # Formato YYYY-MM-DD
+    match_iso = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", texto)
+    if match_iso:
+        y, m, d = map(int, match_iso.groups())
+        try:
+            return datetime.date(y, m, d).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+
+    # Formato DD-MM (sin año)
+    match_short = re.search(r"(\d{1,2})[/-](\d{1,2})", texto)
+    if match_short:
+        d, m = map(int, match_short.groups())
+        try:
+            return datetime.date(hoy.year, m, d).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+
+    # Formato "11 de agosto" o "11 agosto"
+    match_texto = re.search(r"(\d{1,2})\s*(de\s*)?([a-záéíóú]+)", texto)
+    if match_texto:
+        d = int(match_texto.group(1))
+        mes_texto = match_texto.group(3).strip()
+        if mes_texto in MESES:
+            try:
+                return datetime.date(hoy.year, MESES[mes_texto], d).strftime("%Y-%m-%d")
+            except ValueError:
+                return None
+
+    # Formato "agosto 11"
+    match_texto_inv = re.search(r"([a-záéíóú]+)\s*(\d{1,2})", texto)
+    if match_texto_inv:
+        mes_texto = match_texto_inv.group(1).strip()
+        d = int(match_texto_inv.group(2))
+        if mes_texto in MESES:
+            try:
+                return datetime.date(hoy.year, MESES[mes_texto], d).strftime("%Y-%m-%d")
+            except ValueError:
+                return None
+
+    return None
+
+def viejo_normalize_moneda(moneda: str) -> str:
+    m = moneda.strip().lower()
+    mapping = {
+        'USD': ['dólar', 'dolar', 'usd', 'dollar', 'dólar usa', 'dolar usa'],
+        'JPY': ['yen', 'jpy', 'yen japonés', 'yen japones'],
+        'GBP': ['libra', 'gbp', 'libra esterlina'],
+        'CHF': ['franco suizo', 'chf'],
+        'SEK': ['corona sueca', 'sek'],
+        'DKK': ['corona danesa', 'dkk'],
+        'NOK': ['corona noruega', 'nok'],
+        'BRL': ['real', 'brl', 'real brasileño'],
+        'ARS': ['peso argentino', 'ars'],
+        'CAD': ['dólar canadiense', 'cad'],
+        'ZAR': ['rand', 'zar'],
+        'XDR': ['derechos especiales de giro', 'deg', 'xdr'],
+        'XAU': ['onza de oro', 'oro', 'xau'],
+        'CLP': ['peso chileno', 'clp'],
+        'EUR': ['euro', 'eur'],
+        'UYU': ['peso uruguayo', 'uyu'],
+        'AUD': ['dólar australiano', 'aud'],
+        'CNY': ['yuan', 'renminbi', 'cny', 'yuan chino'],
+        'SGD': ['dólar de singapur', 'sgd'],
+        'BOB': ['boliviano', 'bob'],
+        'PEN': ['sol peruano', 'pen'],
+        'NZD': ['dólar neozelandés', 'nzd'],
+        'MXN': ['peso mexicano', 'mxn'],
+        'COP': ['peso colombiano', 'cop'],
+        'TWD': ['dólar taiwanés', 'twd'],
+        'AED': ['dirham', 'emiratos', 'aed'],
+        'PYG': ['guaraní', 'guarani', 'gs', 'pyg']
+    }
+    
+    for iso, aliases in mapping.items():
+        if m in aliases or any(alias in m for alias in aliases):
+            return iso
+    return m.upper()  # Si no se reconoce, devolver en mayúsculas por si ya es ISO
+
+
+def verificar_corpus() -> int:
+    fallas = 0
+    with open(CORPUS, encoding="utf-8") as f:
+        filas = [json.loads(linea) for linea in f if linea.strip()]
+    for fila in filas:
+        intent = _parse(fila["texto"], datetime.date.fromisoformat(fila["hoy"]))
+        obtenido = {c: list(getattr(intent, c)) if c == "monedas" else getattr(intent, c) for c in CAMPOS}
+        esperado = {c: fila.get(c) for c in CAMPOS}
+        if obtenido != esperado:
+            fallas += 1
+            print(f"FALLA {fila['texto']!r}\n  esperado {esperado}\n  obtenido {obtenido}")
+    print(f"corpus: {len(filas) - fallas}/{len(filas)} correctas")
+    return fallas
+
+
+def _medir(fn, textos, n, repeticiones=5) -> float:
+    """Mejor de `repeticiones` corridas, en µs por pregunta."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(textos[i % len(textos)])
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=20000, help="preguntas a analizar por variante")
+    args = parser.parse_args()
+
+    fallas = verificar_corpus()
+    with open(CORPUS, encoding="utf-8") as f:
+        textos = [json.loads(linea)["texto"] for linea in f if linea.strip()]
+
+    def antes(q):
+        moneda = viejo_detectar_moneda(q)
+        viejo_detectar_fecha(q)
+        viejo_normalize_moneda(moneda)
+
+    hoy = datetime.date.today()
+    sin_cache = _parse.__wrapped__
+    a = _medir(antes, textos, args.n)
+    d = _medir(lambda q: sin_cache(q, hoy), textos, args.n)
+    c = _medir(lambda q: _parse(q, hoy), textos, args.n)
+    print(f"antes (3 detectores): {a:8.2f} µs/pregunta")
+    print(f"parse_intent:         {d:8.2f} µs/pregunta ({a / d:.1f}x)")
+    print(f"parse_intent (cache): {c:8.2f} µs/pregunta")
+    if fallas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de punta a punta con dobles locales (ver `scripts/fakes.py`):
+Cambios Chaco (JSON y PDF) en un servidor HTTP local, Gemini reemplazado por
+`FakeGenAI` y embeddings por `FakeEmbedder` sobre una serie BCP sintética.
+
+Objetivos:
+- `api`: la app FastAPI servida por uvicorn en un proceso aparte (POST /ask).
+- `agent`: `CurrencyAgent.answer` en este proceso, con un pool de hilos.
+
+Cargas: `hoy`, `historico`, `tendencia` y `mixto` (incluye conversiones y preguntas
+abiertas que van al LLM). Reporta requests/s, p50/p95/p99, errores y RSS, y agrega
+cada resultado a `--resultados` (JSONL, con el commit) para comparar entre commits:
+
+    python -m scripts.bench_load --objetivo api --carga mixto -n 500 -c 16
+    python -m scripts.bench_load --objetivo ambos --carga todas --upstream-ms 80 --upstream-errores 0.05
+    python -m scripts.bench_load --objetivo api --carga hoy --comparar --umbral 10
+
+Con `--comparar` se compara contra la última corrida de otro commit con los mismos
+parámetros (o contra `--base COMMIT`); con `--umbral PCT` termina con código 1 si
+requests/s baja o p95 sube más de ese porcentaje.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from scripts.fakes import FakeChaco, FakeEmbedder, FakeGenAI, serie_sintetica, vectorstore_sintetico
+
+CARGAS = ("hoy", "historico", "tendencia", "mixto")
+NOMBRES = ["dólar", "euro", "real", "peso argentino", "libra", "yen", "franco suizo", "dólar canadiense"]
+PLANTILLAS = {
+    "hoy": ["cotización del {m} hoy", "precio del {m}", "a cuánto está el {m} hoy"],
+    "historico": ["cotización del {m} el {f}", "precio del {m} {f}"],
+    "tendencia": ["cómo estuvo el {m} estos días", "cómo evolucionó el {m} la semana pasada",
+                  "variación del {m} en los últimos 30 días"],
+    "conversion": ["cuántos reales son {x} dólares", "{x} euros a guaraníes", "convertir {x} dólares a pesos argentinos"],
+    "abierta": ["qué pasará con el {m} la semana que viene", "conviene comprar {m} ahora"],
+}
+MEZCLA = {"hoy": 0.4, "historico": 0.2, "tendencia": 0.2, "conversion": 0.1, "abierta": 0.1}
+DIAS_SERIE = 250
+
+
+def preguntas(carga: str, n: int, seed: int = 0) -> List[str]:
+    """Preguntas determinísticas de una carga (misma semilla, misma secuencia)."""
+    rng = random.Random(seed)
+    fechas = sorted({f for f, _, _ in serie_sintetica(60)})
+    tipos = list(MEZCLA) if carga == "mixto" else [carga]
+    pesos = [MEZCLA[t] for t in tipos]
+    salida = []
+    for _ in range(n):
+        tipo = rng.choices(tipos, pesos)[0]
+        fecha = datetime.date.fromisoformat(rng.choice(fechas)).strftime("%d/%m/%Y")
+        salida.append(rng.choice(PLANTILLAS[tipo]).format(m=rng.choice(NOMBRES), f=fecha,
+                                                          x=rng.choice([10, 100, 250, 1000])))
+    return salida
+
+
+def _percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class _MuestreoRSS:
+    """Pico de RSS de un proceso, muestreado en un hilo mientras corre la carga (Linux)."""
+
+    def __init__(self, pid: int, intervalo: float = 0.1):
+        self.pid, self.intervalo = pid, intervalo
+        self.pico: Optional[float] = None
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._fin.is_set():
+            rss = _rss_mb(self.pid)
+            if rss is not None:
+                self.pico = max(self.pico or 0.0, rss)
+            self._fin.wait(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._fin.set()
+        self._hilo.join()
+
+
+def _resumen(latencias: List[float], errores: int, segundos: float) -> dict:
+    ordenadas = sorted(latencias)
+    return {
+        "requests": len(latencias),
+        "errores": errores,
+        "rps": len(latencias) / segundos if segundos else 0.0,
+        "p50_ms": _percentil(ordenadas, 50),
+        "p95_ms": _percentil(ordenadas, 95),
+        "p99_ms": _percentil(ordenadas, 99),
+        "max_ms": ordenadas[-1] if ordenadas else 0.0,
+    }
+
+
+# --- Objetivo: API ---
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _servir(args):
+    """Proceso hijo: instala los dobles de Gemini y embeddings y sirve `src.api` con uvicorn."""
+    import uvicorn
+
+    import src.mcp
+    src.mcp._genai = FakeGenAI(args.llm_ms, args.llm_errores)
+    from src import api
+    api.vs.model = FakeEmbedder(costo_ms=args.embed_ms)
+    uvicorn.run(api.app, host="127.0.0.1", port=args.servir, log_level="warning")
+
+
+async def _cargar_api(url: str, qs: List[str], concurrencia: int):
+    import httpx
+
+    latencias, errores = [], 0
+    pendientes = iter(qs)
+
+    async def trabajador(cliente):
+        nonlocal errores
+        for q in pendientes:
+            t0 = time.perf_counter()
+            try:
+                r = await cliente.post(url + "/ask", json={"question": q})
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencias.append((time.perf_counter() - t0) * 1000)
+            errores += not ok
+
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(timeout=60, limits=limites) as cliente:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(trabajador(cliente) for _ in range(concurrencia)))
+        return latencias, errores, time.perf_counter() - t0
+
+
+def correr_api(args, chaco: FakeChaco, tmp: str, cargas: List[str]) -> List[dict]:
+    puerto = _puerto_libre()
+    env = {**os.environ,
+           "CHACO_API_URL": chaco.url_base, "CHACO_PDF_URL": chaco.url_pdf,
+           "CHACO_CACHE_TTL": str(args.chaco_ttl),
+           "VECTORSTORE_PATH": os.path.join(tmp, "data", "vectorstore"),
+           "LLM_CACHE_PATH": os.path.join(tmp, "llm_cache.sqlite"),
+           "LLM_CUPO_PATH": os.path.join(tmp, "llm_cupo.sqlite"),
+           "EMBEDDINGS_WARMUP": "0", "LLM_BACKEND": "gemini", "GOOGLE_API_KEY": "fake",
+           # sin los cupos gratuitos de Gemini: se mide la app, no el rate limit
+           "LLM_RPM": "1000000", "LLM_RPD": "1000000", "LLM_MAX_CONCURRENCY": str(args.llm_concurrencia)}
+    cmd = [sys.executable, "-m", "scripts.bench_load", "--servir", str(puerto),
+           "--llm-ms", str(args.llm_ms), "--llm-errores", str(args.llm_errores), "--embed-ms", str(args.embed_ms)]
+    proc = subprocess.Popen(cmd, env=env)
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        _esperar_listo(url, proc)
+        resultados = []
+        for carga in cargas:
+            asyncio.run(_cargar_api(url, preguntas(carga, args.calentamiento, seed=args.seed + 1), args.concurrencia))
+            with _MuestreoRSS(proc.pid) as rss:
+                latencias, errores, segundos = asyncio.run(
+                    _cargar_api(url, preguntas(carga, args.n, seed=args.seed), args.concurrencia))
+            resultados.append({"objetivo": "api", "carga": carga, **_resumen(latencias, errores, segundos),
+                               "rss_mb": _rss_mb(proc.pid), "rss_pico_mb": rss.pico})
+        return resultados
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _esperar_listo(url: str, proc: subprocess.Popen, limite: float = 60.0):
+    import httpx
+
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proc.poll() is not None:
+            raise RuntimeError(f"la API terminó al arrancar (código {proc.returncode})")
+        try:
+            if httpx.get(url + "/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("la API no respondió /health a tiempo")
+
+
+# --- Objetivo: CurrencyAgent.answer ---
+def _agente(args, chaco: FakeChaco):
+    import src.mcp
+    from src.agent_api import CurrencyAgent
+    from src.llm import GeminiBackend, LLMGateway, set_gateway
+    from src.mcp import MCPRegistry
+    from src.rag.vectorstore import SimpleVectorStore
+    from src.tools import cotizaciones_tool as ct
+
+    ct.URL_BASE, ct.URL_PDF = chaco.url_base, chaco.url_pdf
+    ct._pdf_cache.url = chaco.url_pdf
+    ct._chaco_cache.ttl = args.chaco_ttl
+    src.mcp._genai = FakeGenAI(args.llm_ms, args.llm_errores)
+    set_gateway(LLMGateway(GeminiBackend(), max_concurrency=args.llm_concurrencia, rpm=1e6, rpd=1e6,
+                            cupo_path=os.environ.get("LLM_CUPO_PATH")))
+    os.environ.setdefault("GOOGLE_API_KEY", "fake")
+    mcp = MCPRegistry()
+    mcp.register("cotizaciones.get_cotizacion_html", ct.find_cotizacion_html)
+    mcp.register("cotizaciones.get_cotizacion_pdf", ct.find_cotizacion_pdf)
+    return CurrencyAgent(mcp, vectorstore=SimpleVectorStore(model=FakeEmbedder(costo_ms=args.embed_ms)))
+
+
+def _cargar_agente(agente, qs: List[str], concurrencia: int):
+    latencias, errores = [], 0
+    lock = threading.Lock()
+
+    def una(q):
+        nonlocal errores
+        t0 = time.perf_counter()
+        try:
+            ok = agente.answer(q).get("type") != "error"
+        except Exception:
+            ok = False
+        with lock:
+            latencias.append((time.perf_counter() - t0) * 1000)
+            errores += not ok
+
+    with ThreadPoolExecutor(concurrencia) as pool:
+        t0 = time.perf_counter()
+        list(pool.map(una, qs))
+        return latencias, errores, time.perf_counter() - t0
+
+
+def correr_agente(args, chaco: FakeChaco, tmp: str, cargas: List[str]) -> List[dict]:
+    agente = _agente(args, chaco)
+    anterior = os.getcwd()
+    os.chdir(tmp)   # CurrencyAgent carga 'data/vectorstore' relativo al directorio actual
+    try:
+        resultados = []
+        for carga in cargas:
+            _cargar_agente(agente, preguntas(carga, args.calentamiento, seed=args.seed + 1), args.concurrencia)
+            with _MuestreoRSS(os.getpid()) as rss:
+                latencias, errores, segundos = _cargar_agente(agente, preguntas(carga, args.n, seed=args.seed),
+                                                              args.concurrencia)
+            resultados.append({"objetivo": "agent", "carga": carga, **_resumen(latencias, errores, segundos),
+                               "rss_mb": _rss_mb(os.getpid()),
+                               "rss_pico_mb": rss.pico or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+        return resultados
+    finally:
+        os.chdir(anterior)
+
+
+# --- Resultados ---
+def _commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             check=True).stdout.strip()
+        sucio = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True).stdout.strip()
+        return sha + ("+dirty" if sucio else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def _parametros(args) -> dict:
+    return {k: getattr(args, k) for k in ("n", "concurrencia", "upstream_ms", "upstream_jitter_ms", "upstream_errores",
+                                          "llm_ms", "llm_errores", "embed_ms", "chaco_ttl", "seed")}
+
+
+def _anterior(path: str, r: dict, commit: str, base: Optional[str]) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    candidato = None
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            previo = json.loads(linea)
+            if (previo["objetivo"], previo["carga"], previo["parametros"]) != (r["objetivo"], r["carga"], r["parametros"]):
+                continue
+            if (base and previo["commit"].startswith(base)) or (not base and previo["commit"] != commit):
+                candidato = previo
+    return candidato
+
+
+def _delta(antes: float, ahora: float) -> float:
+    return (ahora - antes) / antes * 100 if antes else 0.0
+
+
+def _tabla(resultados: List[dict]):
+    print(f"{'objetivo':<10}{'carga':<11}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'errores':>9}{'RSS pico':>11}")
+    for r in resultados:
+        rss = f"{r['rss_pico_mb']:.0f} MB" if r["rss_pico_mb"] else "n/d"
+        print(f"{r['objetivo']:<10}{r['carga']:<11}{r['rps']:>9.1f}{r['p50_ms']:>8.1f}ms{r['p95_ms']:>8.1f}ms"
+              f"{r['p99_ms']:>8.1f}ms{r['errores']:>9}{rss:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objetivo", choices=["api", "agent", "ambos"], default="api")
+    parser.add_argument("--carga", choices=CARGAS + ("todas",), default="mixto")
+    parser.add_argument("-n", type=int, default=300, help="requests medidos por carga")
+    parser.add_argument("-c", "--concurrencia", type=int, default=8, help="clientes simultáneos")
+    parser.add_argument("--calentamiento", type=int, default=20, help="requests previos sin medir")
+    parser.add_argument("--upstream-ms", type=float, default=80.0, help="latencia de Cambios Chaco")
+    parser.add_argument("--upstream-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--upstream-errores", type=float, default=0.0, help="proporción de 503 de Cambios Chaco")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="latencia del LLM")
+    parser.add_argument("--llm-errores", type=float, default=0.0, help="proporción de 429 del LLM")
+    parser.add_argument("--llm-concurrencia", type=int, default=4)
+    parser.add_argument("--embed-ms", type=float, default=2.0, help="costo de encode por texto")
+    parser.add_argument("--chaco-ttl", type=float, default=60.0,
+                        help="TTL del cache de Cambios Chaco (0 para que cada request llegue al upstream)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--resultados", default="scripts/bench_results.jsonl", help="JSONL donde se agregan las corridas")
+    parser.add_argument("--comparar", action="store_true", help="comparar con la última corrida de otro commit")
+    parser.add_argument("--base", help="commit contra el que comparar (prefijo)")
+    parser.add_argument("--umbral", type=float, help="regresión máxima tolerada en %% (req/s y p95)")
+    parser.add_argument("--servir", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        return _servir(args)
+
+    cargas = list(CARGAS) if args.carga == "todas" else [args.carga]
+    chaco = FakeChaco(args.upstream_ms, args.upstream_jitter_ms, args.upstream_errores, seed=args.seed).start()
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="bench_load_") as tmp:
+        vectorstore_sintetico(os.path.join(tmp, "data", "vectorstore"), DIAS_SERIE)
+        if args.objetivo in ("api", "ambos"):
+            resultados += correr_api(args, chaco, tmp, cargas)
+        if args.objetivo in ("agent", "ambos"):
+            resultados += correr_agente(args, chaco, tmp, cargas)
+    chaco.stop()
+
+    commit = _commit()
+    for r in resultados:
+        r.update(commit=commit, fecha=datetime.datetime.now().isoformat(timespec="seconds"),
+                 parametros=_parametros(args), upstream=dict(chaco.requests))
+    _tabla(resultados)
+
+    regresiones = []
+    if args.comparar or args.base:
+        for r in resultados:
+            previo = _anterior(args.resultados, r, commit, args.base)
+            if previo is None:
+                print(f"{r['objetivo']}/{r['carga']}: sin corrida anterior comparable")
+                continue
+            d_rps, d_p95 = _delta(previo["rps"], r["rps"]), _delta(previo["p95_ms"], r["p95_ms"])
+            print(f"{r['objetivo']}/{r['carga']} vs {previo['commit']}: req/s {d_rps:+.1f} %, "
+                  f"p50 {_delta(previo['p50_ms'], r['p50_ms']):+.1f} %, p95 {d_p95:+.1f} %, "
+                  f"p99 {_delta(previo['p99_ms'], r['p99_ms']):+.1f} %")
+            if args.umbral is not None and (-d_rps > args.umbral or d_p95 > args.umbral):
+                regresiones.append(f"{r['objetivo']}/{r['carga']}")
+
+    os.makedirs(os.path.dirname(args.resultados) or ".", exist_ok=True)
+    with open(args.resultados, "a", encoding="utf-8") as f:
+        for r in resultados:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    if regresiones:
+        print(f"regresión mayor al {args.umbral} %: {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
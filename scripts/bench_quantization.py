@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de recall vs velocidad de la matriz cuantizada de SimpleVectorStore.
+
+1. Corpus de cotizaciones (serie sintética, mismos textos que `preload_vectorstore`):
+   por encoder y por cuantización (float32 / float16 / int8, con y sin re-rank) informa
+   tamaño del índice, latencia de `query` y de `query_many`, recall@k contra el top-k
+   exacto en float32 y acierto@k (el documento de la fecha y moneda pedidas está en el top-k).
+2. Escala: la misma comparación de latencia y recall con vectores densos aleatorios
+   de `--sizes` filas, para ver cómo crece el recorrido de la matriz.
+
+    python -m scripts.bench_quantization --dias 2000 -k 5 --encoders hashing all-MiniLM-L6-v2
+    python -m scripts.bench_quantization --sizes 100000 1000000 --skip-corpus
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+import numpy as np
+
+from scripts.fakes import NOMBRES, serie_sintetica
+from scripts.preload_vectorstore import construir_doc
+from src.rag.encoders import crear_encoder
+from src.rag.vectorstore import SimpleVectorStore, _normalize_rows
+
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+         "septiembre", "octubre", "noviembre", "diciembre"]
+MODOS = [("float32", 0), ("float16", 0), ("float16", 4), ("int8", 0), ("int8", 4)]
+
+
+def _consultas(registros: list, n: int, seed: int = 0):
+    """(texto, id esperado) con las formas de pregunta de bench_load."""
+    rng = random.Random(seed)
+    salida = []
+    for fecha, iso, _ in rng.sample(registros, min(n, len(registros))):
+        d = datetime.date.fromisoformat(fecha)
+        nombre = NOMBRES[iso].lower()
+        texto = rng.choice([f"cotización del {nombre} el {d.day} de {MESES[d.month - 1]} de {d.year}",
+                            f"¿cuánto valía el {iso} el {d.strftime('%d/%m/%Y')}?",
+                            f"{nombre} {fecha}"])
+        salida.append((texto, f"{fecha}_{iso}"))
+    return salida
+
+
+def _medir(fn, repeticiones: int) -> float:
+    fn()  # calentamiento
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - t0) / repeticiones * 1000
+
+
+def _store(docs, embs, modo: str, rerank: int) -> SimpleVectorStore:
+    store = SimpleVectorStore(quantization=modo, rerank=rerank, query_cache_size=0)
+    store._set_state(docs, embs)
+    return store
+
+
+def _comparar(titulo: str, docs, embs, q_embs, k: int, esperados=None, batch: int = 16):
+    n = len(docs)
+    fila_de = {d["id"]: i for i, d in enumerate(docs)}
+    # umbral de cada consulta: k-ésimo puntaje exacto; con empates (frecuentes con hashing)
+    # cuenta como acierto cualquier documento que puntúe al menos eso
+    umbral = np.sort(q_embs @ embs.T, axis=1)[:, -k] - 1e-6
+    print(f"\n{titulo}")
+    cabecera = f"{'modo':<18}{'índice':>10}{'query':>11}{f'query_many x{batch}':>18}{f'recall@{k}':>11}"
+    print(cabecera + (f"{f'acierto@{k}':>12}" if esperados else ""))
+    rep = max(3, min(200, 2_000_000 // n))
+    for modo, rerank in MODOS:
+        store = _store(docs, embs, modo, rerank)
+        una = _medir(lambda: store._search(q_embs[0], k), rep)
+        varias = _medir(lambda: store._search_many(q_embs[:batch], k), max(3, rep // 4)) / min(batch, len(q_embs))
+        ids = [[r["doc"]["id"] for r in fila] for fila in store._search_many(q_embs, k)]
+        recall = np.mean([np.sum(embs[[fila_de[i] for i in fila]] @ q >= u) / k
+                          for fila, q, u in zip(ids, q_embs, umbral)])
+        nombre = modo + (f" +rerank×{rerank}" if rerank else "")
+        linea = f"{nombre:<18}{store.index_nbytes() / 2**20:>8.1f}MB{una:>9.3f}ms{varias:>16.3f}ms{recall:>11.3f}"
+        if esperados:
+            linea += f"{np.mean([e in fila for e, fila in zip(esperados, ids)]):>12.3f}"
+        print(linea)
+        del store
+
+
+def _corpus(args):
+    registros = list(serie_sintetica(args.dias))
+    docs = [construir_doc(f, m, v) for f, m, v in registros]
+    consultas = _consultas(registros, args.consultas)
+    for nombre in args.encoders:
+        encoder = crear_encoder(nombre)
+        t0 = time.perf_counter()
+        embs = _normalize_rows(encoder.encode([d["text"] for d in docs], show_progress_bar=False))
+        por_doc = (time.perf_counter() - t0) / len(docs) * 1e6
+        q_embs = _normalize_rows(encoder.encode([t for t, _ in consultas], show_progress_bar=False))
+        _comparar(f"corpus de cotizaciones: {len(docs)} docs, encoder {nombre} "
+                  f"(dim {embs.shape[1]}, {por_doc:.0f} µs por doc)",
+                  docs, embs, q_embs, args.k, [e for _, e in consultas])
+
+
+def _escala(args):
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        docs = [{"id": str(i), "text": "", "meta": {}} for i in range(n)]
+        embs = _normalize_rows(rng.standard_normal((n, args.dim), dtype=np.float32))
+        q_embs = _normalize_rows(rng.standard_normal((args.consultas, args.dim), dtype=np.float32))
+        _comparar(f"vectores aleatorios: {n} docs, dim {args.dim}", docs, embs, q_embs, args.k)
+        del embs, docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dias", type=int, default=1000, help="días hábiles de la serie (× 10 monedas)")
+    parser.add_argument("--encoders", nargs="+", default=["hashing"],
+                        help="nombres para crear_encoder: hashing o un modelo de sentence-transformers")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--skip-corpus", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_corpus:
+        _corpus(args)
+    _escala(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de arranque en frío: importa `src.api` en un proceso nuevo y mide el
+tiempo de import, el RSS máximo y qué dependencias pesadas quedaron cargadas.
+
+    python -m scripts.bench_startup --runs 5 --max-seconds 1.5 --max-rss-mb 250 --json bench_startup.json
+
+Con `--max-seconds` / `--max-rss-mb` termina con código 1 si se superan los umbrales
+o si alguna dependencia pesada se importa al arrancar (útil para detectar regresiones en CI).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PESADOS = ["torch", "sentence_transformers", "sklearn", "pandas", "pdfplumber", "openai", "google.generativeai"]
+
+_SONDA = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+import src.api
+dt = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss //= 1024  # macOS informa bytes, Linux KiB
+print(json.dumps({"import_s": dt, "rss_mb": rss / 1024, "pesados": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def medir_una_vez(env) -> dict:
+    out = subprocess.run([sys.executable, "-c", _SONDA % (PESADOS,)], capture_output=True, text=True, env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, help="umbral de la mediana del tiempo de import")
+    parser.add_argument("--max-rss-mb", type=float, help="umbral de la mediana del RSS máximo")
+    parser.add_argument("--json", help="guardar el resultado en este archivo")
+    args = parser.parse_args()
+
+    # el warmup corre en el lifespan, no en el import; igual se desactiva para medir solo el import
+    env = {**os.environ, "EMBEDDINGS_WARMUP": "0", "PYTHONDONTWRITEBYTECODE": "1"}
+    runs = [medir_una_vez(env) for _ in range(args.runs)]
+    resultado = {
+        "import_s_median": statistics.median(r["import_s"] for r in runs),
+        "rss_mb_median": statistics.median(r["rss_mb"] for r in runs),
+        "pesados": sorted({m for r in runs for m in r["pesados"]}),
+        "runs": runs,
+    }
+    print(f"import src.api: {resultado['import_s_median']:.3f}s (mediana de {args.runs}), "
+          f"RSS máx {resultado['rss_mb_median']:.1f} MB")
+    print(f"dependencias pesadas cargadas al arrancar: {', '.join(resultado['pesados']) or 'ninguna'}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+
+    fallas = []
+    if args.max_seconds is not None and resultado["import_s_median"] > args.max_seconds:
+        fallas.append(f"import {resultado['import_s_median']:.3f}s > {args.max_seconds}s")
+    if args.max_rss_mb is not None and resultado["rss_mb_median"] > args.max_rss_mb:
+        fallas.append(f"RSS {resultado['rss_mb_median']:.1f} MB > {args.max_rss_mb} MB")
+    if (args.max_seconds is not None or args.max_rss_mb is not None) and resultado["pesados"]:
+        fallas.append("dependencias pesadas importadas al arrancar")
+    if fallas:
+        print("REGRESIÓN: " + "; ".join(fallas))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de búsqueda en SimpleVectorStore: implementación anterior
+(sklearn `cosine_similarity` + `argsort` completo) vs matriz pre-normalizada float32
+con producto matriz-vector + `argpartition`.
+
+También mide `query` con filtro `where={"moneda": ...}` sobre un corpus repartido
+en 27 monedas. Usa embeddings aleatorios (sin cargar el modelo) para medir solo la búsqueda:
+
+    python -m scripts.bench_vectorstore --sizes 1000 10000 100000 1000000 --dim 384 -k 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.rag.vectorstore import SimpleVectorStore, _normalize_rows
+
+
+class _RandomEncoder:
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def encode(self, texts, show_progress_bar=False):
+        return self.rng.standard_normal((len(texts), self.dim), dtype=np.float32)
+
+
+def _anterior(embeddings, q_emb, k):
+    from sklearn.metrics.pairwise import cosine_similarity
+    sims = cosine_similarity([q_emb], embeddings)[0]
+    return np.argsort(sims)[::-1][:k]
+
+
+def _medir(fn, repeticiones):
+    fn()  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return float(np.median(tiempos)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=16, help="consultas por llamada a query_many")
+    parser.add_argument("--skip-old", action="store_true", help="no medir la implementación anterior (requiere sklearn)")
+    args = parser.parse_args()
+
+    encoder = _RandomEncoder(args.dim)
+    print(f"{'docs':>10}{'anterior':>12}{'query':>12}{'speedup':>9}"
+          f"{f'query_many x{args.batch} (por consulta)':>36}{'query filtrado 1/27':>22}")
+    for n in args.sizes:
+        store = SimpleVectorStore(model=encoder)
+        docs = [{"id": str(i), "text": "", "meta": {"moneda": f"M{i % 27}"}} for i in range(n)]
+        store._set_state(docs, _normalize_rows(encoder.encode(range(n))))
+        # la versión anterior renormaliza en cada consulta: medirla sobre la misma matriz
+        # da el mismo costo sin duplicar la memoria a 1M docs
+        raw = store._matrix
+        q = encoder.encode([0])[0]
+        q_norm = _normalize_rows(q)[0]
+        qs = _normalize_rows(encoder.encode(range(args.batch)))
+        rep = max(3, min(200, 2_000_000 // n))
+
+        nuevo = _medir(lambda: store._search(q_norm, args.k), rep)
+        lote = _medir(lambda: store._search_many(qs, args.k), max(3, rep // 4)) / args.batch
+        filtrado = _medir(lambda: store._search(q_norm, args.k, store._filter_rows({"moneda": "M3"})), rep)
+        if args.skip_old:
+            print(f"{n:>10}{'-':>12}{nuevo:>10.3f}ms{'-':>9}{lote:>34.3f}ms{filtrado:>20.3f}ms")
+        else:
+            viejo = _medir(lambda: _anterior(raw, q, args.k), max(3, rep // 4))
+            print(f"{n:>10}{viejo:>10.3f}ms{nuevo:>10.3f}ms{viejo / nuevo:>8.1f}x{lote:>34.3f}ms{filtrado:>20.3f}ms")
+        del raw, store
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dobles locales de las dependencias externas, para benchmarks y pruebas de carga
+sin tocar cambioschaco.com.py ni Gemini ni cargar el modelo de embeddings:
+
+- `FakeChaco`: servidor HTTP local que responde como `URL_BASE` (JSON) y `URL_PDF`
+  (PDF con la tabla), con latencia, jitter y errores inyectables.
+- `FakeGenAI`: reemplazo de `google.generativeai` (GenerativeModel sync/async/stream,
+  `usage_metadata`), con latencia y errores 429 inyectables.
+- `FakeEmbedder`: encoder determinístico (hashing de palabras) con la interfaz `.encode`.
+- `vectorstore_sintetico`: vectorstore en disco con una serie BCP sintética.
+"""
+
+import asyncio
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from scripts.preload_vectorstore import construir_doc
+from src.rag.vectorstore import SimpleVectorStore
+
+# Monedas del doble y su valor de referencia en guaraníes
+MONEDAS = {"USD": 7200.0, "EUR": 8400.0, "BRL": 1300.0, "ARS": 6.0, "GBP": 9700.0, "JPY": 48.0,
+           "CHF": 8900.0, "CAD": 5200.0, "CLP": 7.6, "UYU": 180.0}
+NOMBRES = {"USD": "Dolar americano", "EUR": "Euro", "BRL": "Real", "ARS": "Peso argentino", "GBP": "Libra esterlina",
+           "JPY": "Yen", "CHF": "Franco suizo", "CAD": "Dolar canadiense", "CLP": "Peso chileno", "UYU": "Peso uruguayo"}
+
+
+# --- Cambios Chaco ---
+def _payload_chaco() -> List[dict]:
+    return [{"isoCode": iso, "purchasePrice": v * 0.99, "salePrice": v * 1.01} for iso, v in MONEDAS.items()]
+
+
+def _contenido_tabla(filas: List[List[str]]) -> bytes:
+    x = [40, 260, 380, 500]
+    alto, y0 = 20, 760
+    ops = ["0.5 w"]
+    for i in range(len(filas) + 1):
+        y = y0 - i * alto
+        ops.append(f"{x[0]} {y} m {x[-1]} {y} l S")
+    for xi in x:
+        ops.append(f"{xi} {y0} m {xi} {y0 - len(filas) * alto} l S")
+    for i, fila in enumerate(filas):
+        y = y0 - (i + 1) * alto + 6
+        for xi, celda in zip(x, fila):
+            texto = celda.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"BT /F1 10 Tf {xi + 4} {y} Td ({texto}) Tj ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def pdf_paginas(paginas: List[List[List[str]]]) -> bytes:
+    """PDF mínimo con una tabla con bordes (lo que `extract_tables` reconoce) por página."""
+    n = len(paginas)
+    fuente = 3 + 2 * n
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(n)).encode()
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % n,
+    ]
+    for i, filas in enumerate(paginas):
+        contenido = _contenido_tabla(filas)
+        objetos.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (4 + 2 * i, fuente))
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+    objetos.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    salida, offsets = bytearray(b"%PDF-1.4\n"), []
+    for i, obj in enumerate(objetos, 1):
+        offsets.append(len(salida))
+        salida += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    salida += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+    return bytes(salida)
+
+
+def pdf_tabla(filas: List[List[str]]) -> bytes:
+    """PDF mínimo de una página con una tabla con bordes."""
+    return pdf_paginas([filas])
+
+
+def _pdf_chaco() -> bytes:
+    filas = [["Moneda", "Compra", "Venta"]]
+    for iso, v in MONEDAS.items():
+        filas.append([f"{NOMBRES[iso]} {iso}", f"{v * 0.99:.2f}".replace(".", ","), f"{v * 1.01:.2f}".replace(".", ",")])
+    return pdf_tabla(filas)
+
+
+class FakeChaco:
+    """
+    Servidor HTTP local (hilo daemon) que imita la API JSON y el PDF de Cambios Chaco.
+
+    - `latencia_ms` ± `jitter_ms` antes de cada respuesta.
+    - `error_rate`: proporción de requests que responden 503.
+    - `caido`: si es True todas responden 503 (para probar el fallback y la caché vencida).
+    - El PDF (`pdf`, reemplazable) va con ETag y responde 304 a un If-None-Match que coincide;
+      con `etag=False` se manda siempre completo y sin ETag.
+    """
+
+    def __init__(self, latencia_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 puerto: int = 0, seed: int = 0):
+        self.latencia_ms, self.jitter_ms, self.error_rate = latencia_ms, jitter_ms, error_rate
+        self.caido = False
+        self.etag = True
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._json = json.dumps(_payload_chaco()).encode("utf-8")
+        self.pdf = _pdf_chaco()
+        self.requests: Dict[str, int] = {"json": 0, "pdf": 0, "no_modificado": 0, "errores": 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", puerto), self._handler())
+        self._server.daemon_threads = True
+        self._hilo: Optional[threading.Thread] = None
+
+    @property
+    def url_base(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/branch_office/1/exchange"
+
+    @property
+    def url_pdf(self) -> str:
+        return self.url_base + "/pdf"
+
+    @property
+    def pdf(self) -> bytes:
+        return self._pdf
+
+    @pdf.setter
+    def pdf(self, contenido: bytes):
+        self._pdf, self._pdf_etag = contenido, '"%08x"' % zlib.crc32(contenido)
+
+    def _sorteo(self):
+        with self._rng_lock:
+            espera = max(0.0, self.latencia_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            falla = self.caido or self._rng.random() < self.error_rate
+        return espera, falla
+
+    def _handler(self):
+        doble = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                es_pdf = self.path.rstrip("/").endswith("/pdf")
+                doble.requests["pdf" if es_pdf else "json"] += 1
+                espera, falla = doble._sorteo()
+                time.sleep(espera)
+                etag = doble._pdf_etag if es_pdf and doble.etag else None
+                if falla:
+                    doble.requests["errores"] += 1
+                    cuerpo, status, tipo = b'{"error": "injected"}', 503, "application/json"
+                elif etag and self.headers.get("If-None-Match") == etag:
+                    doble.requests["no_modificado"] += 1
+                    cuerpo, status, tipo = b"", 304, "application/pdf"
+                elif es_pdf:
+                    cuerpo, status, tipo = doble._pdf, 200, "application/pdf"
+                else:
+                    cuerpo, status, tipo = doble._json, 200, "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", tipo)
+                if etag and not falla:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+        return Handler
+
+    def start(self) -> "FakeChaco":
+        self._hilo = threading.Thread(target=self._server.serve_forever, name="fake-chaco", daemon=True)
+        self._hilo.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Gemini ---
+class ResourceExhausted(Exception):
+    """Mismo nombre que la excepción de google.api_core: el gateway la trata como rate limit."""
+
+
+class _Respuesta:
+    def __init__(self, texto: str, prompt: str):
+        self.text = texto
+        self.usage_metadata = SimpleNamespace(prompt_token_count=len(prompt.split()),
+                                              candidates_token_count=len(texto.split()))
+
+
+class _RespuestaStream:
+    def __init__(self, modelo: "_Modelo", texto: str, prompt: str):
+        self._modelo, self._palabras = modelo, texto.split(" ")
+        self.usage_metadata = _Respuesta(texto, prompt).usage_metadata
+
+    async def __aiter__(self):
+        pausa = self._modelo.genai.latencia / max(1, len(self._palabras))
+        for i, palabra in enumerate(self._palabras):
+            await asyncio.sleep(pausa)
+            yield SimpleNamespace(text=palabra if i == 0 else " " + palabra)
+
+
+class _Modelo:
+    def __init__(self, genai: "FakeGenAI", nombre: str):
+        self.genai, self.nombre = genai, nombre
+
+    def _texto(self, prompt: str) -> str:
+        self.genai.llamadas += 1
+        if self.genai.error_rate and self.genai._rng.random() < self.genai.error_rate:
+            raise ResourceExhausted("429 quota exceeded (injected)")
+        huella = zlib.crc32(prompt.encode("utf-8"))
+        return f"[{self.nombre} fake {huella:08x}] " + " ".join(["Análisis"] * self.genai.palabras)
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        time.sleep(self.genai.latencia)
+        return _Respuesta(self._texto(prompt), prompt)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        if stream:
+            return _RespuestaStream(self, self._texto(prompt), prompt)
+        await asyncio.sleep(self.genai.latencia)
+        return _Respuesta(self._texto(prompt), prompt)
+
+
+class FakeGenAI:
+    """Reemplazo de `google.generativeai`: se instala con `src.mcp._genai = FakeGenAI(...)`."""
+
+    def __init__(self, latencia_ms: float = 300.0, error_rate: float = 0.0, palabras: int = 40, seed: int = 0):
+        self.latencia = latencia_ms / 1000
+        self.error_rate, self.palabras = error_rate, palabras
+        self._rng = random.Random(seed)
+        self.llamadas = 0
+        self.types = SimpleNamespace(GenerationConfig=lambda **kwargs: kwargs)
+
+    def configure(self, **kwargs):
+        pass
+
+    def GenerativeModel(self, nombre: str) -> _Modelo:
+        return _Modelo(self, nombre)
+
+
+# --- Embeddings ---
+class FakeEmbedder:
+    """
+    Encoder determinístico: cada palabra (y cada par de palabras) suma en una dimensión
+    elegida por hash. Textos parecidos quedan cerca, así el top-k tiene sentido. `costo_ms`
+    simula el tiempo de inferencia por texto y `costo_llamada_ms` el costo fijo de cada
+    llamada (lo que el micro-batching amortiza).
+    """
+
+    def __init__(self, dim: int = 384, costo_ms: float = 0.0, costo_llamada_ms: float = 0.0):
+        self.dim, self.costo, self.costo_llamada = dim, costo_ms / 1000, costo_llamada_ms / 1000
+        self.llamadas = 0
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        self.llamadas += 1
+        if self.costo or self.costo_llamada:
+            time.sleep(self.costo_llamada + self.costo * len(texts))
+        salida = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, texto in enumerate(texts):
+            palabras = re.findall(r"\w+", texto.lower())
+            for token in palabras + [a + " " + b for a, b in zip(palabras, palabras[1:])]:
+                h = zlib.crc32(token.encode("utf-8"))
+                salida[i, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return salida
+
+
+def serie_sintetica(dias: int, hasta: Optional[datetime.date] = None, seed: int = 0):
+    """(fecha ISO, moneda, valor) de `dias` días hábiles hasta ayer, con un paseo aleatorio por moneda."""
+    rng = np.random.default_rng(seed)
+    hasta = hasta or datetime.date.today() - datetime.timedelta(days=1)
+    fechas = []
+    d = hasta
+    while len(fechas) < dias:
+        if d.weekday() < 5:
+            fechas.append(d)
+        d -= datetime.timedelta(days=1)
+    fechas.reverse()
+    for iso, base in MONEDAS.items():
+        valores = base * np.exp(np.cumsum(rng.normal(0, 0.004, len(fechas))))
+        for f, v in zip(fechas, valores):
+            yield f.isoformat(), iso, round(float(v), 2)
+
+
+def vectorstore_sintetico(path: str, dias: int = 250, embedder: Optional[FakeEmbedder] = None) -> SimpleVectorStore:
+    store = SimpleVectorStore(model=embedder or FakeEmbedder())
+    store.upsert([construir_doc(f, m, v) for f, m, v in serie_sintetica(dias)])
+    store.save(path)
+    return store
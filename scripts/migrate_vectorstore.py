@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migra el vectorstore del formato anterior (data/vectorstore.pkl) al formato en
+directorio (manifest.json + embeddings.npy con mmap + docs.sqlite):
+
+    python -m scripts.migrate_vectorstore data/vectorstore.pkl data/vectorstore
+"""
+
+import argparse
+import os
+import sys
+
+from src.rag.encoders import EMBEDDING_MODEL
+from src.rag.vectorstore import SimpleVectorStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("origen", nargs="?", default="data/vectorstore.pkl")
+    parser.add_argument("destino", nargs="?", default="data/vectorstore")
+    parser.add_argument("--model-name", default=EMBEDDING_MODEL, help="modelo con el que se generaron los embeddings")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.origen):
+        sys.exit(f"No existe {args.origen}")
+    store = SimpleVectorStore(model_name=args.model_name)
+    store.load(args.origen)
+    store.save(args.destino)
+    print(f"Migrados {len(store.docs)} documentos de {args.origen} a {args.destino}/")
+
+
+if __name__ == "__main__":
+    main()
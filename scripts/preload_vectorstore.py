@@ -2,9 +2,42 @@
 # -*- coding: utf-8 -*-
 """
 Script para precargar cotizaciones históricas reales en el vectorstore.
-Fuente: Banco Central del Paraguay (fechas agosto 2025)
+Fuente: Banco Central del Paraguay.
+
+Sin argumentos carga la muestra incluida (agosto 2025). Con archivos CSV/XLSX
+exportados del BCP funciona como pipeline de ingesta en streaming:
+
+    python -m scripts.preload_vectorstore planillas/*.csv planillas/*.xlsx \
+        --store data/vectorstore --chunk-rows 5000 --batch-size 256 --workers 2
+
+- Lee los archivos por bloques (`--chunk-rows`), así la memoria del pipeline no
+  depende del tamaño de la entrada; el store solo crece con pares (fecha, moneda) distintos.
+- Codifica en lotes fijos (`--batch-size`), opcionalmente en un pool de procesos.
+- Escribe cada bloque de forma incremental (upsert + save por append).
+- Guarda un checkpoint por archivo (`--checkpoint`) para retomar tras una interrupción.
+- Informa el throughput (docs/s) por bloque y total.
+
+Formatos aceptados (se detectan por el encabezado):
+- largo: columnas fecha, moneda, valor (también "cotizacion"/"valor_guaranies")
+- ancho: columna fecha y una columna por moneda ISO (USD, EUR, ...)
+Los números pueden venir como 7263.48 o 7.263,48 y las fechas como YYYY-MM-DD o DD/MM/YYYY.
 """
 
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.rag.encoders import crear_encoder
 from src.rag.vectorstore import SimpleVectorStore
 
 # Datos reales estructurados (cada planilla -> fecha -> lista de monedas)
@@ -104,18 +137,265 @@ cotizaciones_reales = [
     },
 ]
 
-def main():
-    store = SimpleVectorStore()
-    docs = []
+ISO_RE = re.compile(r"^[A-Z]{3}$")
+COLUMNAS_FECHA = {"fecha", "date", "dia"}
+COLUMNAS_MONEDA = {"moneda", "iso", "currency", "codigo"}
+COLUMNAS_VALOR = {"valor", "valor_guaranies", "cotizacion", "cotización", "guaranies", "venta"}
+
+Registro = Tuple[str, str, float]  # (fecha ISO, moneda ISO, valor en guaraníes)
+
+
+def texto_documento(fecha: str, moneda: str, valor: float) -> str:
+    return f"El {fecha} la cotización de {moneda} fue {valor} guaraníes por unidad, según el Banco Central del Paraguay."
+
+
+def construir_doc(fecha: str, moneda: str, valor: float) -> dict:
+    return {"id": f"{fecha}_{moneda}", "text": texto_documento(fecha, moneda, valor),
+            "meta": {"fecha": fecha, "moneda": moneda, "valor_guaranies": valor}}
+
+
+# --- Parsing de celdas ---
+def parse_numero(x) -> Optional[float]:
+    if x is None:
+        return None
+    if isinstance(x, (int, float)):
+        return float(x)
+    t = str(x).strip().replace(" ", "")
+    if not t:
+        return None
+    if "," in t and "." in t:
+        # el último separador es el decimal
+        t = t.replace(".", "").replace(",", ".") if t.rfind(",") > t.rfind(".") else t.replace(",", "")
+    elif "," in t:
+        t = t.replace(",", ".")
+    try:
+        return float(t)
+    except ValueError:
+        return None
+
+
+def parse_fecha(x) -> Optional[str]:
+    if isinstance(x, datetime.datetime):
+        return x.date().isoformat()
+    if isinstance(x, datetime.date):
+        return x.isoformat()
+    t = str(x or "").strip()[:10]
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
+        try:
+            return datetime.datetime.strptime(t, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+# --- Lectores en streaming ---
+def _filas_csv(path: str) -> Iterator[list]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(f, dialecto)
+
+
+def _filas_xlsx(path: str) -> Iterator[list]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise RuntimeError("Para leer .xlsx instalá openpyxl (pip install openpyxl)") from e
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            for fila in ws.iter_rows(values_only=True):
+                yield list(fila)
+    finally:
+        wb.close()
+
+
+def iter_registros(path: str) -> Iterator[Registro]:
+    """Recorre un archivo del BCP fila por fila y produce (fecha, moneda, valor)."""
+    filas = _filas_xlsx(path) if path.lower().endswith((".xlsx", ".xlsm")) else _filas_csv(path)
+    encabezado = None
+    for fila in filas:
+        if encabezado is None:
+            nombres = [str(c or "").strip() for c in fila]
+            claves = [n.lower() for n in nombres]
+            if not any(c in COLUMNAS_FECHA for c in claves):
+                continue  # filas de título antes del encabezado
+            i_fecha = next(i for i, c in enumerate(claves) if c in COLUMNAS_FECHA)
+            i_moneda = next((i for i, c in enumerate(claves) if c in COLUMNAS_MONEDA), None)
+            i_valor = next((i for i, c in enumerate(claves) if c in COLUMNAS_VALOR), None)
+            if i_moneda is not None and i_valor is not None:
+                encabezado = ("largo", i_fecha, i_moneda, i_valor)
+            else:
+                monedas = [(i, n.upper()) for i, n in enumerate(nombres) if ISO_RE.match(n.upper())]
+                encabezado = ("ancho", i_fecha, monedas)
+            continue
+        if encabezado[0] == "largo":
+            _, i_fecha, i_moneda, i_valor = encabezado
+            if max(i_fecha, i_moneda, i_valor) >= len(fila):
+                continue
+            fecha, valor = parse_fecha(fila[i_fecha]), parse_numero(fila[i_valor])
+            moneda = str(fila[i_moneda] or "").strip().upper()
+            if fecha and valor is not None and ISO_RE.match(moneda):
+                yield fecha, moneda, valor
+        else:
+            _, i_fecha, monedas = encabezado
+            fecha = parse_fecha(fila[i_fecha]) if i_fecha < len(fila) else None
+            if not fecha:
+                continue
+            for i, moneda in monedas:
+                valor = parse_numero(fila[i]) if i < len(fila) else None
+                if valor is not None:
+                    yield fecha, moneda, valor
+
+
+def iter_muestra() -> Iterator[Registro]:
     for planilla in cotizaciones_reales:
-        fecha = planilla["fecha"]
         for moneda, valor in planilla["monedas"]:
-            doc_id = f"{fecha}_{moneda}"
-            texto = f"El {fecha} la cotización de {moneda} fue {valor} guaraníes por unidad, según el Banco Central del Paraguay."
-            docs.append({"id": doc_id, "text": texto, "meta": {"fecha": fecha, "moneda": moneda, "valor_guaranies": valor}})
-    store.add_documents(docs)
-    store.save("data/vectorstore.pkl")
-    print(f"Vectorstore pre-cargado con {len(docs)} documentos reales (data/vectorstore.pkl)")
+            yield planilla["fecha"], moneda, valor
+
+
+def en_bloques(it: Iterable, n: int) -> Iterator[list]:
+    it = iter(it)
+    while True:
+        bloque = list(itertools.islice(it, n))
+        if not bloque:
+            return
+        yield bloque
+
+
+# --- Encoding en pool de procesos ---
+_worker_model = None
+
+
+def _init_worker(model_name: str):
+    global _worker_model
+    _worker_model = crear_encoder(model_name)
+
+
+def _encode_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts, show_progress_bar=False), dtype=np.float32)
+
+
+class Encoder:
+    """Codifica en lotes de tamaño fijo, en el proceso actual o en un pool acotado."""
+
+    def __init__(self, store: SimpleVectorStore, batch_size: int, workers: int):
+        self.store = store
+        self.batch_size = batch_size
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(store.model_name,)) if workers else None
+        self.max_en_vuelo = max(1, workers) * 2
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        lotes = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.pool is None:
+            partes = [np.asarray(self.store.model.encode(l, show_progress_bar=False), dtype=np.float32) for l in lotes]
+        else:
+            # como mucho `max_en_vuelo` lotes enviados a la vez: memoria acotada y orden preservado
+            partes, en_vuelo = [], deque()
+            for lote in lotes:
+                if len(en_vuelo) >= self.max_en_vuelo:
+                    partes.append(en_vuelo.popleft().result())
+                en_vuelo.append(self.pool.submit(_encode_worker, lote))
+            partes.extend(f.result() for f in en_vuelo)
+        return np.concatenate(partes) if partes else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+# --- Checkpoint ---
+def leer_checkpoint(path: Optional[str]) -> dict:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"version": 1, "archivos": {}}
+
+
+def guardar_checkpoint(path: Optional[str], checkpoint: dict):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _firma(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+# --- Pipeline ---
+def ingerir(registros: Iterable[Registro], store: SimpleVectorStore, encoder: Encoder, store_path: str,
+            chunk_rows: int, al_guardar=None) -> int:
+    """Ingresa los registros por bloques. `al_guardar(filas_acumuladas)` se llama tras cada save."""
+    total = 0
+    inicio = time.perf_counter()
+    for bloque in en_bloques(registros, chunk_rows):
+        t0 = time.perf_counter()
+        docs = [construir_doc(*r) for r in bloque]
+        posiciones = store.pending_texts(docs)
+        embs = None
+        if posiciones:
+            codificados = encoder.encode([docs[i]["text"] for i in posiciones])
+            embs = np.zeros((len(docs), codificados.shape[1]), dtype=np.float32)
+            embs[posiciones] = codificados
+        res = store.upsert(docs, embeddings=embs)
+        store.save(store_path)
+        total += len(bloque)
+        if al_guardar:
+            al_guardar(total)
+        dt_bloque = time.perf_counter() - t0
+        print(f"  bloque de {len(bloque)} filas: {res} — {len(bloque) / dt_bloque:,.0f} docs/s "
+              f"(acumulado {total / (time.perf_counter() - inicio):,.0f} docs/s)")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archivos", nargs="*", help="CSV/XLSX del BCP; sin archivos se carga la muestra incluida")
+    parser.add_argument("--store", default="data/vectorstore")
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="filas por bloque de escritura")
+    parser.add_argument("--batch-size", type=int, default=256, help="textos por llamada a encode")
+    parser.add_argument("--workers", type=int, default=0, help="procesos de encoding (0 = en el proceso actual)")
+    parser.add_argument("--checkpoint", default="data/preload_checkpoint.json")
+    args = parser.parse_args()
+
+    store = SimpleVectorStore()
+    if os.path.isdir(args.store):
+        store.load(args.store)
+    encoder = Encoder(store, args.batch_size, args.workers)
+    inicio = time.perf_counter()
+    total = 0
+    try:
+        if not args.archivos:
+            total = ingerir(iter_muestra(), store, encoder, args.store, args.chunk_rows)
+        checkpoint = leer_checkpoint(args.checkpoint)
+        for archivo in args.archivos:
+            clave = os.path.abspath(archivo)
+            firma = _firma(archivo)
+            previo = checkpoint["archivos"].get(clave, {})
+            saltar = previo.get("registros", 0) if previo.get("firma") == firma else 0
+            print(f"{archivo}: retomando desde el registro {saltar}" if saltar else f"{archivo}:")
+
+            def al_guardar(filas, clave=clave, firma=firma, saltar=saltar):
+                checkpoint["archivos"][clave] = {"firma": firma, "registros": saltar + filas}
+                guardar_checkpoint(args.checkpoint, checkpoint)
+
+            registros = itertools.islice(iter_registros(archivo), saltar, None)
+            total += ingerir(registros, store, encoder, args.store, args.chunk_rows, al_guardar)
+    finally:
+        encoder.close()
+    dt_total = time.perf_counter() - inicio
+    print(f"Vectorstore con {len(store)} documentos ({args.store}/): {total} registros procesados "
+          f"en {dt_total:.1f}s ({total / dt_total if dt_total else 0:,.0f} docs/s)")
+
 
 if __name__ == "__main__":
     main()
@@ -1,168 +1,176 @@
-import os
 import re
+import contextlib
 import datetime
-import google.generativeai as genai
+from functools import partial
 from typing import Optional, TypedDict, Any
 from .rag.vectorstore import SimpleVectorStore
-from .tools.cotizaciones_tool import get_cotizacion
-from langgraph.graph import StateGraph, END
+from .rag.timeseries import FUENTE_BCP, RateHistoryStore
+from .rag.analytics import RateAnalytics, contexto_llm, texto_resumen
+from .tools.cotizaciones_tool import get_cotizacion, aget_cotizacion
+from .tools.conversion import ConversionEngine, texto_conversion
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, START, END
 from .mcp import MCPRegistry
+from .metrics import medir_nodo
+from .llm import LLMUnavailable
+from .intent import parse_intent
+from .resilience import REQUEST_DEADLINE, en_presupuesto, nuevo_deadline
 
-# Configuración de la API Key de Google
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-# Meses en español (minúsculas)
-MESES = {
-    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
-    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
-    "noviembre": 11, "diciembre": 12
-}
 # Estado del agente
 class AgentState(TypedDict):
     question: str
     moneda: str
     fecha: Optional[str]   # 'YYYY-MM-DD' si se detecta, None si no
+    desde: Optional[str]   # rango pedido ("del 1 al 10 de agosto", "la semana pasada")
+    hasta: Optional[str]
+    tipo: str              # tipo de pregunta según `parse_intent` ("tendencia", "conversion", ...)
+    monto: Optional[float] # conversiones: monto, moneda de origen y de destino
+    origen: Optional[str]
+    destino: Optional[str]
+    conversion: Any        # resultado de ConversionEngine
     raw_cotizacion: Any
     datos_procesados: Any
     rag_docs: Any
+    historico: Any         # puntos del RateHistoryStore (fecha, moneda, valor_guaranies)
+    resumen: Any           # indicadores de RateAnalytics para el rango (o las últimas cotizaciones)
     reporte: str
+    respaldo: bool         # el reporte es el de solo datos porque el LLM no estuvo disponible
+    deadline: Optional[float]  # instante (time.monotonic) en que vence la request; None = sin límite
 
-# --- Detectores ---
-def detectar_moneda(texto: str) -> str:
-    mapping = {
-        "dólar": "USD", "usd": "USD",
-        "yen": "JPY", "jpy": "JPY",
-        "libra": "GBP", "gbp": "GBP",
-        "franco suizo": "CHF", "chf": "CHF",
-        "corona sueca": "SEK", "sek": "SEK",
-        "corona danesa": "DKK", "dkk": "DKK",
-        "corona noruega": "NOK", "nok": "NOK",
-        "real": "BRL", "brl": "BRL",
-        "peso argentino": "ARS", "ars": "ARS",
-        "dólar canadiense": "CAD", "cad": "CAD",
-        "rand": "ZAR", "zar": "ZAR",
-        "derechos especiales de giro": "XDR", "deg": "XDR", "xdr": "XDR",
-        "onza de oro": "XAU", "oro": "XAU", "xau": "XAU",
-        "peso chileno": "CLP", "clp": "CLP",
-        "euro": "EUR", "eur": "EUR",
-        "peso uruguayo": "UYU", "uyu": "UYU",
-        "dólar australiano": "AUD", "aud": "AUD",
-        "yuan": "CNY", "renminbi": "CNY", "cny": "CNY",
-        "dólar de singapur": "SGD", "sgd": "SGD",
-        "boliviano": "BOB", "bob": "BOB",
-        "sol peruano": "PEN", "pen": "PEN",
-        "dólar neozelandés": "NZD", "nzd": "NZD",
-        "peso mexicano": "MXN", "mxn": "MXN",
-        "peso colombiano": "COP", "cop": "COP",
-        "dólar taiwanés": "TWD", "twd": "TWD",
-        "dirham": "AED", "emiratos": "AED", "aed": "AED"
-    }
-    texto = texto.lower()
-    for k, v in mapping.items():
-        if k in texto:
-            return v
-    return "USD"  # por defecto
+# --- Nodos ---
+# Cada nodo devuelve solo las claves que modifica: fetch y rag pueden correr
+# en paralelo y LangGraph fusiona las actualizaciones parciales.
+# Los nodos con I/O tienen versión sync y async: `invoke` usa la primera y `ainvoke` la segunda.
+# Cada nodo corre con el tiempo que le queda a la request (`deadline` del estado): las llamadas
+# a upstream acortan sus timeouts y, si no llegan, se responde con el último dato bueno.
+def fetch_cotizaciones(state: AgentState) -> dict:
+    res = get_cotizacion(state["moneda"])
+    return {"raw_cotizacion": res}
 
-def detectar_fecha(texto: str) -> Optional[str]:
-    hoy = datetime.date.today()
-    texto = texto.lower().strip()
-
-    # Palabras clave
-    if "hoy" in texto:
-        return hoy.strftime("%Y-%m-%d")
-    elif "ayer" in texto:
-        return (hoy - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-
-    # Formato DD/MM/YYYY o DD-MM-YYYY
-    match = re.search(r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})", texto)
-    if match:
-        d, m, y = map(int, match.groups())
-        try:
-            return datetime.date(y, m, d).strftime("%Y-%m-%d")
-        except ValueError:
-            return None
-
-    # Formato YYYY-MM-DD
-    match_iso = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", texto)
-    if match_iso:
-        y, m, d = map(int, match_iso.groups())
-        try:
-            return datetime.date(y, m, d).strftime("%Y-%m-%d")
-        except ValueError:
-            return None
-
-    # Formato DD-MM (sin año)
-    match_short = re.search(r"(\d{1,2})[/-](\d{1,2})", texto)
-    if match_short:
-        d, m = map(int, match_short.groups())
-        try:
-            return datetime.date(hoy.year, m, d).strftime("%Y-%m-%d")
-        except ValueError:
-            return None
-
-    # Formato "11 de agosto" o "11 agosto"
-    match_texto = re.search(r"(\d{1,2})\s*(de\s*)?([a-záéíóú]+)", texto)
-    if match_texto:
-        d = int(match_texto.group(1))
-        mes_texto = match_texto.group(3).strip()
-        if mes_texto in MESES:
-            try:
-                return datetime.date(hoy.year, MESES[mes_texto], d).strftime("%Y-%m-%d")
-            except ValueError:
-                return None
+async def afetch_cotizaciones(state: AgentState) -> dict:
+    return {"raw_cotizacion": await aget_cotizacion(state["moneda"])}
 
-    # Formato "agosto 11"
-    match_texto_inv = re.search(r"([a-záéíóú]+)\s*(\d{1,2})", texto)
-    if match_texto_inv:
-        mes_texto = match_texto_inv.group(1).strip()
-        d = int(match_texto_inv.group(2))
-        if mes_texto in MESES:
-            try:
-                return datetime.date(hoy.year, MESES[mes_texto], d).strftime("%Y-%m-%d")
-            except ValueError:
-                return None
+def _conversion(state: AgentState, resultado: Optional[dict], error: Optional[Exception]) -> dict:
+    if error is not None:
+        return {"reporte": f"No se pudo convertir {state['origen']} a {state['destino']}: {error}"}
+    return {"conversion": resultado, "reporte": texto_conversion(resultado) + _aviso_desactualizado(resultado)}
 
-    return None
+def _args_conversion(state: AgentState) -> dict:
+    # un rango ("la semana pasada") se convierte con los valores de su último día
+    return dict(monto=state["monto"], origen=state["origen"], destino=state["destino"],
+                fecha=state.get("fecha") or state.get("hasta"))
 
-# --- Nodos ---
-def fetch_cotizaciones(state: AgentState) -> AgentState:
-    # if state.get("fecha") == datetime.date.today().strftime("%Y-%m-%d"):
-    res = get_cotizacion(state["moneda"])
-    state["raw_cotizacion"] = res
-    return state
+def convertir_monedas(state: AgentState, conversor: ConversionEngine) -> dict:
+    try:
+        return _conversion(state, conversor.convertir(**_args_conversion(state)), None)
+    except ValueError as e:
+        return _conversion(state, None, e)
 
-def procesar_datos(state: AgentState) -> AgentState:
-    raw = state.get("raw_cotizacion", {})
+async def aconvertir_monedas(state: AgentState, conversor: ConversionEngine) -> dict:
+    try:
+        return _conversion(state, await conversor.aconvertir(**_args_conversion(state)), None)
+    except ValueError as e:
+        return _conversion(state, None, e)
+
+def procesar_datos(state: AgentState) -> dict:
+    raw = state.get("raw_cotizacion") or {}
     inner = raw.get("result", {})
     if isinstance(inner, dict) and "result" in inner:
         datos = inner["result"]
-        state["datos_procesados"] = {
+        procesados = {
             "moneda": datos.get("moneda", state.get("moneda")),
             "compra": datos.get("compra"),
             "venta": datos.get("venta"),
             "source": inner.get("source", raw.get("source", "desconocida"))
         }
-    else:
-        state["datos_procesados"] = {}
-    return state
+        if inner.get("desactualizado"):
+            # último snapshot bueno: el upstream no respondió
+            procesados.update(desactualizado=True, edad_segundos=inner.get("edad_segundos"))
+        return {"datos_procesados": procesados}
+    return {"datos_procesados": {}}
+
+def _aviso_desactualizado(datos: dict) -> str:
+    if not datos.get("desactualizado"):
+        return ""
+    edad = datos.get("edad_segundos") or 0
+    hace = f"{round(edad / 60)} min" if edad >= 90 else f"{edad} s"
+    return f" (último dato disponible, de hace {hace}: Cambios Chaco no responde)"
 
-def rag_lookup(state: AgentState, vectorstore: Optional[SimpleVectorStore] = None) -> AgentState:
-    if not vectorstore:
-        return state
+def esta_desactualizado(state: AgentState) -> bool:
+    """True si la cotización o la conversión salieron del último snapshot bueno (el upstream no responde)."""
+    return any((state.get(clave) or {}).get("desactualizado") for clave in ("datos_procesados", "conversion"))
+
+def texto_historico(punto: dict) -> str:
+    fuente = punto.get("fuente", FUENTE_BCP)
+    if fuente == FUENTE_BCP:
+        return (f"El {punto['fecha']} la cotización de {punto['moneda']} fue {punto['valor_guaranies']} "
+                "guaraníes por unidad, según el Banco Central del Paraguay.")
+    # puntos del recolector: promedio de compra y venta de la casa de cambios, no un valor del BCP
+    return (f"El {punto['fecha']} la cotización de {punto['moneda']} en {fuente} fue {punto['valor_guaranies']} "
+            "guaraníes por unidad (promedio de compra y venta; sin dato del Banco Central del Paraguay esa fecha).")
+
+def plan_rag(state: AgentState, historial: Optional[RateHistoryStore],
+             analitica: Optional[RateAnalytics] = None):
+    """
+    Resuelve lo que no necesita embeddings. Devuelve (update, consulta) donde
+    `consulta` es el texto a buscar en el vectorstore, o None si no hace falta.
+    """
     moneda = state["moneda"]
+    hoy = datetime.date.today()
+    # Preguntas con fecha: búsqueda binaria en la serie histórica, sin embeddings
+    if state.get("fecha") and historial and historial.has(moneda):
+        punto = historial.nearest(moneda, state["fecha"])
+        return {"historico": [punto] if punto else []}, None
+    update = {}
+    desde, hasta = state.get("desde"), state.get("hasta")
+    if historial and historial.has(moneda):
+        if desde and not state.get("fecha"):
+            update["historico"] = historial.range(moneda, desde, hasta)
+        else:
+            update["historico"] = historial.range(moneda, hoy - datetime.timedelta(days=1), hoy)
+    if analitica and not state.get("fecha"):
+        resumen = analitica.resumen(moneda, desde, hasta)
+        if resumen:
+            # con los indicadores precalculados el LLM recibe un resumen numérico, no el texto del RAG
+            update["resumen"] = resumen
+            return update, None
     if state.get("fecha"):
-        question = f"Cotización de {moneda} el {state['fecha']} en guaraníes."
-    else:
-        question = f"Cotizaciones históricas de {moneda} en guaraníes."
-    docs = vectorstore.query(question, k=5)
-    state["rag_docs"] = docs
-    return state
-
-def analizar_con_llm(state: AgentState, mcp: MCPRegistry, question: str) -> AgentState:
+        return update, f"Cotización de {moneda} el {state['fecha']} en guaraníes."
+    if desde:
+        return update, f"Cotizaciones de {moneda} del {desde} al {hasta} en guaraníes."
+    return update, f"Cotizaciones históricas de {moneda} en guaraníes."
+
+def filtro_rag(state: AgentState) -> dict:
+    """Filtro `where` del vectorstore: la moneda pedida y, si hay, el rango de fechas."""
+    where = {"moneda": state["moneda"]}
+    if state.get("desde") and not state.get("fecha"):
+        where["fecha"] = {"desde": state["desde"], "hasta": state["hasta"]}
+    return where
+
+def rag_lookup(state: AgentState, vectorstore: Optional[SimpleVectorStore] = None,
+               historial: Optional[RateHistoryStore] = None, analitica: Optional[RateAnalytics] = None) -> dict:
+    update, consulta = plan_rag(state, historial, analitica)
+    if consulta and vectorstore:
+        # solo se puntúan los documentos de la moneda pedida
+        update["rag_docs"] = vectorstore.query(consulta, k=5, where=filtro_rag(state))
+    return update
+
+async def arag_lookup(state: AgentState, vectorstore: Optional[SimpleVectorStore] = None,
+                      historial: Optional[RateHistoryStore] = None, analitica: Optional[RateAnalytics] = None) -> dict:
+    update, consulta = plan_rag(state, historial, analitica)
+    if consulta and vectorstore:
+        update["rag_docs"] = await vectorstore.aquery(consulta, k=5, where=filtro_rag(state))
+    return update
+
+def reporte_sin_llm(state: AgentState) -> Optional[str]:
+    """Reporte armado solo con datos (hoy, serie histórica o RAG); None si hace falta el LLM."""
     hoy = datetime.date.today()
     hoy_str = hoy.strftime("%Y-%m-%d")
     fecha_pedida_str = state.get("fecha")
-    rag_docs = state.get("rag_docs", [])
-    datos = state.get("datos_procesados", {})
+    rag_docs = state.get("rag_docs") or []
+    historico = state.get("historico") or []
+    datos = state.get("datos_procesados") or {}
 
     def extraer_fecha(doc_text):
         match = re.search(r"\d{4}-\d{2}-\d{2}", doc_text)
@@ -175,12 +183,19 @@ def analizar_con_llm(state: AgentState, mcp: MCPRegistry, question: str) -> Agen
 
     # 🟢 Caso: fecha pedida = HOY → devolver datos procesados sin LLM
     if fecha_pedida_str == hoy_str:
-        state["reporte"] = (
+        return (
             f"Cotización actual de {datos.get('moneda')} "
             f"(fuente {datos.get('source')}): "
             f"Compra {datos.get('compra')} | Venta {datos.get('venta')}"
+            f"{_aviso_desactualizado(datos)}"
         )
-        return state
+
+    # 🟢 Caso: fecha pedida y serie histórica → punto exacto o el más cercano
+    if fecha_pedida_str and historico:
+        punto = historico[0]
+        if punto["fecha"] == fecha_pedida_str:
+            return f"Datos históricos para {state['moneda']} el {fecha_pedida_str}:\n{texto_historico(punto)}"
+        return f"No hay datos exactos para {fecha_pedida_str}, mostrando el más cercano ({punto['fecha']}):\n{texto_historico(punto)}"
 
     # 🟢 Caso: fecha pedida y RAG disponible → devolver el más cercano
     if fecha_pedida_str and rag_docs:
@@ -199,12 +214,26 @@ def analizar_con_llm(state: AgentState, mcp: MCPRegistry, question: str) -> Agen
         if mejor_doc:
             f_encontrada = extraer_fecha(mejor_doc["doc"]["text"])
             if f_encontrada == fecha_pedida:
-                state["reporte"] = f"Datos históricos para {state['moneda']} el {fecha_pedida_str}:\n{mejor_doc['doc']['text']}"
-            else:
-                state["reporte"] = f"No hay datos exactos para {fecha_pedida_str}, mostrando el más cercano ({f_encontrada}):\n{mejor_doc['doc']['text']}"
-            return state
+                return f"Datos históricos para {state['moneda']} el {fecha_pedida_str}:\n{mejor_doc['doc']['text']}"
+            return f"No hay datos exactos para {fecha_pedida_str}, mostrando el más cercano ({f_encontrada}):\n{mejor_doc['doc']['text']}"
+
+    # 🟢 Caso: pregunta de tendencia con indicadores precalculados → resumen sin LLM
+    resumen = state.get("resumen")
+    if not fecha_pedida_str and state.get("tipo") == "tendencia" and resumen:
+        reporte = texto_resumen(resumen)
+        if state.get("desde") and historico:
+            reporte += "\n\n" + "\n".join(texto_historico(p) for p in historico)
+        return reporte
+
+    # 🟢 Caso: rango de fechas y serie histórica → todos los puntos del rango
+    if not fecha_pedida_str and state.get("desde") and historico:
+        textos = [texto_historico(p) for p in historico]
+        return f"Cotizaciones de {state['moneda']} del {state['desde']} al {state['hasta']}:\n" + "\n".join(textos)
 
     # 🟢 Caso: sin fecha → devolver solo hoy y ayer si existen
+    if not fecha_pedida_str and historico:
+        textos = [texto_historico(p) for p in reversed(historico)]
+        return f"Cotizaciones recientes de {state['moneda']}:\n" + "\n\n".join(textos)
     if not fecha_pedida_str and rag_docs:
         ayer = hoy - datetime.timedelta(days=1)
         docs_filtrados = []
@@ -213,44 +242,175 @@ def analizar_con_llm(state: AgentState, mcp: MCPRegistry, question: str) -> Agen
             if f_doc in [hoy, ayer]:
                 docs_filtrados.append(d["doc"]["text"])
         if docs_filtrados:
-            state["reporte"] = f"Cotizaciones recientes de {state['moneda']}:\n" + "\n\n".join(docs_filtrados)
-            return state
+            return f"Cotizaciones recientes de {state['moneda']}:\n" + "\n\n".join(docs_filtrados)
+    return None
+
+def reporte_solo_datos(state: AgentState, motivo: str) -> str:
+    """Reporte de respaldo cuando el LLM no está disponible: solo los datos que ya se tienen."""
+    datos = state.get("datos_procesados") or {}
+    partes = []
+    if datos.get("compra") is not None:
+        partes.append(f"Cotización actual de {datos.get('moneda')} (fuente {datos.get('source')}): "
+                      f"Compra {datos.get('compra')} | Venta {datos.get('venta')}{_aviso_desactualizado(datos)}")
+    historico = state.get("historico") or []
+    if historico:
+        partes.append("\n".join(texto_historico(p) for p in reversed(historico)))
+    elif state.get("rag_docs"):
+        partes.append("\n".join(d["doc"]["text"] for d in state["rag_docs"][:3]))
+    if not partes:
+        partes.append(f"No hay datos disponibles para {state['moneda']}.")
+    return f"(Análisis con IA no disponible: {motivo})\n" + "\n\n".join(partes)
 
-    # 🟢 Todo lo demás → usar LLM
-    contexto = "\n".join([d["doc"]["text"] for d in rag_docs])
-    llm_result = mcp.call(
-        "llm.analyze",
+def llm_kwargs(state: AgentState) -> dict:
+    """Argumentos de `llm.analyze` a partir del estado (datos de hoy y contexto histórico)."""
+    datos = state.get("datos_procesados") or {}
+    rag_docs = state.get("rag_docs") or []
+    resumen = state.get("resumen")
+    return dict(
         moneda=datos.get("moneda", ""),
         compra=datos.get("compra", 0),
         venta=datos.get("venta", 0),
-        source=datos.get("source", ""),
-        contexto=contexto,
-        question=question
+        source=datos.get("source", "") + _aviso_desactualizado(datos),
+        contexto=contexto_llm(resumen) if resumen else "\n".join([d["doc"]["text"] for d in rag_docs]),
+        question=state["question"]
     )
-    state["reporte"] = llm_result
-    return state
+
+def analizar_con_llm(state: AgentState, mcp: MCPRegistry) -> dict:
+    reporte = reporte_sin_llm(state)
+    if reporte is not None:
+        return {"reporte": reporte}
+    # 🟢 Todo lo demás → usar LLM (o solo datos si se agotó el cupo)
+    try:
+        return {"reporte": mcp.call("llm.analyze", **llm_kwargs(state))}
+    except LLMUnavailable as e:
+        return {"reporte": reporte_solo_datos(state, str(e)), "respaldo": True}
+
+async def aanalizar_con_llm(state: AgentState, mcp: MCPRegistry, config: Optional[dict] = None) -> dict:
+    reporte = reporte_sin_llm(state)
+    if reporte is not None:
+        return {"reporte": reporte}
+    partes = []
+    try:
+        if ((config or {}).get("configurable") or {}).get("stream_llm"):
+            # en `astream_respuesta` los fragmentos salen por el stream "custom" a medida que llegan
+            writer = get_stream_writer()
+            # cerrar el stream apenas se deja de consumir (cliente desconectado): el gateway libera el turno enseguida
+            async with contextlib.aclosing(mcp.astream("llm.analyze", **llm_kwargs(state))) as fragmentos:
+                async for fragmento in fragmentos:
+                    partes.append(fragmento)
+                    writer({"token": fragmento})
+            return {"reporte": "".join(partes)}
+        return {"reporte": await mcp.acall("llm.analyze", **llm_kwargs(state))}
+    except LLMUnavailable as e:
+        if partes:
+            # el cliente ya mostró parte del análisis: avisar que se corta antes del reporte de respaldo
+            writer({"interrumpido": str(e)})
+        return {"reporte": reporte_solo_datos(state, str(e)), "respaldo": True}
+
+# --- Ruteo ---
+def ruta_inicial(state: AgentState):
+    """Conversión → tipos cruzados; hoy → solo fetch; fecha pasada → solo RAG; sin fecha → ambos en paralelo."""
+    if state.get("tipo") == "conversion":
+        return ["convert"]
+    fecha = state.get("fecha")
+    if fecha is None:
+        return ["fetch", "rag"]
+    if fecha == datetime.date.today().strftime("%Y-%m-%d"):
+        return ["fetch"]
+    return ["rag"]
+
+def _ruta_rama(state: AgentState):
+    # Con fecha corre una sola rama, que sigue directo a "analyze".
+    # Sin fecha corren las dos y "analyze" espera a ambas (ver el join en el constructor).
+    return "analyze" if state.get("fecha") else END
 
 # --- Constructor ---
-def build_currency_agent_graph(question: str, vectorstore: Optional[SimpleVectorStore] = None, mcp: Optional[MCPRegistry] = None):
-    moneda = detectar_moneda(question)
-    fecha = detectar_fecha(question)
+def estado_inicial(question: str, presupuesto: float = REQUEST_DEADLINE) -> AgentState:
+    """Estado de una invocación; `presupuesto`: segundos para responder (0 = sin límite)."""
+    intent = parse_intent(question)
+    return {
+        "question": question,
+        "moneda": intent.moneda,
+        "fecha": intent.fecha,
+        "desde": intent.desde,
+        "hasta": intent.hasta,
+        "tipo": intent.tipo,
+        "monto": intent.monto,
+        "origen": intent.origen,
+        "destino": intent.destino,
+        "deadline": nuevo_deadline(presupuesto),
+    }
+
+def _nodo(nombre: str, func, afunc) -> RunnableLambda:
+    """Nodo sync/async con su latencia medida en `agent_node_seconds`, acotado al plazo de la request."""
+    return RunnableLambda(medir_nodo(nombre, en_presupuesto(func)), afunc=medir_nodo(nombre, en_presupuesto(afunc)),
+                          name=nombre)
 
+def build_currency_agent_graph(vectorstore: Optional[SimpleVectorStore] = None, mcp: Optional[MCPRegistry] = None,
+                               historial: Optional[RateHistoryStore] = None,
+                               analitica: Optional[RateAnalytics] = None,
+                               conversor: Optional[ConversionEngine] = None):
+    """
+    Compila el grafo una sola vez (al iniciar la app). La pregunta, moneda y fecha
+    viajan en el estado: usar `estado_inicial(question)` para cada invocación.
+    Si se pasa `historial`, las preguntas con fecha se resuelven en la serie histórica
+    en lugar de la búsqueda por embeddings. Con `analitica`, las preguntas de tendencia
+    se responden con los indicadores precalculados, sin LLM. Las conversiones
+    ("¿cuántos reales son 100 dólares?") van directo a la matriz de tipos cruzados.
+    El grafo sirve tanto `invoke` como `ainvoke`.
+    """
+    conversor = conversor or ConversionEngine(historial)
     workflow = StateGraph(AgentState)
-    workflow.add_node("fetch", fetch_cotizaciones)
-    workflow.add_node("process", procesar_datos)
-    workflow.add_node("rag", lambda s: rag_lookup(s, vectorstore))
-    workflow.add_node("analyze", lambda s: analizar_con_llm(s, mcp, question))
+    workflow.add_node("fetch", _nodo("fetch", fetch_cotizaciones, afetch_cotizaciones))
+    workflow.add_node("process", medir_nodo("process", procesar_datos))
+    nodo_rag = dict(vectorstore=vectorstore, historial=historial, analitica=analitica)
+    workflow.add_node("rag", _nodo("rag", partial(rag_lookup, **nodo_rag), partial(arag_lookup, **nodo_rag)))
+    workflow.add_node("analyze", _nodo("analyze", partial(analizar_con_llm, mcp=mcp),
+                                       partial(aanalizar_con_llm, mcp=mcp)))
 
-    workflow.set_entry_point("fetch")
+    workflow.add_node("convert", _nodo("convert", partial(convertir_monedas, conversor=conversor),
+                                       partial(aconvertir_monedas, conversor=conversor)))
+
+    workflow.add_conditional_edges(START, ruta_inicial, ["fetch", "rag", "convert"])
+    workflow.add_edge("convert", END)
     workflow.add_edge("fetch", "process")
-    workflow.add_edge("process", "rag")
-    workflow.add_edge("rag", "analyze")
+    workflow.add_conditional_edges("process", _ruta_rama, ["analyze", END])
+    workflow.add_conditional_edges("rag", _ruta_rama, ["analyze", END])
+    # join: en el caso paralelo "analyze" corre una sola vez, cuando terminaron ambas ramas
+    workflow.add_edge(["process", "rag"], "analyze")
     workflow.add_edge("analyze", END)
 
-    app = workflow.compile()
-    initial_state: AgentState = {
-        "question": question,
-        "moneda": moneda,
-        "fecha": fecha
-    }
-    return app, initial_state
+    return workflow.compile()
+
+async def astream_respuesta(graph, question: str):
+    """
+    Eventos de una respuesta en streaming: la intención detectada, los datos en cuanto
+    terminan fetch/RAG, los fragmentos del LLM a medida que llegan y el reporte final.
+    Si el LLM se corta después de algunos fragmentos llega `interrumpido` (los tokens ya
+    enviados se descartan) y el reporte final es el de solo datos, con `respaldo` en True.
+    """
+    state = estado_inicial(question)
+    yield {"tipo": "intencion", **{k: state[k] for k in ("moneda", "fecha", "desde", "hasta")}}
+    reporte, respaldo = "", False
+    async for modo, chunk in graph.astream(state, {"configurable": {"stream_llm": True}},
+                                           stream_mode=["updates", "custom"]):
+        if modo == "custom":
+            if "interrumpido" in chunk:
+                yield {"tipo": "interrumpido", "motivo": chunk["interrumpido"]}
+            else:
+                yield {"tipo": "token", "texto": chunk["token"]}
+            continue
+        for nodo, update in chunk.items():
+            if not update:
+                continue
+            if nodo == "process" and update.get("datos_procesados"):
+                yield {"tipo": "datos", **update["datos_procesados"]}
+            elif nodo == "rag":
+                yield {"tipo": "historico", "puntos": update.get("historico") or [],
+                       "resumen": update.get("resumen"),
+                       "documentos": [d["doc"]["text"] for d in update.get("rag_docs") or []]}
+            elif nodo == "convert" and update.get("conversion"):
+                yield {"tipo": "conversion", **update["conversion"]}
+            if "reporte" in update:
+                reporte, respaldo = update["reporte"], bool(update.get("respaldo"))
+    yield {"tipo": "reporte", "texto": reporte, "respaldo": respaldo}
@@ -1,9 +1,8 @@
-import os, re
-import openai
-from openai import OpenAI
+import os
 from typing import Optional
 from .mcp import MCPRegistry
-import google.generativeai as genai
+from .intent import parse_intent
+from .llm import PRIORIDAD_INTERACTIVA, get_gateway
 
 class CurrencyAgent:
     def __init__(self, mcp: MCPRegistry, vectorstore: Optional[object] = None, llm_model: str = "gemini-1.5-flash"):
@@ -11,36 +10,29 @@ class CurrencyAgent:
         self.vectorstore = vectorstore
         self.llm_model = llm_model
         self.google_api_key = os.getenv('GOOGLE_API_KEY')
-        self.client = OpenAI()  # Esto ya lee OPENAI_API_KEY de las variables de entorno
+        self._client = None
 
+    @property
+    def client(self):
+        # Cliente OpenAI creado en el primer uso (lee OPENAI_API_KEY de las variables de entorno)
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI()
+        return self._client
 
-    def call_llm(self, prompt: str, temperature: float = 0.0):
-        if not self.google_api_key:
+
+    def call_llm(self, prompt: str, temperature: float = 0.0, priority: int = PRIORIDAD_INTERACTIVA):
+        gateway = get_gateway()
+        if not self.google_api_key and not gateway.usa_stub:
             raise RuntimeError('GOOGLE_API_KEY no configurada. Establece la variable de entorno o usa un LLM local.')
-        model = genai.GenerativeModel(self.llm_model)
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=400
-            )
-        )
-        return response.text
-        
+        # el gateway reutiliza el modelo y aplica concurrencia, cupos y prioridad compartidos con la API
+        return gateway.generate(prompt, priority=priority, model=self.llm_model,
+                                temperature=temperature, max_tokens=400)
 
-    def _detect_moneda(self, question: str):
-        candidates = ['dólar','dolar','usd','real','euro','guaraní','guarani','pyg','gs']
-        q = question.lower()
-        for c in candidates:
-            if c in q:
-                return c
-        tokens = re.findall(r'\b[A-Z]{3,4}\b', question)
-        if tokens:
-            return tokens[0].lower()
-        return None
 
     def answer(self, question: str):
-        moneda = self._detect_moneda(question)
+        intent = parse_intent(question)
+        moneda = intent.moneda if intent.moneda_explicita else None
         if moneda and ('hoy' in question.lower() or 'cotizacion' in question.lower() or 'cotización' in question.lower() or 'precio' in question.lower()):
             res_html = None
             try:
@@ -48,7 +40,7 @@ class CurrencyAgent:
             except Exception as e:
                 res_html = None
             if res_html:
-                return {'type':'tool','tool':'cotizaciones.get_cotizacion_html','answer': f"Fuente HTML — {res_html['moneda']}: compra={res_html['compra']}, venta={res_html['venta']}",'raw': res_html}
+                return {'type':'tool','tool':'cotizaciones.get_cotizacion_html','answer': f"Fuente HTML — {res_html['result']['moneda']}: compra={res_html['result']['compra']}, venta={res_html['result']['venta']}",'raw': res_html}
             try:
                 res_pdf = self.mcp.call('cotizaciones.get_cotizacion_pdf', moneda=moneda)
                 if res_pdf:
@@ -56,7 +48,7 @@ class CurrencyAgent:
             except Exception as e:
                 return {'type':'error','message': str(e)}
         if self.vectorstore and moneda and('ayer' in question.lower() or 'cotizacion' in question.lower() or 'cotización' in question.lower() or 'precio' in question.lower()):
-            self.vectorstore.load('data/vectorstore.pkl')
+            self.vectorstore.load('data/vectorstore')
             docs = self.vectorstore.query(question, k=3)
             if docs:
                 context = "\n\n".join([d['doc']['text'] for d in docs])
@@ -1,33 +1,215 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import List
+import json
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from .mcp import MCPRegistry, analyze_with_llm, LLMAnalysisInput
-from .tools.cotizaciones_tool import get_cotizacion, find_cotizacion_html
+from .mcp import MCPRegistry, analyze_with_llm, analyze_with_llm_async, analyze_with_llm_stream, LLMAnalysisInput
+from .tools.cotizaciones_tool import (get_cotizacion, find_cotizacion_html, aclose_http_client, chaco_cache_stats,
+                                      pdf_cache_stats)
 from .rag.vectorstore import SimpleVectorStore
-from .agent import build_currency_agent_graph
+from .rag.embedding_service import EMBEDDING_SOCKET, RemoteEncoder
+from .rag.encoders import EMBEDDING_MODEL
+from .rag.timeseries import RateHistoryStore
+from .rag.analytics import RateAnalytics
+from .tools.conversion import ConversionEngine, ConversionInput
+from .agent import build_currency_agent_graph, estado_inicial, astream_respuesta, esta_desactualizado
+from .batch import aresponder_lote
+from .llm_cache import LLMAnswerCache
+from .llm import get_gateway
+from .collector import COLLECTOR_ENABLED, RateCollector
+from .resilience import circuitos_stats
+from . import metrics
+import logging
 import os
+import threading
 
-app = FastAPI(title='AGENTE DE COTIZACIONES DE MONEDAS (MCP demo)')
+# Con EMBEDDINGS_WARMUP=0 el modelo de embeddings se carga recién en la primera consulta RAG
+EMBEDDINGS_WARMUP = os.getenv('EMBEDDINGS_WARMUP', '1') == '1'
+# Máximo de preguntas por request en /ask/batch
+ASK_BATCH_MAX = int(os.getenv('ASK_BATCH_MAX', '100'))
+
+# Errores de upstream, circuitos y recolector salen por `logging` (nivel con LOG_LEVEL)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+log = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El worker empieza a atender /health y las cotizaciones de hoy sin esperar al modelo
+    if EMBEDDINGS_WARMUP:
+        threading.Thread(target=vs.warmup, name='embeddings-warmup', daemon=True).start()
+    # Con COLLECTOR_ENABLED=1 las cotizaciones de hoy llegan por el recolector y las requests no salen a internet
+    if COLLECTOR_ENABLED:
+        recolector.start()
+    try:
+        yield
+    finally:
+        if COLLECTOR_ENABLED:
+            recolector.stop()
+        await aclose_http_client()
+
+app = FastAPI(title='AGENTE DE COTIZACIONES DE MONEDAS (MCP demo)', lifespan=lifespan)
+
+@app.middleware('http')
+async def medir_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # la plantilla de la ruta (no la URL) para no crear una serie por cada path distinto;
+        # en /ask/stream mide hasta que se envían los headers
+        ruta = getattr(request.scope.get('route'), 'path', 'otros')
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - t0, path=ruta, method=request.method)
+        metrics.HTTP_REQUESTS.inc(path=ruta, method=request.method, status=str(status))
+
+# Respuestas del LLM cacheadas en disco por intención + huella de los datos (ahorra cuota de Gemini)
+llm_cache = LLMAnswerCache()
 
 mcp = MCPRegistry()
 mcp.register('cotizaciones.get_cotizacion_html', find_cotizacion_html, description='Obtiene cotización desde una página HTML')
-mcp.register('llm.analyze', analyze_with_llm, description='Analiza cotización con LLM', input_model=LLMAnalysisInput)
+mcp.register('llm.analyze', llm_cache.wrap(analyze_with_llm), description='Analiza cotización con LLM',
+             input_model=LLMAnalysisInput, async_func=llm_cache.awrap(analyze_with_llm_async),
+             stream_func=llm_cache.awrap_stream(analyze_with_llm_stream))
 
-# Cargar vectorstore si existe
-vs = SimpleVectorStore()
-if os.path.exists('data/vectorstore.pkl'):
-    try:
-        vs.load('data/vectorstore.pkl')
-    except Exception:
-        pass
+VECTORSTORE_PATH = os.getenv('VECTORSTORE_PATH', 'data/vectorstore')
+
+# Cargar vectorstore si existe (directorio con mmap; el pickle anterior queda como respaldo).
+# La matriz se abre con mmap de solo lectura: todos los workers comparten las mismas páginas.
+# Con EMBEDDING_SOCKET los encodes van al servicio de embeddings compartido y el worker no carga el modelo.
+vs = SimpleVectorStore(model=RemoteEncoder(EMBEDDING_SOCKET, model_name=EMBEDDING_MODEL) if EMBEDDING_SOCKET else None)
+for path in (VECTORSTORE_PATH, 'data/vectorstore.pkl'):
+    if os.path.exists(path):
+        try:
+            vs.load(path)
+            break
+        except Exception as e:
+            # p. ej. el servicio de embeddings sirve otro modelo que el del manifest
+            log.error("no se pudo cargar el vectorstore %s: %s", path, e)
+
+# Serie histórica indexada por moneda/fecha, construida desde el meta de los documentos
+historial = RateHistoryStore.from_docs(vs.live_docs())
+# Indicadores de tendencia precalculados por moneda (se actualizan solos al ingerir datos)
+analitica = RateAnalytics(historial)
+analitica.actualizar()
+
+# Snapshots periódicos de Cambios Chaco → cache, serie histórica y vectorstore (se inicia en `lifespan`)
+recolector = RateCollector(vs, historial, analitica, store_path=VECTORSTORE_PATH)
+
+# Tipos cruzados entre todas las monedas (matriz N×N cacheada por snapshot / por fecha)
+conversor = ConversionEngine(historial)
+mcp.register('cotizaciones.convertir', conversor.convertir, description='Convierte un monto entre dos monedas',
+             input_model=ConversionInput, async_func=conversor.aconvertir)
+
+# El grafo se compila una sola vez al iniciar; cada request solo aporta su estado inicial
+graph = build_currency_agent_graph(vectorstore=vs, mcp=mcp, historial=historial, analitica=analitica,
+                                   conversor=conversor)
+
+@metrics.REGISTRY.colector
+def _metricas_de_caches():
+    caches = {'cambios_chaco': chaco_cache_stats(), 'query_embeddings': vs.query_cache_stats(), 'llm': llm_cache.stats()}
+    hits = [({'cache': n}, s.get('hits', 0) + s.get('stale_hits', 0)) for n, s in caches.items() if s]
+    hits.append(({'cache': 'cambios_chaco_pdf'}, pdf_cache_stats()['hits']))
+    gateway = get_gateway().stats()
+    return [
+        ('cache_hits_total', 'counter', 'Aciertos por cache (Cambios Chaco incluye snapshots vencidos)', hits),
+        ('cache_misses_total', 'counter', 'Fallos por cache',
+         [({'cache': n}, s.get('misses')) for n, s in caches.items() if s]),
+        ('cache_hit_ratio', 'gauge', 'Proporción de aciertos por cache',
+         [({'cache': n}, s.get('hit_ratio')) for n, s in caches.items() if s]),
+        ('llm_gateway_in_flight', 'gauge', 'Llamadas al LLM en curso', [({}, gateway['en_vuelo'])]),
+        ('llm_gateway_queued', 'gauge', 'Llamadas al LLM esperando turno', [({}, gateway['en_cola'])]),
+        ('llm_gateway_rejected_total', 'counter', 'Llamadas al LLM rechazadas por cuota o espera',
+         [({}, gateway.get('rechazadas'))]),
+        ('collector_snapshot_age_seconds', 'gauge', 'Edad del último snapshot publicado por el recolector',
+         [({}, recolector.stats()['edad_segundos'])]),
+    ]
 
 class Query(BaseModel):
     question: str
+    timing: bool = False   # /ask: agrega el desglose de tiempos de la request (depuración)
+
+def _respuesta(out: dict) -> dict:
+    # desactualizado: la cotización (o la conversión) es el último snapshot bueno porque Cambios Chaco no responde
+    return {"reporte": out.get("reporte", ""), "desactualizado": esta_desactualizado(out)}
 
 @app.post("/ask")
-def ask(q: Query):
-    graph, init_state = build_currency_agent_graph(question=q.question, vectorstore=vs, mcp=mcp)
-    out = graph.invoke(init_state)
-    return {"reporte": out.get("reporte", "")}
+async def ask(q: Query):
+    # Todo el camino es async: HTTP con httpx, Gemini async y encode en un executor acotado.
+    # Cada request tiene un plazo (REQUEST_DEADLINE) que los nodos descuentan de sus timeouts.
+    if not q.timing:
+        return _respuesta(await graph.ainvoke(estado_inicial(q.question)))
+    with metrics.desglose() as tramos:
+        t0 = time.perf_counter()
+        out = await graph.ainvoke(estado_inicial(q.question))
+        total_ms = round((time.perf_counter() - t0) * 1000, 3)
+    return {**_respuesta(out), "tiempos": {"total_ms": total_ms, "tramos": tramos}}
+
+async def _formatear_eventos(question: str, sse: bool):
+    try:
+        async for evento in astream_respuesta(graph, question):
+            datos = json.dumps(evento, ensure_ascii=False)
+            yield f"event: {evento['tipo']}\ndata: {datos}\n\n" if sse else datos + "\n"
+    except Exception as e:
+        datos = json.dumps({'tipo': 'error', 'mensaje': str(e)}, ensure_ascii=False)
+        yield f"event: error\ndata: {datos}\n\n" if sse else datos + "\n"
+
+@app.post("/ask/stream")
+async def ask_stream(q: Query, request: Request):
+    # NDJSON por defecto; SSE si el cliente pide text/event-stream
+    sse = 'text/event-stream' in request.headers.get('accept', '')
+    return StreamingResponse(_formatear_eventos(q.question, sse),
+                             media_type='text/event-stream' if sse else 'application/x-ndjson',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+class BatchQuery(BaseModel):
+    questions: List[str]
+
+@app.post("/ask/batch")
+async def ask_batch(q: BatchQuery):
+    # Un fetch del snapshot, un encode para las consultas RAG distintas y un LLM por intención distinta
+    if len(q.questions) > ASK_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f'Máximo {ASK_BATCH_MAX} preguntas por lote')
+    resultados = await aresponder_lote(q.questions, vectorstore=vs, mcp=mcp, historial=historial,
+                                     analitica=analitica, conversor=conversor)
+    return {"resultados": resultados}
+
+@app.post('/convert')
+async def convert(q: ConversionInput):
+    try:
+        return await mcp.acall('cotizaciones.convertir', **q.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get('/cache/stats')
+async def cache_stats():
+    return {
+        'cambios_chaco': chaco_cache_stats(),
+        'cambios_chaco_pdf': pdf_cache_stats(),
+        'query_embeddings': vs.query_cache_stats(),
+        'llm': llm_cache.stats(),
+        'conversion': conversor.stats(),
+        'circuitos': circuitos_stats(),
+        **({'embedding_service': _stats_servicio_embeddings()} if EMBEDDING_SOCKET else {}),
+        **({'collector': recolector.stats()} if COLLECTOR_ENABLED else {}),
+    }
+
+def _stats_servicio_embeddings():
+    try:
+        return vs.model.stats()
+    except OSError as e:
+        return {'error': str(e)}
+
+@app.get('/llm/stats')
+async def llm_stats():
+    return get_gateway().stats()
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get('/health')
 async def health():
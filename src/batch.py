@@ -0,0 +1,127 @@
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+from .agent import (AgentState, aconvertir_monedas, esta_desactualizado, estado_inicial, filtro_rag, llm_kwargs,
+                    plan_rag, procesar_datos, reporte_sin_llm, reporte_solo_datos, ruta_inicial)
+from .llm import PRIORIDAD_BATCH, LLMUnavailable
+from .llm_cache import LLMAnswerCache
+from .mcp import MCPRegistry
+from .rag.analytics import RateAnalytics
+from .rag.timeseries import RateHistoryStore
+from .rag.vectorstore import SimpleVectorStore
+from .resilience import con_deadline, nuevo_deadline
+from .tools.conversion import ConversionEngine
+from .tools.cotizaciones_tool import aget_cotizacion, aget_cotizaciones_chaco
+
+
+async def _fetch_lote(estados: Dict[int, AgentState]):
+    """Un snapshot de Cambios Chaco para todo el lote y una búsqueda por moneda distinta."""
+    monedas = sorted({s["moneda"] for s in estados.values()})
+    if not monedas:
+        return
+    await aget_cotizaciones_chaco()
+    # con el snapshot ya cacheado estas búsquedas no salen a la red (salvo el fallback PDF)
+    resultados = await asyncio.gather(*(aget_cotizacion(m) for m in monedas), return_exceptions=True)
+    por_moneda = dict(zip(monedas, resultados))
+    for s in estados.values():
+        raw = por_moneda[s["moneda"]]
+        s["raw_cotizacion"] = None if isinstance(raw, Exception) else raw
+        s.update(procesar_datos(s))
+
+
+async def _rag_lote(estados: Dict[int, AgentState], vectorstore: Optional[SimpleVectorStore],
+                    historial: Optional[RateHistoryStore], analitica: Optional[RateAnalytics]):
+    """Serie histórica por estado y un único encode + producto matricial para las consultas RAG distintas."""
+    pendientes = {}  # (consulta, filtro) → índices que la necesitan
+    for i, s in estados.items():
+        update, consulta = plan_rag(s, historial, analitica)
+        s.update(update)
+        if consulta and vectorstore:
+            where = filtro_rag(s)
+            pendientes.setdefault((consulta, json.dumps(where, sort_keys=True)), (where, []))[1].append(i)
+    if not pendientes:
+        return
+    claves = list(pendientes)
+    docs = await vectorstore.aquery_many([c for c, _ in claves], k=5, where=[pendientes[c][0] for c in claves])
+    for clave, resultado in zip(claves, docs):
+        for i in pendientes[clave][1]:
+            estados[i]["rag_docs"] = resultado
+
+
+async def _convertir_lote(estados: Dict[int, AgentState], conversor: ConversionEngine):
+    """Todas las conversiones salen de la misma matriz de tipos cruzados (un snapshot por lote)."""
+    if not estados:
+        return
+    # el snapshot de Cambios Chaco se pide una sola vez (single-flight) y la matriz se arma una vez
+    updates = await asyncio.gather(*(aconvertir_monedas(s, conversor) for s in estados.values()))
+    for s, update in zip(estados.values(), updates):
+        s.update(update)
+
+
+async def _analizar_lote(estados: Dict[int, AgentState], mcp: MCPRegistry) -> Dict[int, str]:
+    """Reportes sin LLM donde alcanza; una sola llamada al LLM por intención + datos distintos."""
+    reportes, grupos = {}, {}
+    for i, s in estados.items():
+        reporte = s.get("reporte") or reporte_sin_llm(s)
+        if reporte is not None:
+            reportes[i] = reporte
+            continue
+        kwargs = llm_kwargs(s)
+        grupos.setdefault(LLMAnswerCache.key(**kwargs), (kwargs, []))[1].append(i)
+
+    claves = list(grupos)
+    # prioridad batch: las preguntas interactivas de /ask pasan antes en la cola del gateway
+    salidas = await asyncio.gather(*(mcp.acall("llm.analyze", **grupos[c][0], priority=PRIORIDAD_BATCH)
+                                     for c in claves), return_exceptions=True)
+    for clave, salida in zip(claves, salidas):
+        for i in grupos[clave][1]:
+            if isinstance(salida, LLMUnavailable):
+                reportes[i] = reporte_solo_datos(estados[i], str(salida))
+            else:
+                reportes[i] = salida  # puede ser una excepción: se informa como error del ítem
+    return reportes
+
+
+async def aresponder_lote(preguntas: List[str], vectorstore: Optional[SimpleVectorStore] = None,
+                          mcp: Optional[MCPRegistry] = None, historial: Optional[RateHistoryStore] = None,
+                          analitica: Optional[RateAnalytics] = None,
+                          conversor: Optional[ConversionEngine] = None) -> List[dict]:
+    """
+    Responde varias preguntas agrupando el trabajo: se analizan todas las intenciones,
+    se hace un solo fetch del snapshot, un solo encode/búsqueda vectorial para las
+    consultas RAG distintas y a lo sumo una llamada al LLM por intención distinta.
+    Devuelve un resultado por pregunta, en el orden de entrada, con errores por ítem.
+    Todo el lote comparte el plazo de una request (`REQUEST_DEADLINE`).
+    """
+    resultados: List[dict] = [{"question": q} for q in preguntas]
+    estados: Dict[int, AgentState] = {}
+    for i, q in enumerate(preguntas):
+        try:
+            estados[i] = estado_inicial(q)
+        except Exception as e:
+            resultados[i]["error"] = str(e)
+
+    with con_deadline(nuevo_deadline()):
+        rutas = {i: ruta_inicial(s) for i, s in estados.items()}
+        fetch = {i: s for i, s in estados.items() if "fetch" in rutas[i]}
+        rag = {i: s for i, s in estados.items() if "rag" in rutas[i]}
+        conv = {i: s for i, s in estados.items() if "convert" in rutas[i]}
+        etapas = await asyncio.gather(_fetch_lote(fetch), _rag_lote(rag, vectorstore, historial, analitica),
+                                      _convertir_lote(conv, conversor or ConversionEngine(historial)),
+                                      return_exceptions=True)
+        # si una etapa compartida falla, fallan solo los ítems que dependían de ella
+        for etapa, grupo in zip(etapas, (fetch, rag, conv)):
+            if isinstance(etapa, Exception):
+                for i in grupo:
+                    resultados[i]["error"] = str(etapa)
+                    estados.pop(i, None)
+
+        reportes = await _analizar_lote(estados, mcp)
+    for i, reporte in reportes.items():
+        if isinstance(reporte, Exception):
+            resultados[i]["error"] = str(reporte)
+        else:
+            resultados[i]["reporte"] = reporte
+            resultados[i]["desactualizado"] = esta_desactualizado(estados[i])
+    return resultados
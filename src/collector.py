@@ -0,0 +1,297 @@
+"""
+Recolector de cotizaciones en segundo plano.
+
+Cada `COLLECTOR_INTERVAL` segundos (± `COLLECTOR_JITTER`) toma un snapshot de Cambios Chaco
+(la API JSON y, si falla, la tabla del PDF) y lo publica en el cache de snapshots: con el
+recolector activo las requests leen solo ese estado local y nunca esperan al upstream.
+Cada snapshot además completa la serie histórica (solo en fechas sin dato del BCP, con
+Cambios Chaco como fuente de esos puntos) y se
+indexa en el vectorstore y se guarda en disco de forma incremental.
+
+Con varios workers, solo el proceso que toma el lock del archivo de estado consulta el
+upstream, indexa y escribe; los demás publican el snapshot que ese proceso deja en
+`COLLECTOR_STATE` y recargan el vectorstore cuando el líder guarda filas nuevas.
+También puede correr aparte (sidecar o cron):
+
+    python -m src.collector                 # en bucle
+    python -m src.collector --una-vez       # un snapshot y salir
+
+Al arrancar (backfill) se publica el último snapshot guardado y se suman a la serie los
+snapshots ya indexados. Si ese snapshot es más viejo que el intervalo, la primera consulta
+se hace enseguida (catch-up); Cambios Chaco no publica cotizaciones pasadas, así que los días
+hábiles que quedaron sin snapshot se informan en `stats()["dias_sin_snapshot"]`.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from . import metrics
+from .rag.analytics import RateAnalytics
+from .rag.timeseries import RateHistoryStore
+from .rag.vectorstore import SimpleVectorStore
+from .tools.cotizaciones_tool import descargar_snapshot, publicar_snapshot, usar_snapshot_externo
+
+log = logging.getLogger(__name__)
+
+COLLECTOR_ENABLED = os.getenv("COLLECTOR_ENABLED", "0") == "1"
+COLLECTOR_INTERVAL = float(os.getenv("COLLECTOR_INTERVAL", "300"))   # segundos entre snapshots
+COLLECTOR_JITTER = float(os.getenv("COLLECTOR_JITTER", "0.1"))       # fracción del intervalo
+COLLECTOR_RETRY = float(os.getenv("COLLECTOR_RETRY", "30"))          # segundos hasta reintentar tras un error
+COLLECTOR_STATE = os.getenv("COLLECTOR_STATE", "data/collector_state.json")
+
+FUENTE = "Cambios Chaco"
+
+
+def _valor_medio(fila: dict) -> Optional[float]:
+    valores = [v for v in (fila.get("compra"), fila.get("venta")) if v is not None]
+    return sum(valores) / len(valores) if valores else None
+
+
+def construir_doc_chaco(fila: dict) -> dict:
+    """Documento del vectorstore para una fila del snapshot (uno por moneda y día: el último del día gana)."""
+    meta = fila.get("meta") or {}
+    fecha, moneda = meta["fecha"], fila["moneda"]
+    fuente = meta.get("fuente", FUENTE)
+    return {"id": f"{fecha}_{moneda}_chaco",
+            "text": f"El {fecha} {fuente} cotizó {moneda} a {fila['compra']} guaraníes la compra "
+                    f"y {fila['venta']} la venta.",
+            # sin `valor_guaranies`: `RateHistoryStore.from_docs` solo toma los documentos del BCP
+            "meta": {"fecha": fecha, "moneda": moneda, "compra": fila["compra"], "venta": fila["venta"],
+                     "fuente": fuente}}
+
+
+def _dias_habiles_entre(desde: datetime.date, hasta: datetime.date) -> List[str]:
+    """Días hábiles estrictamente entre `desde` y `hasta`."""
+    dias, d = [], desde + datetime.timedelta(days=1)
+    while d < hasta:
+        if d.weekday() < 5:
+            dias.append(d.isoformat())
+        d += datetime.timedelta(days=1)
+    return dias
+
+
+class RateCollector:
+    """
+    Snapshots periódicos de Cambios Chaco hacia el cache, la serie histórica y el vectorstore.
+    `descargar` devuelve (filas, origen) como `descargar_snapshot`; se puede reemplazar en pruebas.
+    """
+
+    def __init__(self, vectorstore: Optional[SimpleVectorStore] = None, historial: Optional[RateHistoryStore] = None,
+                 analitica: Optional[RateAnalytics] = None, store_path: Optional[str] = None,
+                 state_path: str = COLLECTOR_STATE, intervalo: float = COLLECTOR_INTERVAL,
+                 jitter: float = COLLECTOR_JITTER, reintento: float = COLLECTOR_RETRY,
+                 descargar=descargar_snapshot, seed: Optional[int] = None):
+        self.vectorstore, self.historial, self.analitica = vectorstore, historial, analitica
+        self.store_path, self.state_path = store_path, state_path
+        self.intervalo, self.jitter, self.reintento = intervalo, min(max(jitter, 0.0), 1.0), reintento
+        self._descargar = descargar
+        self._rng = random.Random(seed)
+        self._stop = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock_file = None
+        self._propios = set()          # (moneda, fecha) que la serie tiene por el recolector
+        self._ultimo: Optional[float] = None   # epoch del último snapshot publicado
+        self._dias_sin_snapshot: List[str] = []
+        self._stats = {"snapshots": 0, "errores": 0, "json": 0, "pdf": 0, "estado": 0, "docs_indexados": 0,
+                       "recargas": 0}
+
+    # --- Coordinación entre procesos ---
+    def es_lider(self) -> bool:
+        """True si este proceso tiene el lock: consulta el upstream, indexa y escribe a disco."""
+        if self._lock_file is not None:
+            return True
+        if not self.state_path:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            return True   # sin flock (Windows): se asume un solo proceso
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        f = open(self.state_path + ".lock", "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def _leer_estado(self) -> Optional[dict]:
+        if not self.state_path:
+            return None
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                estado = json.load(f)
+            return estado if estado.get("filas") else None
+        except (OSError, ValueError):
+            return None
+
+    def _guardar_estado(self, ts: float, origen: str, filas: list):
+        if not self.state_path:
+            return
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ts": ts, "origen": origen, "filas": filas}, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    # --- Escritura del snapshot ---
+    def _a_serie(self, filas: Iterable[Tuple[str, str, Optional[float]]]):
+        """Agrega a la serie los puntos de fechas sin dato del BCP (o que ya eran del recolector)."""
+        if self.historial is None:
+            return
+        nuevos = [(m, f, v) for m, f, v in filas if v is not None
+                  and ((m, f) in self._propios or self.historial.exact(m, f) is None)]
+        if not nuevos:
+            return
+        self._propios.update((m, f) for m, f, _ in nuevos)
+        self.historial.add_many((m, f, v, FUENTE) for m, f, v in nuevos)
+        if self.analitica is not None:
+            for moneda in {m for m, _, _ in nuevos}:
+                self.analitica.actualizar(moneda)
+
+    def _registrar(self, filas: list, indexar: bool):
+        self._a_serie((f["moneda"], f["meta"]["fecha"], _valor_medio(f)) for f in filas)
+        if not indexar or self.vectorstore is None:
+            return
+        res = self.vectorstore.upsert([construir_doc_chaco(f) for f in filas])
+        self._stats["docs_indexados"] += res["insertados"] + res["actualizados"]
+        if self.store_path and (res["insertados"] or res["actualizados"]):
+            self.vectorstore.save(self.store_path)
+
+    def _recargar_store(self):
+        """Seguidor: toma del disco las filas que el líder ya indexó y guardó."""
+        if self.vectorstore is None or not self.store_path:
+            return
+        try:
+            if self.vectorstore.refresh(self.store_path):
+                self._stats["recargas"] += 1
+        except Exception as e:
+            # p. ej. el líder está reemplazando el directorio tras una compactación: se reintenta en la próxima vuelta
+            log.warning("no se pudo recargar el vectorstore %s: %s", self.store_path, e)
+
+    def _publicar(self, filas: list, ts: float, origen: str):
+        publicar_snapshot(filas, edad=max(0.0, time.time() - ts))
+        self._ultimo = ts
+        self._stats["snapshots"] += 1
+        self._stats[origen] += 1
+
+    def recolectar(self) -> bool:
+        """Un snapshot: del upstream si este proceso es el líder, si no del archivo de estado del líder."""
+        if not self.es_lider():
+            estado = self._leer_estado()
+            if estado and (self._ultimo is None or estado["ts"] > self._ultimo):
+                self._publicar(estado["filas"], estado["ts"], "estado")
+                self._registrar(estado["filas"], indexar=False)
+                metrics.COLLECTOR_SNAPSHOTS.inc(fuente="estado", status="ok")
+            # el líder guarda el estado antes de indexar: el store se mira en cada vuelta, no solo con estado nuevo
+            self._recargar_store()
+            return True
+        status, origen = "error", "upstream"
+        try:
+            with metrics.cronometro(metrics.COLLECTOR_SECONDS):
+                filas, origen = self._descargar()
+                if not filas:
+                    raise ValueError("snapshot vacío")
+                ts = time.time()
+                self._publicar(filas, ts, origen)
+                # primero el estado: si el indexado falla, el backfill lo reintenta al reiniciar
+                self._guardar_estado(ts, origen, filas)
+                self._registrar(filas, indexar=True)
+            status = "ok"
+            return True
+        except Exception as e:
+            log.warning("error al tomar el snapshot: %s", e)
+            self._stats["errores"] += 1
+            return False
+        finally:
+            metrics.COLLECTOR_SNAPSHOTS.inc(fuente=origen, status=status)
+
+    def backfill(self):
+        """Estado inicial: snapshots ya indexados a la serie y el último snapshot guardado al cache."""
+        if self.historial is not None and self.vectorstore is not None:
+            metas = (d.get("meta") or {} for d in self.vectorstore.live_docs())
+            self._a_serie((m["moneda"], m["fecha"], _valor_medio(m)) for m in metas
+                          if str(m.get("fuente", "")).startswith(FUENTE) and m.get("fecha"))
+        estado = self._leer_estado()
+        if not estado:
+            return
+        self._publicar(estado["filas"], estado["ts"], "estado")
+        # idempotente: si el snapshot ya estaba indexado el upsert no cambia nada
+        self._registrar(estado["filas"], indexar=self.es_lider())
+        ultimo = datetime.date.fromtimestamp(estado["ts"])
+        self._dias_sin_snapshot = _dias_habiles_entre(ultimo, datetime.date.today())
+        if self._dias_sin_snapshot:
+            log.warning("sin snapshots de Cambios Chaco para %d días hábiles (%s a %s)", len(self._dias_sin_snapshot),
+                        self._dias_sin_snapshot[0], self._dias_sin_snapshot[-1])
+
+    # --- Bucle ---
+    def _espera(self, base: float) -> float:
+        return max(0.0, base * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+
+    def _bucle(self):
+        # catch-up: si el último snapshot ya venció, el primero se toma enseguida
+        edad = time.time() - self._ultimo if self._ultimo is not None else None
+        espera = 0.0 if edad is None or edad >= self.intervalo else self.intervalo - edad
+        while not self._stop.wait(espera):
+            ok = self.recolectar()
+            espera = self._espera(self.intervalo if ok else min(self.intervalo, self.reintento))
+
+    def start(self) -> "RateCollector":
+        self.backfill()
+        usar_snapshot_externo(True)
+        self._stop.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="rate-collector", daemon=True)
+        self._hilo.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+        usar_snapshot_externo(False)
+        if self._lock_file is not None:
+            self._lock_file.close()   # libera el flock
+            self._lock_file = None
+
+    def stats(self) -> dict:
+        return {**self._stats, "lider": self._lock_file is not None,
+                "edad_segundos": time.time() - self._ultimo if self._ultimo is not None else None,
+                "dias_sin_snapshot": self._dias_sin_snapshot}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=os.getenv("VECTORSTORE_PATH", "data/vectorstore"))
+    parser.add_argument("--estado", default=COLLECTOR_STATE)
+    parser.add_argument("--intervalo", type=float, default=COLLECTOR_INTERVAL)
+    parser.add_argument("--una-vez", action="store_true", help="tomar un solo snapshot y salir")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    store = SimpleVectorStore()
+    if os.path.isdir(args.store):
+        store.load(args.store)
+    recolector = RateCollector(store, store_path=args.store, state_path=args.estado, intervalo=args.intervalo)
+    if not recolector.es_lider():
+        raise SystemExit(f"Otro proceso ya tiene el lock de {args.estado}")
+    if args.una_vez:
+        raise SystemExit(0 if recolector.recolectar() else 1)
+    recolector.start()
+    log.info("recolector activo: un snapshot cada %.0fs en %s", args.intervalo, args.store)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        recolector.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import datetime
+import functools
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Alias por ISO (se comparan sin acentos ni mayúsculas y aceptan plural)
+ALIAS_MONEDAS: Dict[str, List[str]] = {
+    'USD': ['dólar', 'dollar', 'usd', 'dólar usa', 'dólar americano', 'dólar estadounidense', 'us$'],
+    'JPY': ['yen', 'jpy', 'yen japonés'],
+    'GBP': ['libra', 'gbp', 'libra esterlina', 'esterlina'],
+    'CHF': ['franco suizo', 'chf'],
+    'SEK': ['corona sueca', 'sek'],
+    'DKK': ['corona danesa', 'dkk'],
+    'NOK': ['corona noruega', 'nok'],
+    'BRL': ['real', 'brl', 'real brasileño'],
+    'ARS': ['peso argentino', 'ars'],
+    'CAD': ['dólar canadiense', 'cad'],
+    'ZAR': ['rand', 'zar'],
+    'XDR': ['derechos especiales de giro', 'deg', 'xdr'],
+    'XAU': ['onza de oro', 'oro', 'xau'],
+    'CLP': ['peso chileno', 'clp'],
+    'EUR': ['euro', 'eur'],
+    'UYU': ['peso uruguayo', 'uyu'],
+    'AUD': ['dólar australiano', 'aud'],
+    'CNY': ['yuan', 'renminbi', 'cny', 'yuan chino'],
+    'SGD': ['dólar de singapur', 'sgd'],
+    'BOB': ['boliviano', 'bob'],
+    'PEN': ['sol peruano', 'pen'],
+    'NZD': ['dólar neozelandés', 'nzd'],
+    'MXN': ['peso mexicano', 'mxn'],
+    'COP': ['peso colombiano', 'cop'],
+    'TWD': ['dólar taiwanés', 'twd'],
+    'AED': ['dirham', 'emiratos', 'aed'],
+    'PYG': ['guaraní', 'gs', 'pyg'],
+}
+ISO_CONOCIDOS = frozenset(ALIAS_MONEDAS)
+MONEDA_BASE = "PYG"       # las cotizaciones se expresan en guaraníes
+MONEDA_POR_DEFECTO = "USD"
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
+    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12
+}
+
+
+_SIN_ACENTOS = str.maketrans("áéíóúüàèìòùâêîôûñ", "aeiouuaeiouaeioun")
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sin acentos y con espacios colapsados."""
+    t = (texto or "").lower().translate(_SIN_ACENTOS)
+    if not t.isascii():
+        t = "".join(c for c in unicodedata.normalize("NFKD", t) if not unicodedata.combining(c))
+    return " ".join(t.split())
+
+
+# --- Monedas: autómata sobre palabras (trie de alias, gana el alias más largo) ---
+_RE_PALABRA = re.compile(r"[a-z0-9]+\$?")
+
+def _construir_trie():
+    formas: Dict[str, str] = {}   # forma en el texto (con plural) → palabra canónica
+    trie: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+    for iso, aliases in ALIAS_MONEDAS.items():
+        for alias in aliases:
+            palabras = tuple(_RE_PALABRA.findall(normalizar_texto(alias)))
+            for p in palabras:
+                # cada palabra admite plural: "pesos argentinos", "reales", "dólares"
+                for forma in (p, p + "s", p + "es"):
+                    formas.setdefault(forma, p)
+            trie.setdefault(palabras[0], []).append((palabras, iso))
+    for candidatos in trie.values():
+        candidatos.sort(key=lambda c: len(c[0]), reverse=True)
+    return formas, trie
+
+_FORMAS, _TRIE = _construir_trie()
+
+
+def _alias_en(canon: List[Optional[str]], i: int) -> Optional[Tuple[str, int]]:
+    """(ISO, palabras que ocupa) del alias más largo que empieza en la posición `i`."""
+    candidatos = _TRIE.get(canon[i]) if canon[i] else None
+    if candidatos:
+        for alias, iso in candidatos:
+            k = len(alias)
+            if tuple(canon[i:i + k]) == alias:
+                return iso, k
+    return None
+
+
+def _buscar_en_palabras(palabras: List[str]) -> Tuple[str, ...]:
+    canon = [_FORMAS.get(p) for p in palabras]
+    vistas = []
+    i, n = 0, len(canon)
+    while i < n:
+        encontrado = _alias_en(canon, i)
+        avance = 1
+        if encontrado:
+            iso, avance = encontrado
+            if iso not in vistas:
+                vistas.append(iso)
+        i += avance
+    return tuple(vistas)
+
+
+def _iso_al_inicio(texto: str) -> Optional[str]:
+    """ISO si `texto` empieza con un alias de moneda ("dólares canadienses de..." → CAD)."""
+    canon = [_FORMAS.get(p) for p in _RE_PALABRA.findall(texto)]
+    encontrado = _alias_en(canon, 0) if canon else None
+    return encontrado[0] if encontrado else None
+
+
+def buscar_monedas(texto: str, normalizado: bool = False) -> Tuple[str, ...]:
+    """ISO de todas las monedas mencionadas, en orden de aparición y sin repetir."""
+    t = texto if normalizado else normalizar_texto(texto)
+    return _buscar_en_palabras(_RE_PALABRA.findall(t))
+
+
+def moneda_iso(texto: str) -> str:
+    """
+    ISO para un nombre, alias o código de moneda ("dolar" → "USD", "eur" → "EUR").
+    Si no se reconoce, devuelve el texto en mayúsculas por si ya es un ISO.
+    """
+    t = normalizar_texto(texto)
+    encontradas = buscar_monedas(t, normalizado=True)
+    return encontradas[0] if encontradas else t.upper()
+
+
+# --- Montos: "100 dólares", "US$ 1.500", "1,5 euros" (coma decimal, punto de miles) ---
+# el lookbehind va después del primer dígito: así la búsqueda salta rápido las posiciones sin dígitos
+_RE_NUMERO = re.compile(r"\d(?<![\w/.,-]\d)\d*(?:[.,]\d+)*(?![\w/-]|[.,]\d)")
+_RE_TRAS = re.compile(r"\s*(?:de\s+)?([a-z]+\$?(?:\s+[a-z]+\$?){0,3})")
+_RE_ANTES = re.compile(r"([a-z]+\$?)\.?\s*$")
+_RE_UN = re.compile(r"\buna?\s+([a-z]+\$?(?:\s+[a-z]+\$?){0,3})")
+# pistas de conversión: "¿cuántos reales son...?", "convertir", "equivale", "EUR/USD"
+_RE_CONVERSION = re.compile(r"\bcuant[oa]s?\b|convert|equival|(?<![a-z])[a-z]{3}\$?/[a-z]{3}\b")
+_RE_CUANTOS = re.compile(r"\bcuant[oa]s?\b")
+
+
+def _numero(texto: str) -> float:
+    separadores = set(re.findall(r"[.,]", texto))
+    if not separadores:
+        return float(texto)
+    partes = re.split(r"[.,]", texto)
+    if len(separadores) == 1 and all(len(p) == 3 for p in partes[1:]):
+        return float("".join(partes))   # "1.000", "1.000.000": separador de miles
+    # el último separador es el decimal ("1,5", "1.234,56")
+    return float("".join(partes[:-1]) + "." + partes[-1])
+
+
+def _monto(t: str, excluir: Optional[Tuple[int, int]]) -> Optional[Tuple[float, str]]:
+    """Primer número pegado a una moneda (antes o después), fuera del tramo de la fecha."""
+    for m in _RE_NUMERO.finditer(t):
+        if excluir and m.start() < excluir[1] and m.end() > excluir[0]:
+            continue
+        tras = _RE_TRAS.match(t, m.end())
+        iso = _iso_al_inicio(tras.group(1)) if tras else None
+        if iso is None:
+            antes = _RE_ANTES.search(t, max(0, m.start() - 12), m.start())
+            iso = _iso_al_inicio(antes.group(1)) if antes else None
+        if iso:
+            return _numero(m.group()), iso
+    return None
+
+
+# --- Fechas: una sola regex con alternativas nombradas (rangos antes que días sueltos) ---
+_MES = "(?:" + "|".join(sorted(MESES, key=len, reverse=True)) + ")"
+_NUMFECHA = r"(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/-]\d{1,2}(?:[/-]\d{4})?)"
+_HASTA = r"(?:al|a|hasta\s+el|hasta|y\s+el|y)"
+# el lookahead descarta rápido las posiciones que no pueden iniciar una fecha
+_RE_FECHA = re.compile(r"(?=[0-9aehmsu])(?:" + "|".join([
+    r"(?P<anteayer>\banteayer\b|\bantes\s+de\s+ayer\b)",
+    r"(?P<ayer>\bayer\b)",
+    r"(?P<hoy>\bhoy\b)",
+    r"(?P<ultimos>\bultim[oa]s\s+(?P<ult_n>\d{1,3})\s+dias\b)",
+    r"(?P<ultima_sem>\bultima\s+semana\b)",
+    r"(?P<sem_pasada>\bsemana\s+pasada\b)",
+    r"(?P<esta_sem>\besta\s+semana\b)",
+    r"(?P<mes_pasado>\bmes\s+pasado\b)",
+    r"(?P<este_mes>\beste\s+mes\b)",
+    # "del 1 al 10 de agosto", "entre el 1 de julio y el 10 de agosto de 2025"
+    rf"(?P<rt>\b(?P<rt_d1>\d{{1,2}})(?:\s+de\s+(?P<rt_m1>{_MES}))?\s+{_HASTA}\s+(?P<rt_d2>\d{{1,2}})\s+(?:de\s+)?"
+    rf"(?P<rt_m2>{_MES})(?:\s+(?:de|del)\s+(?P<rt_y>\d{{4}}))?)",
+    # "desde el 01/08/2025 hasta el 10/08/2025"
+    rf"(?P<rn>(?P<rn_1>{_NUMFECHA})\s+{_HASTA}\s+(?P<rn_2>{_NUMFECHA}))",
+    r"(?P<dmy>\b(?P<dmy_d>\d{1,2})[/-](?P<dmy_m>\d{1,2})[/-](?P<dmy_y>\d{4}))",
+    r"(?P<ymd>\b(?P<ymd_y>\d{4})-(?P<ymd_m>\d{1,2})-(?P<ymd_d>\d{1,2}))",
+    r"(?P<dm>\b(?P<dm_d>\d{1,2})[/-](?P<dm_m>\d{1,2}))",
+    rf"(?P<dtm>\b(?P<dtm_d>\d{{1,2}})\s+(?:de\s+)?(?P<dtm_m>{_MES})\b(?:\s+(?:de|del)\s+(?P<dtm_y>\d{{4}}))?)",
+    rf"(?P<mtd>\b(?P<mtd_m>{_MES})\s+(?P<mtd_d>\d{{1,2}})\b)",
+]) + ")")
+_RE_NUMFECHA = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})[/-](\d{1,2})(?:[/-](\d{4}))?")
+
+# Tipo de pregunta (sobre el texto normalizado, sin acentos); en orden de prioridad
+_TIPOS = {"prediccion": 0, "comparacion": 1, "tendencia": 2}
+_RE_TIPO = re.compile("|".join([
+    r"(?P<prediccion>va a (?:subir|bajar)|conviene|pronostico|proyecci|manana|subira|bajara)",
+    r"(?P<comparacion>\bcompar|\bdiferencia|\bvs\b|\bversus\b|\bcontra\b)",
+    r"(?P<tendencia>estos dias|ultimos dias|tendencia|evoluci|variaci|como (?:estuvo|viene|va|anduvo)|semana|\bmes\b)",
+]))
+
+
+def _dia(y: int, m: int, d: int) -> Optional[datetime.date]:
+    try:
+        return datetime.date(y, m, d)
+    except ValueError:
+        return None
+
+
+def _numfecha(texto: str, hoy: datetime.date) -> Optional[datetime.date]:
+    g = _RE_NUMFECHA.fullmatch(texto).groups()
+    if g[0]:
+        return _dia(int(g[0]), int(g[1]), int(g[2]))
+    return _dia(int(g[5]) if g[5] else hoy.year, int(g[4]), int(g[3]))
+
+
+def _fechas(m: "re.Match", hoy: datetime.date) -> Tuple[Optional[datetime.date], Optional[datetime.date]]:
+    """(desde, hasta) para la alternativa que coincidió; iguales si es un solo día."""
+    regla, g = m.lastgroup, m.group
+    if regla in _RELATIVAS:
+        return _RELATIVAS[regla](hoy)
+    if regla == "ultimos":
+        return hoy - datetime.timedelta(days=max(int(g("ult_n")), 1) - 1), hoy
+    if regla == "rt":
+        y = int(g("rt_y")) if g("rt_y") else hoy.year
+        m2 = MESES[g("rt_m2")]
+        m1 = MESES[g("rt_m1")] if g("rt_m1") else m2
+        # "del 20 de diciembre al 5 de enero": el inicio cae en el año anterior
+        y1 = y - 1 if m1 > m2 else y
+        return _dia(y1, m1, int(g("rt_d1"))), _dia(y, m2, int(g("rt_d2")))
+    if regla == "rn":
+        return _numfecha(g("rn_1"), hoy), _numfecha(g("rn_2"), hoy)
+    if regla == "dmy":
+        d = _dia(int(g("dmy_y")), int(g("dmy_m")), int(g("dmy_d")))
+    elif regla == "ymd":
+        d = _dia(int(g("ymd_y")), int(g("ymd_m")), int(g("ymd_d")))
+    elif regla == "dm":
+        d = _dia(hoy.year, int(g("dm_m")), int(g("dm_d")))
+    elif regla == "dtm":
+        d = _dia(int(g("dtm_y")) if g("dtm_y") else hoy.year, MESES[g("dtm_m")], int(g("dtm_d")))
+    else:
+        d = _dia(hoy.year, MESES[g("mtd_m")], int(g("mtd_d")))
+    return d, d
+
+
+def _mismo_dia(dias: int):
+    def rango(hoy):
+        d = hoy - datetime.timedelta(days=dias)
+        return d, d
+    return rango
+
+def _semana_pasada(hoy):
+    lunes = hoy - datetime.timedelta(days=hoy.weekday() + 7)
+    return lunes, lunes + datetime.timedelta(days=6)
+
+def _mes_pasado(hoy):
+    fin = hoy.replace(day=1) - datetime.timedelta(days=1)
+    return fin.replace(day=1), fin
+
+# Expresiones relativas a hoy, indexadas por el nombre de su alternativa en _RE_FECHA
+_RELATIVAS = {
+    "hoy": _mismo_dia(0),
+    "ayer": _mismo_dia(1),
+    "anteayer": _mismo_dia(2),
+    "ultima_sem": lambda hoy: (hoy - datetime.timedelta(days=6), hoy),
+    "sem_pasada": _semana_pasada,
+    "esta_sem": lambda hoy: (hoy - datetime.timedelta(days=hoy.weekday()), hoy),
+    "mes_pasado": _mes_pasado,
+    "este_mes": lambda hoy: (hoy.replace(day=1), hoy),
+}
+
+
+@dataclass(frozen=True)
+class Intent:
+    """Intención de una pregunta: moneda(s), día o rango de fechas y tipo de consulta."""
+    moneda: str                        # ISO principal (USD si no se menciona ninguna)
+    monedas: Tuple[str, ...] = ()      # todas las mencionadas, en orden
+    fecha: Optional[str] = None        # 'YYYY-MM-DD' si la pregunta es por un día puntual
+    desde: Optional[str] = None        # rango pedido (igual a `fecha` si es un solo día)
+    hasta: Optional[str] = None
+    tipo: str = "otro"                 # "conversion" | "prediccion" | "comparacion" | "tendencia" | "otro"
+    monto: Optional[float] = None      # solo en conversiones: "100 dólares a reales" → 100, USD, BRL
+    origen: Optional[str] = None
+    destino: Optional[str] = None
+
+    @property
+    def moneda_explicita(self) -> bool:
+        return self.moneda in self.monedas
+
+    @property
+    def es_rango(self) -> bool:
+        return self.desde is not None and self.fecha is None
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse(texto: str, hoy: datetime.date) -> Intent:
+    t = normalizar_texto(texto)
+    monedas = _buscar_en_palabras(_RE_PALABRA.findall(t))
+    # el guaraní es la moneda de referencia ("¿cuántos guaraníes es un euro?"), nunca la consultada
+    moneda = MONEDA_POR_DEFECTO
+    for iso in monedas:
+        if iso != MONEDA_BASE:
+            moneda = iso
+            break
+
+    fecha = desde = hasta = None
+    m = _RE_FECHA.search(t)
+    tramo_fecha = m.span() if m else None
+    if m:
+        d1, d2 = _fechas(m, hoy)
+        if d1 and d2:
+            if d1 > d2:
+                d1, d2 = d2, d1
+            desde, hasta = d1.isoformat(), d2.isoformat()
+            fecha = desde if d1 == d2 else None
+
+    tipo = "otro"
+    for m in _RE_TIPO.finditer(t):
+        if _TIPOS[m.lastgroup] < _TIPOS.get(tipo, len(_TIPOS)):
+            tipo = m.lastgroup
+    if tipo == "otro" and fecha is None and desde is not None:
+        tipo = "tendencia"
+
+    # conversión: un monto pegado a una moneda, o una pista ("cuántos", "EUR/USD") con dos monedas
+    monto = origen = destino = None
+    if tipo != "prediccion":
+        hallado = _monto(t, tramo_fecha)
+        pista = _RE_CONVERSION.search(t) if hallado is None and len(monedas) >= 2 else None
+        if pista:
+            un = _RE_UN.search(t)
+            iso = _iso_al_inicio(un.group(1)) if un else None
+            hallado = (1.0, iso)
+        if hallado:
+            monto, origen = hallado
+            if origen is None:
+                # sin monto: "¿cuántos reales es el dólar?" pide reales; "EUR/USD" va de la primera a la segunda
+                cuantos = _RE_CUANTOS.search(t) is not None
+                origen, destino = (monedas[1], monedas[0]) if cuantos else (monedas[0], monedas[1])
+            else:
+                otras = [iso for iso in monedas if iso != origen]
+                destino = otras[0] if otras else (MONEDA_BASE if origen != MONEDA_BASE else MONEDA_POR_DEFECTO)
+            tipo = "conversion"
+    return Intent(moneda=moneda, monedas=monedas, fecha=fecha, desde=desde, hasta=hasta, tipo=tipo,
+                  monto=monto, origen=origen, destino=destino)
+
+
+def parse_intent(texto: str, hoy: Optional[datetime.date] = None) -> Intent:
+    """Analiza la pregunta en una pasada (con cache por texto y día)."""
+    return _parse(texto or "", hoy or datetime.date.today())
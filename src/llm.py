@@ -0,0 +1,541 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from . import metrics
+from .resilience import CircuitOpen, DeadlineExceeded, circuito, restante, timeout_para, vencido
+
+log = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" o "stub"
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_RPM = float(os.getenv("LLM_RPM", "15"))
+LLM_RPD = float(os.getenv("LLM_RPD", "50"))
+# Cupos por minuto y por día compartidos por todos los workers y persistidos entre reinicios
+# (SQLite, junto a `LLM_CACHE_PATH`); vacío = cupos en memoria de cada proceso.
+LLM_CUPO_PATH = os.getenv("LLM_CUPO_PATH", "data/llm_cupo.sqlite")
+LLM_MAX_WAIT = float(os.getenv("LLM_MAX_WAIT", "20"))  # segundos máximos en cola
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "8"))     # segundos máximos por llamada
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "50"))
+
+# Prioridades: menor número = se atiende antes
+PRIORIDAD_INTERACTIVA = 0
+PRIORIDAD_BATCH = 10
+
+
+class LLMUnavailable(RuntimeError):
+    """El gateway no puede atender la llamada (cupo agotado, cola saturada, circuito abierto o sin tiempo)."""
+
+
+class TokenBucket:
+    """Bucket de `capacidad` tokens que se recarga de forma continua a lo largo de `periodo` segundos."""
+
+    def __init__(self, capacidad: float, periodo: float, reloj=time.monotonic):
+        self.capacidad = float(capacidad)
+        self.tasa = self.capacidad / periodo
+        self.tokens = self.capacidad
+        self._reloj = reloj
+        self._t = reloj()
+
+    def _recargar(self):
+        ahora = self._reloj()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._t) * self.tasa)
+        self._t = ahora
+
+    def disponible(self) -> bool:
+        self._recargar()
+        return self.tokens >= 1
+
+    def consumir(self):
+        self._recargar()
+        self.tokens -= 1
+
+    def espera(self) -> float:
+        """Segundos hasta que haya un token disponible."""
+        self._recargar()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.tasa
+
+    def vaciar(self):
+        self._recargar()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class CupoLocal:
+    """Cupos por minuto y por día de este proceso (se llenan al arrancar)."""
+
+    def __init__(self, rpm: float, rpd: float, reloj=time.monotonic):
+        self._minuto = TokenBucket(rpm, 60, reloj=reloj)
+        self._dia = TokenBucket(rpd, 86400, reloj=reloj)
+
+    def tomar(self) -> bool:
+        """Consume un turno de ambos cupos si los dos tienen; si no, no consume nada."""
+        if not (self._minuto.disponible() and self._dia.disponible()):
+            return False
+        self._minuto.consumir()
+        self._dia.consumir()
+        return True
+
+    def espera(self) -> float:
+        return max(self._minuto.espera(), self._dia.espera())
+
+    def espera_dia(self) -> float:
+        return self._dia.espera()
+
+    def vaciar_minuto(self):
+        self._minuto.vaciar()
+
+    def tokens(self) -> Dict[str, float]:
+        self._minuto._recargar()
+        self._dia._recargar()
+        return {"minuto": self._minuto.tokens, "dia": self._dia.tokens}
+
+
+class CupoCompartido(CupoLocal):
+    """
+    Los mismos cupos guardados en SQLite: todos los workers (y los reinicios) descuentan
+    del mismo saldo, así `LLM_RPD` es el techo real del día y no uno por proceso.
+    Cada operación lee, recarga y escribe ambos buckets en una transacción exclusiva;
+    el tiempo es el reloj de pared porque se comparte entre procesos.
+    """
+
+    def __init__(self, path: str, rpm: float, rpd: float):
+        super().__init__(rpm, rpd, reloj=time.time)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS llm_cupo (nombre TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                           "t REAL NOT NULL)")
+        self._conn_lock = threading.Lock()
+
+    @contextmanager
+    def _transaccion(self):
+        buckets = (("minuto", self._minuto), ("dia", self._dia))
+        with self._conn_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for nombre, bucket in buckets:
+                    fila = self._conn.execute("SELECT tokens, t FROM llm_cupo WHERE nombre = ?", (nombre,)).fetchone()
+                    # sin fila el bucket arranca lleno; si bajó el límite, el saldo guardado se recorta
+                    bucket.tokens, bucket._t = (min(fila[0], bucket.capacidad), fila[1]) if fila \
+                        else (bucket.capacidad, time.time())
+                yield
+                self._conn.executemany("INSERT OR REPLACE INTO llm_cupo VALUES (?, ?, ?)",
+                                       [(nombre, b.tokens, b._t) for nombre, b in buckets])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def tomar(self) -> bool:
+        with self._transaccion():
+            return super().tomar()
+
+    def espera(self) -> float:
+        with self._transaccion():
+            return super().espera()
+
+    def espera_dia(self) -> float:
+        with self._transaccion():
+            return super().espera_dia()
+
+    def vaciar_minuto(self):
+        with self._transaccion():
+            super().vaciar_minuto()
+
+    def tokens(self) -> Dict[str, float]:
+        with self._transaccion():
+            return super().tokens()
+
+
+def _contar_tokens(prompt: int, respuesta: int):
+    metrics.LLM_TOKENS.inc(prompt, kind="prompt")
+    metrics.LLM_TOKENS.inc(respuesta, kind="completion")
+
+
+class GeminiBackend:
+    """Backend de Gemini que reutiliza un `GenerativeModel` por nombre de modelo."""
+
+    nombre = "gemini"
+
+    def __init__(self):
+        self._modelos: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _modelo(self, nombre: str):
+        from .mcp import get_genai
+        modelo = self._modelos.get(nombre)
+        if modelo is None:
+            with self._lock:
+                modelo = self._modelos.get(nombre)
+                if modelo is None:
+                    modelo = self._modelos[nombre] = get_genai().GenerativeModel(nombre)
+        return modelo
+
+    @staticmethod
+    def _config(temperature, max_tokens):
+        from .mcp import get_genai
+        if temperature is None and max_tokens is None:
+            return None
+        return get_genai().types.GenerationConfig(temperature=temperature, max_output_tokens=max_tokens)
+
+    @staticmethod
+    def _uso(resp):
+        uso = getattr(resp, "usage_metadata", None)
+        if uso is not None:
+            _contar_tokens(getattr(uso, "prompt_token_count", 0) or 0, getattr(uso, "candidates_token_count", 0) or 0)
+
+    def generate(self, prompt: str, model: str, temperature=None, max_tokens=None) -> str:
+        config = self._config(temperature, max_tokens)
+        kwargs = {"generation_config": config} if config is not None else {}
+        resp = self._modelo(model).generate_content(prompt, **kwargs)
+        self._uso(resp)
+        return resp.text
+
+    async def agenerate(self, prompt: str, model: str, temperature=None, max_tokens=None) -> str:
+        config = self._config(temperature, max_tokens)
+        kwargs = {"generation_config": config} if config is not None else {}
+        resp = await self._modelo(model).generate_content_async(prompt, **kwargs)
+        self._uso(resp)
+        return resp.text
+
+    async def astream(self, prompt: str, model: str, temperature=None, max_tokens=None) -> AsyncIterator[str]:
+        config = self._config(temperature, max_tokens)
+        kwargs = {"generation_config": config} if config is not None else {}
+        resp = await self._modelo(model).generate_content_async(prompt, stream=True, **kwargs)
+        async for chunk in resp:
+            try:
+                texto = chunk.text
+            except ValueError:
+                continue  # fragmento sin texto (p. ej. solo metadatos de seguridad)
+            if texto:
+                yield texto
+        self._uso(resp)   # al terminar el stream la respuesta trae el uso acumulado
+
+
+class StubBackend:
+    """LLM local determinístico para pruebas y benchmarks: responde tras una latencia fija."""
+
+    nombre = "stub"
+
+    def __init__(self, latencia_ms: float = LLM_STUB_LATENCY_MS):
+        self.latencia = latencia_ms / 1000
+        self.llamadas = 0
+
+    def _respuesta(self, prompt: str, model: str) -> str:
+        self.llamadas += 1
+        huella = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        respuesta = f"[{model} stub {huella}] Análisis generado localmente."
+        # tokens aproximados por palabras
+        _contar_tokens(len(prompt.split()), len(respuesta.split()))
+        return respuesta
+
+    def generate(self, prompt: str, model: str, temperature=None, max_tokens=None) -> str:
+        time.sleep(self.latencia)
+        return self._respuesta(prompt, model)
+
+    async def agenerate(self, prompt: str, model: str, temperature=None, max_tokens=None) -> str:
+        await asyncio.sleep(self.latencia)
+        return self._respuesta(prompt, model)
+
+    async def astream(self, prompt: str, model: str, temperature=None, max_tokens=None) -> AsyncIterator[str]:
+        palabras = self._respuesta(prompt, model).split(" ")
+        for i, palabra in enumerate(palabras):
+            await asyncio.sleep(self.latencia / len(palabras))
+            yield palabra if i == 0 else " " + palabra
+
+
+def _es_rate_limit(exc: Exception) -> bool:
+    return type(exc).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(exc)
+
+
+class _Turno:
+    __slots__ = ("prioridad", "seq", "admitido", "cancelado", "evento", "futuro", "loop")
+
+    def __init__(self, prioridad: int, seq: int):
+        self.prioridad, self.seq = prioridad, seq
+        self.admitido = self.cancelado = False
+        self.evento = self.futuro = self.loop = None
+
+    def __lt__(self, otro):
+        return (self.prioridad, self.seq) < (otro.prioridad, otro.seq)
+
+
+class LLMGateway:
+    """
+    Punto único de salida hacia el LLM, compartido por la API y `CurrencyAgent`.
+
+    Cada llamada pide un turno: se admite cuando hay lugar en el semáforo de
+    concurrencia y tokens en los buckets por minuto y por día. Los turnos en espera
+    se atienden por prioridad (interactivo antes que batch) y en orden de llegada.
+    Si el cupo diario no alcanza dentro de `max_wait` o la espera vence, se lanza
+    `LLMUnavailable` para que el llamador responda solo con datos.
+
+    La espera en cola y la llamada async se acotan a lo que le queda a la request
+    (`src/resilience.py`), y un circuito por backend corta las llamadas mientras el
+    proveedor viene fallando (los rate limits no cuentan: ya los maneja el bucket).
+    """
+
+    def __init__(self, backend=None, model: str = LLM_MODEL, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rpm: float = LLM_RPM, rpd: float = LLM_RPD, max_wait: float = LLM_MAX_WAIT,
+                 cupo_path: Optional[str] = LLM_CUPO_PATH):
+        self.backend = backend if backend is not None else (StubBackend() if LLM_BACKEND == "stub" else GeminiBackend())
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self._cupo = CupoCompartido(cupo_path, rpm, rpd) if cupo_path else CupoLocal(rpm, rpd)
+        self._lock = threading.Lock()
+        self._cola = []
+        self._seq = itertools.count()
+        self._en_vuelo = 0
+        self._stats = {"admitidas": 0, "rechazadas": 0, "errores": 0, "rate_limited": 0}
+        self._circuito = circuito(getattr(self.backend, "nombre", type(self.backend).__name__))
+
+    # --- Admisión ---
+    def _despachar(self):
+        """Admite turnos de la cola mientras haya capacidad (llamar con el lock tomado)."""
+        while self._cola:
+            turno = self._cola[0]
+            if turno.cancelado:
+                heapq.heappop(self._cola)
+                continue
+            if self._en_vuelo >= self.max_concurrency or not self._cupo.tomar():
+                return
+            heapq.heappop(self._cola)
+            self._en_vuelo += 1
+            self._stats["admitidas"] += 1
+            turno.admitido = True
+            if turno.evento is not None:
+                turno.evento.set()
+            else:
+                turno.loop.call_soon_threadsafe(lambda f=turno.futuro: f.done() or f.set_result(None))
+
+    def _encolar(self, turno: _Turno):
+        with self._lock:
+            if self._cupo.espera_dia() > self.max_wait:
+                self._stats["rechazadas"] += 1
+                raise LLMUnavailable("Cupo diario del LLM agotado")
+            heapq.heappush(self._cola, turno)
+            self._despachar()
+
+    def _reintentar(self, turno: _Turno, limite: float) -> float:
+        """Tras despertar: vuelve a despachar y devuelve cuánto esperar (0 si fue admitido)."""
+        with self._lock:
+            self._despachar()
+            if turno.admitido:
+                return 0.0
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                turno.cancelado = True
+                self._stats["rechazadas"] += 1
+                raise LLMUnavailable("LLM saturado: se agotó la espera en cola")
+            # los tokens se recargan solos: despertar a tiempo para reintentar
+            return min(restante, max(self._cupo.espera(), 0.05))
+
+    def _liberar(self):
+        with self._lock:
+            self._en_vuelo -= 1
+            self._despachar()
+
+    def _fallo(self, exc: Exception):
+        with self._lock:
+            self._stats["errores"] += 1
+            if _es_rate_limit(exc):
+                # el proveedor ya nos limitó: no seguir gastando este minuto
+                self._stats["rate_limited"] += 1
+                self._cupo.vaciar_minuto()
+
+    def _verificar(self):
+        """Rechazo temprano, sin ocupar un turno: circuito del backend abierto o request sin tiempo."""
+        if self._circuito.rechaza():
+            raise LLMUnavailable(f"{self._circuito.nombre} no responde (circuito abierto)")
+        self._timeout()
+
+    def _timeout(self) -> float:
+        try:
+            return timeout_para(LLM_TIMEOUT)
+        except DeadlineExceeded:
+            metrics.DEADLINE_EXCEEDED.inc(etapa="llm")
+            raise LLMUnavailable("sin tiempo para el análisis dentro del plazo de la request")
+
+    @contextmanager
+    def _protegido(self, timeout: float = LLM_TIMEOUT, cancelable: bool = True):
+        """
+        Llamada al backend bajo su circuito; un timeout por el plazo de la request no cuenta como fallo.
+        La llamada sync no se puede cortar (`cancelable=False`): si vuelve después de `timeout`
+        cuenta como fallo aunque haya respondido.
+        """
+        try:
+            self._circuito.verificar()
+        except CircuitOpen as e:
+            raise LLMUnavailable(str(e))
+        t0 = time.monotonic()
+        try:
+            yield
+        except (asyncio.TimeoutError, TimeoutError):
+            (self._circuito.neutro if timeout < LLM_TIMEOUT and vencido() else self._circuito.fallo)()
+            raise LLMUnavailable("el LLM no respondió dentro del plazo de la request" if timeout < LLM_TIMEOUT
+                                 else "el LLM no respondió a tiempo")
+        except Exception as e:
+            (self._circuito.neutro if _es_rate_limit(e) else self._circuito.fallo)()
+            raise
+        except BaseException:
+            self._circuito.neutro()
+            raise
+        else:
+            segundos = time.monotonic() - t0
+            if not cancelable and segundos > timeout:
+                log.warning("%s respondió en %.1fs, después del plazo (%.1fs)", self._circuito.nombre, segundos, timeout)
+                self._circuito.fallo()
+            else:
+                self._circuito.exito()
+
+    @contextmanager
+    def _medir(self):
+        """Latencia de la llamada al backend (sin la espera en cola), por resultado."""
+        t0 = time.perf_counter()
+        status = "error"
+        try:
+            yield
+            status = "ok"
+        except Exception as e:
+            if _es_rate_limit(e):
+                status = "rate_limited"
+            raise
+        finally:
+            segundos = time.perf_counter() - t0
+            backend = getattr(self.backend, "nombre", type(self.backend).__name__)
+            metrics.LLM_SECONDS.observe(segundos, backend=backend, status=status)
+            metrics.anotar("llm", segundos)
+
+    # --- Llamadas ---
+    def generate(self, prompt: str, priority: int = PRIORIDAD_INTERACTIVA, model: Optional[str] = None,
+                 temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+        self._verificar()
+        turno = _Turno(priority, next(self._seq))
+        turno.evento = threading.Event()
+        limite = time.monotonic() + restante(self.max_wait)
+        with metrics.cronometro(metrics.LLM_QUEUE_SECONDS, "llm.cola"):
+            self._encolar(turno)
+            while not turno.admitido:
+                turno.evento.wait(self._reintentar(turno, limite))
+        try:
+            timeout = self._timeout()
+            with self._protegido(timeout, cancelable=False), self._medir():
+                return self.backend.generate(prompt, model or self.model, temperature=temperature,
+                                             max_tokens=max_tokens)
+        except Exception as e:
+            self._fallo(e)
+            raise
+        finally:
+            self._liberar()
+
+    async def _aadmitir(self, priority: int):
+        with metrics.cronometro(metrics.LLM_QUEUE_SECONDS, "llm.cola"):
+            await self._aesperar_turno(priority)
+
+    async def _aesperar_turno(self, priority: int):
+        turno = _Turno(priority, next(self._seq))
+        turno.loop = asyncio.get_running_loop()
+        turno.futuro = turno.loop.create_future()
+        limite = time.monotonic() + restante(self.max_wait)
+        self._encolar(turno)
+        try:
+            while not turno.admitido:
+                espera = self._reintentar(turno, limite)
+                if espera:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(turno.futuro), espera)
+                    except asyncio.TimeoutError:
+                        pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if turno.admitido:
+                    self._en_vuelo -= 1
+                    self._despachar()
+                else:
+                    turno.cancelado = True
+            raise
+
+    async def agenerate(self, prompt: str, priority: int = PRIORIDAD_INTERACTIVA, model: Optional[str] = None,
+                        temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+        self._verificar()
+        await self._aadmitir(priority)
+        try:
+            timeout = self._timeout()
+            with self._protegido(timeout), self._medir():
+                return await asyncio.wait_for(self.backend.agenerate(prompt, model or self.model,
+                                                                     temperature=temperature, max_tokens=max_tokens),
+                                              timeout)
+        except Exception as e:
+            self._fallo(e)
+            raise
+        finally:
+            self._liberar()
+
+    async def astream(self, prompt: str, priority: int = PRIORIDAD_INTERACTIVA, model: Optional[str] = None,
+                      temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Como `agenerate`, pero entrega los fragmentos de texto a medida que llegan."""
+        self._verificar()
+        await self._aadmitir(priority)
+        try:
+            timeout = self._timeout()
+            limite = time.monotonic() + timeout
+            with self._protegido(timeout), self._medir():
+                fragmentos = self.backend.astream(prompt, model or self.model, temperature=temperature,
+                                                  max_tokens=max_tokens).__aiter__()
+                while True:
+                    # el plazo vale para el stream completo, no para cada fragmento
+                    try:
+                        fragmento = await asyncio.wait_for(fragmentos.__anext__(), limite - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    yield fragmento
+        except Exception as e:
+            self._fallo(e)
+            raise
+        finally:
+            self._liberar()
+
+    @property
+    def usa_stub(self) -> bool:
+        return isinstance(self.backend, StubBackend)
+
+    def stats(self) -> dict:
+        with self._lock:
+            tokens = self._cupo.tokens()
+            return {
+                **self._stats,
+                "en_vuelo": self._en_vuelo,
+                "en_cola": sum(1 for t in self._cola if not t.cancelado),
+                "tokens_minuto": round(tokens["minuto"], 2),
+                "tokens_dia": round(tokens["dia"], 2),
+            }
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Gateway compartido por el proceso (se crea en el primer uso)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+
+def set_gateway(gateway: LLMGateway):
+    """Reemplaza el gateway compartido (p. ej. por uno con `StubBackend` en benchmarks)."""
+    global _gateway
+    with _gateway_lock:
+        _gateway = gateway
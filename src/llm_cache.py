@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import datetime
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from .intent import normalizar_texto, parse_intent
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(6 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+
+def intencion(question: str) -> dict:
+    """Intención normalizada de la pregunta: moneda, ventana de fechas y tipo."""
+    intent = parse_intent(question)
+    clave = {
+        "moneda": intent.moneda,
+        "desde": intent.desde,
+        "hasta": intent.hasta,
+        # sin fecha explícita ("estos días") la ventana es relativa a hoy
+        "ventana": intent.desde or datetime.date.today().isoformat(),
+        "tipo": intent.tipo,
+    }
+    if intent.tipo == "otro":
+        # sin una intención reconocida no se agrupan preguntas distintas
+        clave["texto"] = " ".join(re.sub(r"[^\w\s/-]", " ", normalizar_texto(question)).split())
+    return clave
+
+
+class LLMAnswerCache:
+    """
+    Cache persistente (SQLite) de respuestas de `llm.analyze`.
+
+    La clave combina la intención normalizada de la pregunta con una huella de los
+    datos que recibe el LLM (compra/venta/fuente del snapshot y contexto RAG): cuando
+    llegan cotizaciones nuevas la huella cambia y las respuestas anteriores dejan de
+    usarse solas; después las eliminan el TTL o el límite de entradas (LRU).
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                               "created REAL NOT NULL, last_access REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_access ON llm_cache(last_access)")
+        return self._conn
+
+    @staticmethod
+    def key(moneda: str, compra: float, venta: float, source: str, contexto: str, question: str,
+            priority: Optional[int] = None) -> str:
+        # la prioridad solo ordena la cola del gateway: no cambia la respuesta ni la clave
+        huella = [compra, venta, source, contexto]
+        payload = json.dumps({"intencion": intencion(question), "datos": huella}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        ahora = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and ahora - row[1] < self.ttl:
+                db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (ahora, key))
+                self._stats["hits"] += 1
+                return row[0]
+            if row:
+                db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._stats["evictions"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str):
+        ahora = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)", (key, value, ahora, ahora))
+            self._stats["stores"] += 1
+            vencidas = db.execute("DELETE FROM llm_cache WHERE created < ?", (ahora - self.ttl,)).rowcount
+            sobrantes = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if sobrantes > 0:
+                db.execute("DELETE FROM llm_cache WHERE key IN "
+                           "(SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)", (sobrantes,))
+            self._stats["evictions"] += max(vencidas, 0) + max(sobrantes, 0)
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._db().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    # --- Envoltorios para registrar la herramienta MCP con cache ---
+    def wrap(self, func: Callable[..., str]) -> Callable[..., str]:
+        @functools.wraps(func)
+        def cached(**kwargs):
+            key = self.key(**kwargs)
+            hit = self.get(key)
+            if hit is not None:
+                return hit
+            value = func(**kwargs)
+            if value:
+                self.put(key, value)
+            return value
+        return cached
+
+    def awrap(self, afunc: Callable[..., "asyncio.Future"]):
+        @functools.wraps(afunc)
+        async def cached(**kwargs):
+            key = self.key(**kwargs)
+            hit = await asyncio.to_thread(self.get, key)
+            if hit is not None:
+                return hit
+            value = await afunc(**kwargs)
+            if value:
+                await asyncio.to_thread(self.put, key, value)
+            return value
+        return cached
+
+    def awrap_stream(self, agen_func):
+        """Para la versión streaming: un hit se entrega entero de una vez; un miss se guarda al terminar."""
+        @functools.wraps(agen_func)
+        async def cached(**kwargs):
+            key = self.key(**kwargs)
+            hit = await asyncio.to_thread(self.get, key)
+            if hit is not None:
+                yield hit
+                return
+            partes = []
+            # si el cliente abandona el stream, se cierra ya el generador de abajo (libera el turno del gateway)
+            async with contextlib.aclosing(agen_func(**kwargs)) as fragmentos:
+                async for fragmento in fragmentos:
+                    partes.append(fragmento)
+                    yield fragmento
+            value = "".join(partes)
+            if value:
+                await asyncio.to_thread(self.put, key, value)
+        return cached
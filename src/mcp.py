@@ -1,34 +1,89 @@
 from typing import Callable, Optional
 from pydantic import BaseModel, ValidationError
+import asyncio
 import os
-import google.generativeai as genai
+import threading
+from contextlib import aclosing, contextmanager
 
-# Configuración de Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+from . import metrics
+from .llm import PRIORIDAD_INTERACTIVA, get_gateway
+
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """Importa y configura google.generativeai en el primer uso (evita pagar el import al arrancar)."""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _genai = genai
+    return _genai
 
 class MCPRegistry:
     def __init__(self):
         self.tools = {}
 
-    def register(self, name: str, func: Callable, description: str = "", input_model: Optional[BaseModel] = None):
+    def register(self, name: str, func: Callable, description: str = "", input_model: Optional[BaseModel] = None,
+                 async_func: Optional[Callable] = None, stream_func: Optional[Callable] = None):
         if name in self.tools:
             raise ValueError(f"Tool {name} already registered")
-        self.tools[name] = {"func": func, "description": description, "input_model": input_model}
+        self.tools[name] = {"func": func, "description": description, "input_model": input_model,
+                            "async_func": async_func, "stream_func": stream_func}
 
-    def call(self, name: str, **kwargs):
+    def _validated_kwargs(self, name: str, kwargs: dict):
         if name not in self.tools:
             raise ValueError(f"Tool '{name}' not registered")
         entry = self.tools[name]
         model = entry.get("input_model")
         if model:
             try:
-                validated = model(**kwargs)
-                return entry["func"](**validated.dict())
+                return entry, model(**kwargs).dict()
             except ValidationError as e:
                 raise e
-        else:
+        return entry, kwargs
+
+    @staticmethod
+    @contextmanager
+    def _medir(name: str):
+        status = "error"
+        try:
+            with metrics.cronometro(metrics.TOOL_SECONDS, f"mcp.{name}", tool=name):
+                yield
+            status = "ok"
+        finally:
+            metrics.TOOL_CALLS.inc(tool=name, status=status)
+
+    def call(self, name: str, **kwargs):
+        entry, kwargs = self._validated_kwargs(name, kwargs)
+        with self._medir(name):
             return entry["func"](**kwargs)
 
+    @staticmethod
+    async def _ainvocar(entry: dict, kwargs: dict):
+        if entry.get("async_func"):
+            return await entry["async_func"](**kwargs)
+        return await asyncio.to_thread(entry["func"], **kwargs)
+
+    async def acall(self, name: str, **kwargs):
+        """Como `call`, pero usa la versión async de la herramienta si existe (si no, la corre en un hilo)."""
+        entry, kwargs = self._validated_kwargs(name, kwargs)
+        with self._medir(name):
+            return await self._ainvocar(entry, kwargs)
+
+    async def astream(self, name: str, **kwargs):
+        """Fragmentos de la salida de la herramienta; si no tiene versión streaming, la salida completa de una vez."""
+        entry, kwargs = self._validated_kwargs(name, kwargs)
+        with self._medir(name):
+            if entry.get("stream_func"):
+                async with aclosing(entry["stream_func"](**kwargs)) as fragmentos:
+                    async for fragmento in fragmentos:
+                        yield fragmento
+            else:
+                yield await self._ainvocar(entry, kwargs)
+
 
 # Modelo de entrada para la herramienta LLM
 class LLMAnalysisInput(BaseModel):
@@ -38,18 +93,33 @@ class LLMAnalysisInput(BaseModel):
     source: str
     contexto: str
     question: str
+    priority: int = PRIORIDAD_INTERACTIVA   # turno en el gateway: /ask/batch usa PRIORIDAD_BATCH
 
-def analyze_with_llm(moneda: str, compra: float, venta: float, source: str, contexto: str, question: str) -> str:
-    prompt = f"""Eres un analista financiero. La pregunta que te realizan es: {question}
+def _prompt_analisis(moneda: str, compra: float, venta: float, source: str, contexto: str, question: str) -> str:
+    return f"""Eres un analista financiero. La pregunta que te realizan es: {question}
     Si la pregunta no tiene relevancia con la cotización de monedas ni con el análisis financiero, responde de forma amable, disculpándote y diciendo que estás disponible para ayudar con cualquier otra pregunta relacionada con las divisas.
     Si la pregunta está relacionada con la cotización de monedas, analiza la cotización de {moneda}.
     Compra: {compra} | Venta: {venta}
     Fuente: {source}, donde la fuente {source} es la obtenida por scraping de la página Cambios Chaco.
     Contexto histórico:
-    {contexto} es la base de datos del Banco Central del Paraguay que se tiene almacenado.
+    {contexto} son los datos históricos almacenados: del Banco Central del Paraguay, salvo los que indican otra fuente (Cambios Chaco).
     Responde en español, de manera breve, y solo proporciona información sobre la cotización si es relevante para la pregunta. Si la pregunta no está relacionada, no hagas mención de las cotizaciones.
     """
-    # Llamada a Gemini para generar el análisis
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    resp = model.generate_content(prompt)
-    return resp.text
+
+def analyze_with_llm(moneda: str, compra: float, venta: float, source: str, contexto: str, question: str,
+                     priority: int = PRIORIDAD_INTERACTIVA) -> str:
+    prompt = _prompt_analisis(moneda, compra, venta, source, contexto, question)
+    # Llamada a Gemini a través del gateway compartido (modelo reutilizado, cupos y prioridad)
+    return get_gateway().generate(prompt, priority=priority)
+
+async def analyze_with_llm_async(moneda: str, compra: float, venta: float, source: str, contexto: str, question: str,
+                                 priority: int = PRIORIDAD_INTERACTIVA) -> str:
+    prompt = _prompt_analisis(moneda, compra, venta, source, contexto, question)
+    return await get_gateway().agenerate(prompt, priority=priority)
+
+async def analyze_with_llm_stream(moneda: str, compra: float, venta: float, source: str, contexto: str, question: str,
+                                  priority: int = PRIORIDAD_INTERACTIVA):
+    prompt = _prompt_analisis(moneda, compra, venta, source, contexto, question)
+    async with aclosing(get_gateway().astream(prompt, priority=priority)) as fragmentos:
+        async for fragmento in fragmentos:
+            yield fragmento
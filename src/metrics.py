@@ -0,0 +1,247 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TAMANIOS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: Tuple[str, ...], valores: Tuple, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if x != int(x) else str(int(x))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()):
+        self.nombre, self.ayuda = nombre, ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _clave(self, labels: dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.etiquetas)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"] + self._muestras()
+
+    def _muestras(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, valor: float = 1.0, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0.0) + valor
+
+    def valor(self, **labels) -> float:
+        with self._lock:
+            return self._valores.get(self._clave(labels), 0.0)
+
+    def _muestras(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_numero(v)}" for k, v in items]
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}   # clave → [cuentas por bucket..., suma, total]
+
+    def observe(self, valor: float, **labels):
+        clave = self._clave(labels)
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def resumen(self, **labels) -> Tuple[int, float]:
+        """(cantidad, suma) de una serie."""
+        with self._lock:
+            serie = self._series.get(self._clave(labels))
+            return (serie[-1], serie[-2]) if serie else (0, 0.0)
+
+    def _muestras(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lineas = []
+        for clave, serie in items:
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets + (float("inf"),), serie):
+                acumulado += cuenta
+                le = f'le="{_numero(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(serie[-2])}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {serie[-1]}")
+        return lineas
+
+
+class Registry:
+    """
+    Métricas del proceso en formato de texto de Prometheus (sin dependencias externas).
+    Los instrumentos se declaran una sola vez al final de este módulo y cada módulo los usa
+    directamente; `cronometro` además anota el tramo en el desglose de la request actual
+    cuando hay uno activo (`desglose()`, usado por `/ask` con `timing=true`).
+    """
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._colectores: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[dict, float]]]]]] = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            if metrica.nombre in self._metricas:
+                raise ValueError(f"Métrica {metrica.nombre} ya registrada")
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def counter(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()) -> Counter:
+        return self._registrar(Counter(nombre, ayuda, etiquetas))
+
+    def histogram(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCIA) -> Histogram:
+        return self._registrar(Histogram(nombre, ayuda, etiquetas, buckets))
+
+    def colector(self, func: Callable):
+        """
+        Registra una función que se evalúa en cada scrape y devuelve
+        (nombre, tipo, ayuda, [(labels, valor), ...]); para valores que ya cuentan otros módulos.
+        """
+        with self._lock:
+            self._colectores.append(func)
+        return func
+
+    def render(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+            colectores = list(self._colectores)
+        lineas = []
+        for m in metricas:
+            lineas.extend(m.render())
+        for colector in colectores:
+            for nombre, tipo, ayuda, muestras in colector():
+                lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+                for labels, valor in muestras:
+                    if valor is None:
+                        continue
+                    lineas.append(f"{nombre}{_etiquetas(tuple(labels), tuple(labels.values()))} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Instrumentos ---
+NODE_SECONDS = REGISTRY.histogram("agent_node_seconds", "Duración de cada nodo del grafo LangGraph", ["node"])
+TOOL_SECONDS = REGISTRY.histogram("mcp_tool_seconds", "Duración de las llamadas a herramientas MCP", ["tool"])
+TOOL_CALLS = REGISTRY.counter("mcp_tool_calls_total", "Llamadas a herramientas MCP por resultado", ["tool", "status"])
+UPSTREAM_SECONDS = REGISTRY.histogram("upstream_request_seconds", "Duración de las requests HTTP a upstream",
+                                      ["upstream"])
+UPSTREAM_RESPONSES = REGISTRY.counter("upstream_responses_total", "Respuestas de upstream por código (o error)",
+                                      ["upstream", "status"])
+PDF_PARSE_SECONDS = REGISTRY.histogram("pdf_parse_seconds", "Tiempo de parseo de páginas del PDF de Cambios Chaco")
+PDF_PAGES = REGISTRY.counter("pdf_pages_parsed_total", "Páginas del PDF de Cambios Chaco parseadas")
+EMBEDDING_SECONDS = REGISTRY.histogram("embedding_seconds", "Duración de cada encode de consultas")
+EMBEDDING_BATCH = REGISTRY.histogram("embedding_batch_size", "Textos por encode de consultas", buckets=TAMANIOS)
+SEARCH_SECONDS = REGISTRY.histogram("vector_search_seconds", "Duración de la búsqueda por similitud (sin encode)",
+                                    ["kind"])
+LLM_SECONDS = REGISTRY.histogram("llm_request_seconds", "Duración de las llamadas al LLM (sin la espera en cola)",
+                                 ["backend", "status"])
+LLM_QUEUE_SECONDS = REGISTRY.histogram("llm_queue_wait_seconds", "Espera por un turno en el gateway del LLM")
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Tokens del LLM (prompt y respuesta)", ["kind"])
+COLLECTOR_SNAPSHOTS = REGISTRY.counter("collector_snapshots_total",
+                                       "Snapshots del recolector por origen (json, pdf, estado) y resultado",
+                                       ["fuente", "status"])
+COLLECTOR_SECONDS = REGISTRY.histogram("collector_snapshot_seconds", "Duración de cada snapshot del recolector")
+CIRCUIT_TRANSITIONS = REGISTRY.counter("circuit_breaker_transitions_total",
+                                       "Cambios de estado de los circuitos por upstream", ["upstream", "estado"])
+CIRCUIT_REJECTED = REGISTRY.counter("circuit_breaker_rejected_total",
+                                    "Llamadas a upstream rechazadas con el circuito abierto", ["upstream"])
+DEADLINE_EXCEEDED = REGISTRY.counter("request_deadline_exceeded_total",
+                                     "Etapas recortadas o salteadas por agotarse el tiempo de la request", ["etapa"])
+HTTP_SECONDS = REGISTRY.histogram("http_request_seconds", "Duración de las requests a la API", ["path", "method"])
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "Requests a la API por código de respuesta",
+                                 ["path", "method", "status"])
+
+
+# --- Desglose por request ---
+_desglose: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("desglose", default=None)
+
+
+@contextmanager
+def desglose():
+    """Activa el desglose de tiempos para la request actual; entrega la lista de tramos."""
+    tramos: list = []
+    token = _desglose.set(tramos)
+    try:
+        yield tramos
+    finally:
+        _desglose.reset(token)
+
+
+def anotar(tramo: str, segundos: float):
+    tramos = _desglose.get()
+    if tramos is not None:
+        tramos.append({"tramo": tramo, "ms": round(segundos * 1000, 3)})
+
+
+@contextmanager
+def cronometro(histograma: Histogram, tramo: Optional[str] = None, **labels):
+    """Observa la duración del bloque en `histograma` (y la anota en el desglose si se da `tramo`)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - t0
+        histograma.observe(segundos, **labels)
+        if tramo:
+            anotar(tramo, segundos)
+
+
+def medir_nodo(nombre: str, func: Callable) -> Callable:
+    """Envuelve un nodo (sync o async) conservando su firma: LangGraph le pasa `config` si la pide."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def asincrono(*args, **kwargs):
+            with cronometro(NODE_SECONDS, f"nodo.{nombre}", node=nombre):
+                return await func(*args, **kwargs)
+        return asincrono
+
+    @functools.wraps(func)
+    def sync(*args, **kwargs):
+        with cronometro(NODE_SECONDS, f"nodo.{nombre}", node=nombre):
+            return func(*args, **kwargs)
+    return sync
@@ -0,0 +1,251 @@
+import os
+import threading
+import warnings
+from typing import Dict, Optional
+
+import numpy as np
+
+from .timeseries import FUENTE_BCP, RateHistoryStore, _dia
+
+ANALYTICS_VENTANA = int(os.getenv("ANALYTICS_VENTANA", "7"))   # cotizaciones por ventana móvil
+_UMBRAL_ESTABLE_PCT = 0.2   # variación del período por debajo de la cual la tendencia es "estable"
+
+
+class _Indicadores:
+    """Arrays precalculados de una moneda, alineados con la serie (un valor por cotización)."""
+
+    __slots__ = ("version", "fechas", "valores", "fuentes", "var_diaria", "var_pct", "min_movil", "max_movil",
+                 "media_movil", "volatilidad", "acum", "acum_ret", "acum_ret2", "n_ret")
+
+    def __init__(self):
+        self.version = -1
+        vacio = np.array([], dtype=np.float64)
+        self.fechas = np.array([], dtype="datetime64[D]")
+        self.fuentes = np.array([], dtype=object)
+        self.valores = self.var_diaria = self.var_pct = vacio
+        self.min_movil = self.max_movil = self.media_movil = self.volatilidad = vacio
+        self.acum = self.acum_ret = self.acum_ret2 = self.n_ret = vacio
+
+
+def _ventanas(x: np.ndarray, desde: int, w: int) -> np.ndarray:
+    """Ventanas de largo `w` que terminan en cada índice >= `desde` (con NaN al principio de la serie)."""
+    ini = max(0, desde - w + 1)
+    tramo = x[ini:]
+    relleno = w - 1 - (desde - ini)
+    if relleno:
+        tramo = np.concatenate([np.full(relleno, np.nan), tramo])
+    return np.lib.stride_tricks.sliding_window_view(tramo, w)
+
+
+def _acumular(previo: np.ndarray, k: int, tramo: np.ndarray) -> np.ndarray:
+    base = previo[k - 1] if k > 0 else 0.0
+    return np.concatenate([previo[:k], base + np.cumsum(tramo)])
+
+
+class RateAnalytics:
+    """
+    Indicadores de tendencia sobre la serie histórica de `RateHistoryStore`:
+    variación diaria (absoluta y %), mínimo/máximo/media móviles, volatilidad móvil
+    (desvío de la variación diaria %) y sumas acumuladas para calcular la media y la
+    volatilidad de cualquier rango en O(1).
+
+    Los arrays se recalculan de forma incremental: cuando la serie cambia solo se
+    recalcula desde la primera cotización distinta (al ingerir días nuevos, solo la cola).
+    """
+
+    def __init__(self, historial: RateHistoryStore, ventana: int = ANALYTICS_VENTANA):
+        self.historial = historial
+        self.ventana = max(2, ventana)
+        self._indicadores: Dict[str, _Indicadores] = {}
+        self._lock = threading.Lock()
+        self.recalculados = 0   # cotizaciones recalculadas en total (para medir lo incremental)
+
+    # --- Precálculo ---
+    def actualizar(self, moneda: Optional[str] = None):
+        """Precalcula una moneda o todas (al iniciar la app, tras una ingesta)."""
+        for m in ([moneda] if moneda else self.historial.monedas()):
+            self._actuales(m)
+
+    def _actuales(self, moneda: str) -> Optional[_Indicadores]:
+        moneda = moneda.upper()
+        version = self.historial.version(moneda)
+        with self._lock:
+            ind = self._indicadores.get(moneda)
+            if ind is not None and ind.version == version:
+                return ind
+            fechas, valores, fuentes = self.historial.serie_con_fuentes(moneda)
+            if len(fechas) == 0:
+                return None
+            nuevo = _Indicadores()
+            self._recalcular(ind or _Indicadores(), nuevo, fechas, valores)
+            nuevo.fuentes = fuentes
+            nuevo.version = version
+            self._indicadores[moneda] = nuevo
+            return nuevo
+
+    def _recalcular(self, viejo: _Indicadores, ind: _Indicadores, fechas: np.ndarray, valores: np.ndarray):
+        # primera posición donde la serie difiere de la ya calculada
+        n = min(len(viejo.fechas), len(fechas))
+        distintos = np.flatnonzero((viejo.fechas[:n] != fechas[:n]) | (viejo.valores[:n] != valores[:n]))
+        k = int(distintos[0]) if len(distintos) else n
+        self.recalculados += len(fechas) - k
+
+        ind.fechas, ind.valores = fechas, valores
+        if k == len(fechas) == len(viejo.fechas):
+            # se re-insertaron los mismos valores (p. ej. un snapshot repetido): nada que recalcular
+            for campo in _Indicadores.__slots__[4:]:
+                setattr(ind, campo, getattr(viejo, campo))
+            return
+        anterior = valores[k - 1:-1] if k > 0 else np.concatenate([[np.nan], valores[:-1]])
+        dif = valores[k:] - anterior
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = dif / anterior * 100.0
+        ind.var_diaria = np.concatenate([viejo.var_diaria[:k], dif])
+        ind.var_pct = np.concatenate([viejo.var_pct[:k], pct])
+
+        w = self.ventana
+        ventanas = _ventanas(valores, k, w)
+        ventanas_pct = _ventanas(ind.var_pct, k, w)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)   # ventanas todavía sin variaciones
+            ind.min_movil = np.concatenate([viejo.min_movil[:k], np.nanmin(ventanas, axis=1)])
+            ind.max_movil = np.concatenate([viejo.max_movil[:k], np.nanmax(ventanas, axis=1)])
+            ind.media_movil = np.concatenate([viejo.media_movil[:k], np.nanmean(ventanas, axis=1)])
+            ind.volatilidad = np.concatenate([viejo.volatilidad[:k], np.nanstd(ventanas_pct, axis=1)])
+
+        validos = ~np.isnan(pct)
+        ret = np.where(validos, pct, 0.0)
+        ind.acum = _acumular(viejo.acum, k, valores[k:])
+        ind.acum_ret = _acumular(viejo.acum_ret, k, ret)
+        ind.acum_ret2 = _acumular(viejo.acum_ret2, k, ret * ret)
+        ind.n_ret = _acumular(viejo.n_ret, k, validos.astype(np.float64))
+
+    # --- Consultas ---
+    def has(self, moneda: str) -> bool:
+        return self._actuales(moneda) is not None
+
+    def resumen(self, moneda: str, desde=None, hasta=None) -> Optional[dict]:
+        """
+        Indicadores del rango [desde, hasta]; sin rango, las últimas `ventana` cotizaciones.
+        None si no hay datos en el rango.
+        """
+        ind = self._actuales(moneda)
+        if ind is None:
+            return None
+        fechas = ind.fechas
+        if desde is None:
+            j = len(fechas) if hasta is None else int(np.searchsorted(fechas, _dia(hasta), side="right"))
+            i = max(0, j - self.ventana)
+        else:
+            i = int(np.searchsorted(fechas, _dia(desde), side="left"))
+            j = len(fechas) if hasta is None else int(np.searchsorted(fechas, _dia(hasta), side="right"))
+        if j <= i:
+            return None
+
+        v = ind.valores
+        tramo = v[i:j]
+        i_min, i_max = i + int(np.argmin(tramo)), i + int(np.argmax(tramo))
+        suma = ind.acum[j - 1] - (ind.acum[i - 1] if i > 0 else 0.0)
+        # variaciones diarias dentro del rango: índices i+1..j-1
+        n_ret = ind.n_ret[j - 1] - ind.n_ret[i]
+        s1 = ind.acum_ret[j - 1] - ind.acum_ret[i]
+        s2 = ind.acum_ret2[j - 1] - ind.acum_ret2[i]
+        volatilidad = float(np.sqrt(max(s2 / n_ret - (s1 / n_ret) ** 2, 0.0))) if n_ret >= 2 else None
+
+        variacion = float(v[j - 1] - v[i])
+        variacion_pct = variacion / float(v[i]) * 100.0 if v[i] else 0.0
+        if variacion_pct > _UMBRAL_ESTABLE_PCT:
+            tendencia = "alza"
+        elif variacion_pct < -_UMBRAL_ESTABLE_PCT:
+            tendencia = "baja"
+        else:
+            tendencia = "estable"
+        ultima_pct = ind.var_pct[j - 1]
+        nombres, cuantas = np.unique(ind.fuentes[i:j], return_counts=True)
+        return {
+            "moneda": moneda.upper(),
+            "desde": str(fechas[i]),
+            "hasta": str(fechas[j - 1]),
+            "cotizaciones": j - i,
+            "inicial": float(v[i]),
+            "final": float(v[j - 1]),
+            "variacion": variacion,
+            "variacion_pct": variacion_pct,
+            "tendencia": tendencia,
+            "minimo": {"valor": float(v[i_min]), "fecha": str(fechas[i_min])},
+            "maximo": {"valor": float(v[i_max]), "fecha": str(fechas[i_max])},
+            "media": float(suma / (j - i)),
+            "volatilidad_pct": volatilidad,
+            "ultima_variacion": float(ind.var_diaria[j - 1]) if j - 1 > 0 else None,
+            "ultima_variacion_pct": None if np.isnan(ultima_pct) else float(ultima_pct),
+            "media_movil": float(ind.media_movil[j - 1]),
+            # cotizaciones por fuente: el BCP y, en fechas sin dato del BCP, el recolector de Cambios Chaco
+            "fuentes": {str(f): int(n) for f, n in zip(nombres, cuantas)},
+        }
+
+    def variacion(self, moneda: str, dias: int, hasta=None) -> Optional[dict]:
+        """Variación a `dias` días: última cotización en o antes de `hasta` contra la de `dias` días antes."""
+        ind = self._actuales(moneda)
+        if ind is None:
+            return None
+        fechas, v = ind.fechas, ind.valores
+        j = len(fechas) - 1 if hasta is None else int(np.searchsorted(fechas, _dia(hasta), side="right")) - 1
+        if j < 0:
+            return None
+        i = int(np.searchsorted(fechas, fechas[j] - np.timedelta64(dias, "D"), side="right")) - 1
+        if i < 0 or i == j:
+            return None
+        return {"moneda": moneda.upper(), "desde": str(fechas[i]), "hasta": str(fechas[j]),
+                "variacion": float(v[j] - v[i]),
+                "variacion_pct": float((v[j] - v[i]) / v[i] * 100.0) if v[i] else 0.0}
+
+
+# --- Textos ---
+def _signo(x: float, decimales: int = 2) -> str:
+    return f"{x:+.{decimales}f}"
+
+
+def _texto_fuentes(r: dict) -> str:
+    """'N cotizaciones' con su fuente; los puntos del recolector se aclaran como promedio de compra y venta."""
+    n = r["cotizaciones"]
+    fuentes = r.get("fuentes") or {FUENTE_BCP: n}
+    if list(fuentes) == [FUENTE_BCP]:
+        return f"{n} cotizaciones, {FUENTE_BCP}"
+    if FUENTE_BCP not in fuentes:
+        return f"{n} cotizaciones de {' y '.join(fuentes)}, promedio de compra y venta"
+    otras = ", ".join(f"{c} de {f}" for f, c in fuentes.items() if f != FUENTE_BCP)
+    return (f"{n} cotizaciones: {fuentes[FUENTE_BCP]} del {FUENTE_BCP} y {otras}, "
+            "promedio de compra y venta en fechas sin dato del BCP")
+
+
+def texto_resumen(r: dict) -> str:
+    """Reporte en español de un `resumen` (respuesta determinística para preguntas de tendencia)."""
+    tendencia = {"alza": "al alza", "baja": "a la baja", "estable": "estable"}[r["tendencia"]]
+    lineas = [
+        f"Evolución de {r['moneda']} del {r['desde']} al {r['hasta']} ({_texto_fuentes(r)}):",
+        f"- Pasó de {r['inicial']:.2f} a {r['final']:.2f} guaraníes: {_signo(r['variacion'])} "
+        f"({_signo(r['variacion_pct'])} %), tendencia {tendencia}.",
+        f"- Mínimo {r['minimo']['valor']:.2f} ({r['minimo']['fecha']}), máximo {r['maximo']['valor']:.2f} "
+        f"({r['maximo']['fecha']}), promedio {r['media']:.2f}.",
+    ]
+    if r["ultima_variacion"] is not None:
+        linea = f"- Última variación diaria: {_signo(r['ultima_variacion'])}"
+        if r["ultima_variacion_pct"] is not None:
+            linea += f" ({_signo(r['ultima_variacion_pct'])} %)"
+        if r["volatilidad_pct"] is not None:
+            linea += f"; volatilidad diaria {r['volatilidad_pct']:.2f} %"
+        lineas.append(linea + ".")
+    return "\n".join(lineas)
+
+
+def contexto_llm(r: dict) -> str:
+    """Resumen numérico compacto para el prompt del LLM (en lugar del texto crudo del RAG)."""
+    vol = "n/d" if r["volatilidad_pct"] is None else f"{r['volatilidad_pct']:.2f}%"
+    fuentes = r.get("fuentes") or {FUENTE_BCP: r["cotizaciones"]}
+    origen = "BCP" if list(fuentes) == [FUENTE_BCP] else ", ".join(
+        f"{'BCP' if f == FUENTE_BCP else f}: {n}" for f, n in fuentes.items())
+    return (f"{r['moneda']} en guaraníes ({origen}), {r['desde']} a {r['hasta']}, {r['cotizaciones']} cotizaciones: "
+            f"inicial={r['inicial']:.2f} final={r['final']:.2f} variación={_signo(r['variacion'])} "
+            f"({_signo(r['variacion_pct'])}%) tendencia={r['tendencia']} "
+            f"mín={r['minimo']['valor']:.2f} ({r['minimo']['fecha']}) máx={r['maximo']['valor']:.2f} "
+            f"({r['maximo']['fecha']}) media={r['media']:.2f} volatilidad_diaria={vol}")
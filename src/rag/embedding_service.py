@@ -0,0 +1,293 @@
+"""
+Servicio local de embeddings compartido por todos los workers de uvicorn.
+
+Un solo proceso carga el modelo y atiende pedidos de encode por un socket Unix;
+los pedidos que llegan juntos (de cualquier worker) se agrupan en un único batch
+(micro-batching) antes de llamar al modelo. Los workers usan `RemoteEncoder`, que
+tiene la misma interfaz `.encode(texts)` que SentenceTransformer, así que no
+importan torch ni cargan el modelo: su memoria no crece con el modelo.
+
+    python -m src.rag.embedding_service --socket /tmp/cotizaciones-embeddings.sock
+    EMBEDDING_SOCKET=/tmp/cotizaciones-embeddings.sock uvicorn src.api:app --workers 4
+
+Protocolo: cada mensaje es una cabecera JSON y un cuerpo binario, ambos precedidos
+por su largo (uint32 big-endian). Pedido `{"op": "encode", "texts": [...]}`;
+respuesta `{"rows": n, "dim": d}` con los float32 en el cuerpo, o `{"error": "..."}`.
+`{"op": "info"}` responde `{"modelo": ..., "dim": d}`: con eso `RemoteEncoder` verifica
+en cada conexión que el servicio sirve el modelo del vectorstore.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .encoders import EMBEDDING_MODEL, crear_encoder
+
+log = logging.getLogger(__name__)
+
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET", "")
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))         # textos por llamada al modelo
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "2"))   # espera para juntar un batch
+
+_LARGO = struct.Struct("!I")
+
+
+def _trama(cabecera: dict, cuerpo: bytes = b"") -> bytes:
+    datos = json.dumps(cabecera, ensure_ascii=False).encode("utf-8")
+    return _LARGO.pack(len(datos)) + datos + _LARGO.pack(len(cuerpo)) + cuerpo
+
+
+def _recibir_exacto(sock: socket.socket, n: int) -> bytes:
+    partes, falta = [], n
+    while falta:
+        parte = sock.recv(min(falta, 1 << 20))
+        if not parte:
+            raise ConnectionError("el servicio de embeddings cerró la conexión")
+        partes.append(parte)
+        falta -= len(parte)
+    return b"".join(partes)
+
+
+def _leer(sock: socket.socket) -> Tuple[dict, bytes]:
+    cabecera = json.loads(_recibir_exacto(sock, _LARGO.unpack(_recibir_exacto(sock, 4))[0]))
+    return cabecera, _recibir_exacto(sock, _LARGO.unpack(_recibir_exacto(sock, 4))[0])
+
+
+async def _aleer(reader: asyncio.StreamReader) -> Tuple[dict, bytes]:
+    largo = _LARGO.unpack(await reader.readexactly(4))[0]
+    cabecera = json.loads(await reader.readexactly(largo))
+    largo = _LARGO.unpack(await reader.readexactly(4))[0]
+    return cabecera, await reader.readexactly(largo)
+
+
+class EmbeddingServer:
+    """
+    Atiende pedidos de encode de varios clientes con un solo modelo.
+
+    Un pedido espera a lo sumo `max_wait_ms` a que lleguen otros; mientras el modelo
+    procesa un batch, los pedidos nuevos se acumulan para el siguiente. Los textos
+    repetidos dentro de un batch se codifican una sola vez.
+    """
+
+    def __init__(self, model, path: str, max_batch: int = EMBEDDING_MAX_BATCH,
+                 max_wait_ms: float = EMBEDDING_MAX_WAIT_MS, model_name: str = "", dim: int = 0):
+        self.model, self.path, self.model_name = model, path, model_name
+        self.dim = dim   # 0 = se conoce con el primer encode
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._cola: Optional[asyncio.Queue] = None
+        # el modelo corre en un solo hilo: torch ya paraleliza dentro de cada batch
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="embeddings")
+        self._stats = {"pedidos": 0, "textos": 0, "batches": 0, "textos_codificados": 0, "errores": 0}
+
+    def stats(self) -> dict:
+        stats = dict(self._stats, modelo=self.model_name, dim=self.dim)
+        stats["textos_por_batch"] = stats["textos_codificados"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _encode(self, textos: list) -> np.ndarray:
+        embs = np.asarray(self.model.encode(textos, show_progress_bar=False), dtype=np.float32)
+        if embs.ndim == 2:
+            self.dim = embs.shape[1]
+        return embs
+
+    async def _info(self) -> dict:
+        if not self.dim:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._encode, ["warmup"])
+        return {"modelo": self.model_name, "dim": self.dim}
+
+    async def _juntar(self, loop) -> list:
+        lote = [await self._cola.get()]
+        n = len(lote[0][0])
+        limite = loop.time() + self.max_wait
+        while n < self.max_batch:
+            restante = limite - loop.time()
+            if restante <= 0 and self._cola.empty():
+                break
+            try:
+                item = self._cola.get_nowait() if restante <= 0 else await asyncio.wait_for(self._cola.get(), restante)
+            except asyncio.TimeoutError:
+                break
+            lote.append(item)
+            n += len(item[0])
+        return lote
+
+    async def _procesar_lotes(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = await self._juntar(loop)
+            unicos = list(dict.fromkeys(t for textos, _ in lote for t in textos))
+            try:
+                embs = await loop.run_in_executor(self._executor, self._encode, unicos)
+            except Exception as e:
+                self._stats["errores"] += 1
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            self._stats["batches"] += 1
+            self._stats["textos_codificados"] += len(unicos)
+            fila = {t: i for i, t in enumerate(unicos)}
+            for textos, futuro in lote:
+                if not futuro.done():
+                    futuro.set_result(embs[[fila[t] for t in textos]])
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                cabecera, _ = await _aleer(reader)
+                if cabecera.get("op") == "stats":
+                    writer.write(_trama(self.stats()))
+                elif cabecera.get("op") == "info":
+                    writer.write(_trama(await self._info()))
+                else:
+                    textos = [str(t) for t in cabecera.get("texts", [])]
+                    self._stats["pedidos"] += 1
+                    self._stats["textos"] += len(textos)
+                    futuro = loop.create_future()
+                    await self._cola.put((textos, futuro))
+                    try:
+                        embs = await futuro
+                        writer.write(_trama({"rows": embs.shape[0], "dim": embs.shape[1]},
+                                            np.ascontiguousarray(embs).tobytes()))
+                    except Exception as e:
+                        writer.write(_trama({"error": f"{type(e).__name__}: {e}"}))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, listo: Optional[threading.Event] = None):
+        self._cola = asyncio.Queue()
+        if os.path.exists(self.path):
+            os.unlink(self.path)   # socket de una ejecución anterior
+        server = await asyncio.start_unix_server(self._atender, path=self.path)
+        os.chmod(self.path, 0o660)
+        lotes = asyncio.create_task(self._procesar_lotes())
+        if listo is not None:
+            listo.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            lotes.cancel()
+            self._executor.shutdown(wait=False)
+
+
+class RemoteEncoder:
+    """
+    Cliente de `EmbeddingServer` con la interfaz de SentenceTransformer (`encode`).
+    Una conexión por hilo; si el servicio se reinició, reconecta una vez.
+
+    Con `model_name` (y `dim`) cada conexión nueva pide `info` al servicio y se rechaza
+    con `ValueError` si sirve otro modelo: así un servicio reiniciado con otro modelo no
+    mezcla embeddings incompatibles con los del vectorstore.
+    """
+
+    def __init__(self, path: str = EMBEDDING_SOCKET, timeout: float = 30.0,
+                 model_name: Optional[str] = None, dim: Optional[int] = None):
+        if not path:
+            raise ValueError("RemoteEncoder necesita la ruta del socket (EMBEDDING_SOCKET)")
+        self.path, self.timeout = path, timeout
+        self.model_name, self.dim = model_name, dim
+        self._local = threading.local()
+
+    def _comprobar(self, info: dict):
+        if self.model_name and info.get("modelo") != self.model_name:
+            raise ValueError(f"El servicio de embeddings sirve {info.get('modelo') or 'un modelo sin nombre'}, "
+                             f"no {self.model_name}")
+        if self.dim and info.get("dim") != self.dim:
+            raise ValueError(f"El servicio de embeddings devuelve dimensión {info.get('dim')}, no {self.dim}")
+
+    def _conexion(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+                if self.model_name or self.dim:
+                    sock.sendall(_trama({"op": "info"}))
+                    self._comprobar(_leer(sock)[0])
+            except (OSError, ValueError):
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _cerrar(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _pedir(self, cabecera: dict) -> Tuple[dict, bytes]:
+        for intento in range(2):
+            try:
+                sock = self._conexion()
+                sock.sendall(_trama(cabecera))
+                return _leer(sock)
+            except ConnectionError:
+                self._cerrar()
+                if intento:
+                    raise
+            except OSError:
+                # timeout u otro error a mitad de un mensaje: la conexión queda inservible
+                self._cerrar()
+                raise
+
+    def encode(self, texts, show_progress_bar=False, **kwargs) -> np.ndarray:
+        cabecera, cuerpo = self._pedir({"op": "encode", "texts": list(texts)})
+        if "error" in cabecera:
+            raise RuntimeError(f"Servicio de embeddings: {cabecera['error']}")
+        return np.frombuffer(cuerpo, dtype=np.float32).reshape(cabecera["rows"], cabecera["dim"])
+
+    def stats(self) -> dict:
+        return self._pedir({"op": "stats"})[0]
+
+    def verificar(self, model_name: str, dim: Optional[int] = None):
+        """
+        Fija el modelo (y la dimensión) esperados, p. ej. los del manifest al cargar el
+        vectorstore, y los comprueba ya. Si el servicio todavía no está levantado, la
+        comprobación queda para la primera conexión.
+        """
+        self.model_name, self.dim = model_name, dim or self.dim
+        self._cerrar()
+        try:
+            self._conexion()
+        except OSError as e:
+            log.warning("servicio de embeddings no disponible (%s): el modelo se verifica al conectar", e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET or "/tmp/cotizaciones-embeddings.sock")
+    parser.add_argument("--modelo", default=EMBEDDING_MODEL, help="modelo de sentence-transformers o 'hashing'")
+    parser.add_argument("--max-batch", type=int, default=EMBEDDING_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBEDDING_MAX_WAIT_MS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    modelo = crear_encoder(args.modelo)
+    dim = np.asarray(modelo.encode(["warmup"], show_progress_bar=False)).shape[1]
+    log.info("servicio de embeddings (%s, dim %d) escuchando en %s", args.modelo, dim, args.socket)
+    servidor = EmbeddingServer(modelo, args.socket, args.max_batch, args.max_wait_ms, model_name=args.modelo, dim=dim)
+    try:
+        asyncio.run(servidor.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
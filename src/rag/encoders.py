@@ -0,0 +1,82 @@
+"""
+Encoders de texto intercambiables para `SimpleVectorStore`.
+
+Un encoder es cualquier objeto con `encode(texts, show_progress_bar=False)` que
+devuelva un array (n, dim); el store normaliza las filas. `crear_encoder` elige
+la implementación por nombre (el mismo `model_name` que queda en el manifest):
+
+- `hashing` / `hashing-<dim>`: `HashingEncoder`, sin modelo ni dependencias.
+- cualquier otro nombre: un modelo de sentence-transformers (p. ej. all-MiniLM-L6-v2).
+"""
+
+import os
+import re
+import unicodedata
+import zlib
+from typing import List, Protocol
+
+import numpy as np
+
+from ..intent import buscar_monedas, parse_intent
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+_RE_FECHA_ISO = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_RE_PALABRA = re.compile(r"\w+")
+
+
+class Encoder(Protocol):
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray: ...
+
+
+class HashingEncoder:
+    """
+    Encoder sin modelo para documentos de cotizaciones: feature hashing de palabras y
+    bigramas más rasgos estructurados con más peso (ISO de las monedas mencionadas,
+    fecha y mes). Así "dólar" y "USD", o "8 de agosto" y "2025-08-08", caen en la
+    misma dimensión. Es determinístico, no necesita torch y codifica miles de textos
+    por segundo en CPU; la similitud semántica fuera de esos rasgos es solo léxica.
+    """
+
+    def __init__(self, dim: int = 384, peso_rasgos: float = 3.0):
+        self.dim, self.peso_rasgos = dim, peso_rasgos
+
+    @staticmethod
+    def _normalizar(texto: str) -> str:
+        t = unicodedata.normalize("NFKD", texto.lower())
+        return "".join(c for c in t if not unicodedata.combining(c))
+
+    def _rasgos(self, texto: str) -> List[str]:
+        rasgos = [f"#moneda:{iso}" for iso in buscar_monedas(texto)]
+        fechas = ["-".join(m) for m in _RE_FECHA_ISO.findall(texto)]
+        if not fechas:
+            fecha = parse_intent(texto).fecha
+            fechas = [fecha] if fecha else []
+        for fecha in fechas:
+            rasgos += [f"#fecha:{fecha}", f"#mes:{fecha[:7]}"]
+        return rasgos
+
+    def _sumar(self, fila: np.ndarray, token: str, peso: float):
+        h = zlib.crc32(token.encode("utf-8"))
+        fila[h % self.dim] += peso if h & 0x80000000 else -peso
+
+    def encode(self, texts, show_progress_bar=False, **kwargs) -> np.ndarray:
+        salida = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for fila, texto in zip(salida, texts):
+            palabras = _RE_PALABRA.findall(self._normalizar(texto))
+            for token in palabras:
+                self._sumar(fila, token, 1.0)
+            for a, b in zip(palabras, palabras[1:]):
+                self._sumar(fila, a + " " + b, 1.0)
+            for rasgo in self._rasgos(texto):
+                self._sumar(fila, rasgo, self.peso_rasgos)
+        return salida
+
+
+def crear_encoder(nombre: str = EMBEDDING_MODEL):
+    """Encoder para `nombre`; sentence-transformers se importa solo si hace falta."""
+    if nombre == "hashing" or nombre.startswith("hashing-"):
+        dim = int(nombre.split("-", 1)[1]) if "-" in nombre else 384
+        return HashingEncoder(dim)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(nombre)
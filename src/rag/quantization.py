@@ -0,0 +1,59 @@
+"""
+Cuantización escalar de la matriz de embeddings.
+
+- `int8`: cada vector se guarda como enteros en [-127, 127] más una escala float32
+  propia (máximo absoluto / 127): 4 veces menos memoria que float32.
+- `float16`: la mitad de memoria; los vectores ya están normalizados, no hace falta escala.
+  numpy convierte float16 a float32 sin SIMD, así que recorrerla es varias veces más lento
+  que float32: conviene solo cuando lo que falta es memoria (ver scripts/bench_quantization.py).
+
+El producto se calcula decuantizando por bloques de `_BLOQUE` filas a un buffer float32
+que entra en cache, así se recorre la matriz cuantizada (1 o 2 bytes por valor) sin
+materializar una copia float32 completa y se sigue usando BLAS para el producto.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+_BLOQUE = 1024
+
+
+def validar(modo: str) -> str:
+    if modo not in QUANTIZATIONS:
+        raise ValueError(f"Cuantización no soportada: {modo} (usar {', '.join(QUANTIZATIONS)})")
+    return modo
+
+
+def cuantizar(x: np.ndarray, modo: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(códigos, escalas por fila); las escalas son None para float16."""
+    x = np.asarray(x, dtype=np.float32)
+    if modo == "float16":
+        return x.astype(np.float16), None
+    maximo = np.abs(x).max(axis=1) if x.size else np.zeros(len(x), dtype=np.float32)
+    escalas = np.where(maximo > 0, maximo / 127.0, 1.0).astype(np.float32)
+    codigos = np.clip(np.rint(x / escalas[:, None]), -127, 127).astype(np.int8)
+    return codigos, escalas
+
+
+def decuantizar(codigos: np.ndarray, escalas: Optional[np.ndarray]) -> np.ndarray:
+    x = codigos.astype(np.float32)
+    if escalas is not None:
+        x *= escalas[:, None]
+    return x
+
+
+def puntajes(codigos: np.ndarray, escalas: Optional[np.ndarray], q: np.ndarray) -> np.ndarray:
+    """`codigos` (n, d) @ `q` (d,) o (d, m) en float32, decuantizando por bloques."""
+    n, d = codigos.shape
+    out = np.empty((n,) if q.ndim == 1 else (n, q.shape[1]), dtype=np.float32)
+    buf = np.empty((min(_BLOQUE, n), d), dtype=np.float32)
+    for inicio in range(0, n, _BLOQUE):
+        fin = min(n, inicio + _BLOQUE)
+        bloque = buf[:fin - inicio]
+        np.copyto(bloque, codigos[inicio:fin], casting="unsafe")
+        np.matmul(bloque, q, out=out[inicio:fin])
+    if escalas is not None:
+        out *= escalas if q.ndim == 1 else escalas[:, None]
+    return out
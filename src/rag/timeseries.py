@@ -0,0 +1,175 @@
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+FUENTE_BCP = "Banco Central del Paraguay"
+
+
+def _dia(fecha) -> np.datetime64:
+    """Acepta 'YYYY-MM-DD', date o datetime64 y devuelve datetime64[D]."""
+    if isinstance(fecha, datetime.datetime):
+        fecha = fecha.date()
+    return np.datetime64(fecha, "D")
+
+
+class RateHistoryStore:
+    """
+    Serie temporal de cotizaciones históricas indexada por moneda y fecha.
+
+    Cada moneda guarda arrays columnares ordenados por fecha (`datetime64[D]`,
+    `float64` y la fuente de cada punto: el BCP o, en fechas sin dato del BCP,
+    el recolector de Cambios Chaco), así las búsquedas exactas, por fecha más
+    cercana y por rango son binarias (O(log n)) con `np.searchsorted`.
+    Las inserciones se acumulan y se fusionan en bloque en la siguiente lectura;
+    si una fecha se repite, gana el último valor insertado.
+    """
+
+    def __init__(self):
+        self._series: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._pendientes: Dict[str, List[Tuple[np.datetime64, float, str]]] = {}
+        self._versiones: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_docs(cls, docs: Iterable[dict]) -> "RateHistoryStore":
+        """Construye el store a partir del `meta` de los documentos del vectorstore."""
+        store = cls()
+        store.add_docs(docs)
+        return store
+
+    # --- Escritura ---
+    def add(self, moneda: str, fecha, valor: float, fuente: str = FUENTE_BCP):
+        with self._lock:
+            self._pendientes.setdefault(moneda.upper(), []).append((_dia(fecha), float(valor), fuente))
+
+    def add_many(self, filas: Iterable[tuple]):
+        """Filas (moneda, fecha, valor) o (moneda, fecha, valor, fuente); sin fuente, el BCP."""
+        with self._lock:
+            for moneda, fecha, valor, *fuente in filas:
+                self._pendientes.setdefault(moneda.upper(), []).append(
+                    (_dia(fecha), float(valor), fuente[0] if fuente else FUENTE_BCP))
+
+    def add_docs(self, docs: Iterable[dict]):
+        filas = []
+        for d in docs:
+            meta = d.get("meta") or {}
+            if meta.get("fecha") and meta.get("moneda") and meta.get("valor_guaranies") is not None:
+                filas.append((meta["moneda"], meta["fecha"], meta["valor_guaranies"]))
+        self.add_many(filas)
+
+    def _serie(self, moneda: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        moneda = moneda.upper()
+        with self._lock:
+            nuevos = self._pendientes.pop(moneda, None)
+            if nuevos:
+                fechas = np.array([f for f, _, _ in nuevos], dtype="datetime64[D]")
+                valores = np.array([v for _, v, _ in nuevos], dtype=np.float64)
+                fuentes = np.array([o for _, _, o in nuevos], dtype=object)
+                if moneda in self._series:
+                    f_prev, v_prev, o_prev = self._series[moneda]
+                    fechas = np.concatenate([f_prev, fechas])
+                    valores = np.concatenate([v_prev, valores])
+                    fuentes = np.concatenate([o_prev, fuentes])
+                orden = np.argsort(fechas, kind="stable")
+                fechas, valores, fuentes = fechas[orden], valores[orden], fuentes[orden]
+                # ante fechas duplicadas se conserva la última inserción
+                ultimo = np.append(fechas[1:] != fechas[:-1], True)
+                self._series[moneda] = (np.ascontiguousarray(fechas[ultimo]), np.ascontiguousarray(valores[ultimo]),
+                                        fuentes[ultimo])
+                self._versiones[moneda] = self._versiones.get(moneda, 0) + 1
+            return self._series.get(moneda)
+
+    # --- Lectura ---
+    @staticmethod
+    def _punto(moneda: str, serie: Tuple[np.ndarray, np.ndarray, np.ndarray], i: int) -> dict:
+        fechas, valores, fuentes = serie
+        return {"fecha": str(fechas[i]), "moneda": moneda, "valor_guaranies": float(valores[i]),
+                "fuente": fuentes[i]}
+
+    def monedas(self) -> List[str]:
+        with self._lock:
+            return sorted(set(self._series) | set(self._pendientes))
+
+    def serie(self, moneda: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Arrays completos (fechas, valores) de la moneda, ordenados por fecha. No modificarlos."""
+        fechas, valores, _ = self.serie_con_fuentes(moneda)
+        return fechas, valores
+
+    def serie_con_fuentes(self, moneda: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Como `serie`, con un tercer array alineado con la fuente de cada punto."""
+        serie = self._serie(moneda)
+        if serie is None:
+            return (np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64),
+                    np.array([], dtype=object))
+        return serie
+
+    def version(self, moneda: str) -> int:
+        """Aumenta cada vez que la serie de la moneda cambia (para invalidar cálculos derivados)."""
+        self._serie(moneda)
+        with self._lock:
+            return self._versiones.get(moneda.upper(), 0)
+
+    def has(self, moneda: str) -> bool:
+        serie = self._serie(moneda)
+        return serie is not None and len(serie[0]) > 0
+
+    def __len__(self) -> int:
+        return sum(len(self._serie(m)[0]) for m in self.monedas())
+
+    def exact(self, moneda: str, fecha) -> Optional[dict]:
+        serie = self._serie(moneda)
+        if serie is None:
+            return None
+        fechas = serie[0]
+        dia = _dia(fecha)
+        i = int(np.searchsorted(fechas, dia))
+        if i < len(fechas) and fechas[i] == dia:
+            return self._punto(moneda.upper(), serie, i)
+        return None
+
+    def nearest(self, moneda: str, fecha, max_dias: Optional[int] = None, solo_anteriores: bool = False) -> Optional[dict]:
+        """
+        Punto con la fecha más cercana a `fecha`. Con `solo_anteriores` se toma el último
+        dato publicado en o antes de esa fecha (útil para fines de semana y feriados).
+        """
+        serie = self._serie(moneda)
+        if serie is None or len(serie[0]) == 0:
+            return None
+        fechas = serie[0]
+        dia = _dia(fecha)
+        i = int(np.searchsorted(fechas, dia))
+        candidatos = [j for j in (i - 1, i) if 0 <= j < len(fechas)]
+        if solo_anteriores:
+            candidatos = [j for j in candidatos if fechas[j] <= dia]
+        if not candidatos:
+            return None
+        j = min(candidatos, key=lambda c: abs(int((fechas[c] - dia).astype(int))))
+        if max_dias is not None and abs(int((fechas[j] - dia).astype(int))) > max_dias:
+            return None
+        return self._punto(moneda.upper(), serie, j)
+
+    def range(self, moneda: str, desde, hasta) -> List[dict]:
+        """Puntos con fecha en [desde, hasta], ordenados por fecha."""
+        fechas, valores, fuentes = self.serie_con_fuentes(moneda)
+        i, j = self._limites(fechas, desde, hasta)
+        tramo = (fechas[i:j], valores[i:j], fuentes[i:j])
+        return [self._punto(moneda.upper(), tramo, k) for k in range(j - i)]
+
+    def range_arrays(self, moneda: str, desde, hasta) -> Tuple[np.ndarray, np.ndarray]:
+        """Igual que `range` pero devuelve vistas (fechas, valores) sin copiar."""
+        fechas, valores = self.serie(moneda)
+        i, j = self._limites(fechas, desde, hasta)
+        return fechas[i:j], valores[i:j]
+
+    @staticmethod
+    def _limites(fechas: np.ndarray, desde, hasta) -> Tuple[int, int]:
+        return (int(np.searchsorted(fechas, _dia(desde), side="left")),
+                int(np.searchsorted(fechas, _dia(hasta), side="right")))
+
+    def latest(self, moneda: str) -> Optional[dict]:
+        serie = self._serie(moneda)
+        if serie is None or len(serie[0]) == 0:
+            return None
+        return self._punto(moneda.upper(), serie, len(serie[0]) - 1)
@@ -1,42 +1,910 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import asyncio
+import contextvars
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Optional, Sequence
+import io
+import json
 import pickle, os
+import shutil
+import sqlite3
+
+from .. import metrics
+from .encoders import EMBEDDING_MODEL, crear_encoder
+from .quantization import cuantizar, puntajes, validar
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = 'manifest.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+QUANTIZED_FILE = 'embeddings.q.npy'
+SCALES_FILE = 'scales.npy'
+DOCS_FILE = 'docs.sqlite'
+
+# Matriz que se recorre en cada búsqueda: float32 (exacta), float16 o int8 (ver quantization.py).
+# Con cuantización, los `VECTORSTORE_RERANK`·k mejores candidatos se re-puntúan contra los
+# embeddings float32 (0 = sin re-rank, puntajes aproximados).
+VECTORSTORE_QUANTIZATION = os.getenv('VECTORSTORE_QUANTIZATION', 'float32')
+VECTORSTORE_RERANK = int(os.getenv('VECTORSTORE_RERANK', '4'))
+
+# Hilos dedicados al encode/búsqueda desde código async: acota la CPU que el RAG
+# puede tomar sin bloquear el event loop ni competir con el threadpool de Starlette.
+ENCODE_WORKERS = int(os.getenv('ENCODE_WORKERS', '2'))
+_encode_executor = None
+_encode_executor_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _encode_executor
+    if _encode_executor is None:
+        with _encode_executor_lock:
+            if _encode_executor is None:
+                _encode_executor = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix='encode')
+    return _encode_executor
+
+
+def _normalize_rows(x) -> np.ndarray:
+    """Devuelve una copia float32 C-contigua con cada fila normalizada (norma L2 = 1)."""
+    x = np.array(x, dtype=np.float32, order='C', ndmin=2)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    x /= norms
+    return x
+
+
+def _top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k mayores puntajes, ordenados de mayor a menor (argpartition + sort de k)."""
+    n = sims.shape[-1]
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(sims)[::-1]
+    part = np.argpartition(sims, n - k)[n - k:]
+    return part[np.argsort(sims[part])[::-1]]
+
+
+def _grow(buf: Optional[np.ndarray], n: int, cap: int, shape: tuple, dtype) -> np.ndarray:
+    """`buf` con capacidad `cap` y escribible, conservando las primeras `n` filas (copia al heap si hace falta)."""
+    if buf is not None and buf.shape[0] >= cap and buf.flags.writeable:
+        return buf
+    nuevo = np.empty((cap,) + shape, dtype=dtype)
+    if n:
+        nuevo[:n] = buf[:n]
+    return nuevo
+
+
+def _append_npy(path: str, arr: np.ndarray, start: int) -> bool:
+    """
+    Agrega al .npy las filas `arr[start:]` y actualiza el shape del header en el lugar.
+    Devuelve False si el header nuevo no entra en el espacio del anterior.
+    """
+    nuevos = np.ascontiguousarray(arr[start:])
+    fila = nuevos.itemsize * int(np.prod(arr.shape[1:], dtype=np.int64))
+    with open(path, 'r+b') as f:
+        np.lib.format.read_magic(f)
+        np.lib.format.read_array_header_1_0(f)
+        offset = f.tell()
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(arr.dtype),
+                                                      'fortran_order': False, 'shape': arr.shape})
+        if header.tell() != offset:
+            return False
+        # descartar bytes de una escritura previa interrumpida y agregar las filas nuevas
+        f.truncate(offset + start * fila)
+        f.seek(0, os.SEEK_END)
+        f.write(nuevos.tobytes())
+        f.flush()
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+class _LectoresEscritor:
+    """
+    Lock de lectores/escritor: muchas búsquedas a la vez o una sola escritura del estado.
+    Un escritor esperando frena a los lectores nuevos (la compactación no queda postergada
+    por un flujo continuo de consultas). La escritura es reentrante para el mismo hilo.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._lectores = 0
+        self._escritor = None
+        self._profundidad = 0
+        self._esperando = 0
+
+    @contextmanager
+    def lectura(self):
+        with self._cond:
+            while self._escritor is not None or self._esperando:
+                self._cond.wait()
+            self._lectores += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._lectores -= 1
+                if not self._lectores:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def escritura(self):
+        yo = threading.get_ident()
+        with self._cond:
+            if self._escritor != yo:
+                self._esperando += 1
+                while self._escritor is not None or self._lectores:
+                    self._cond.wait()
+                self._esperando -= 1
+                self._escritor = yo
+            self._profundidad += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._profundidad -= 1
+                if not self._profundidad:
+                    self._escritor = None
+                    self._cond.notify_all()
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class QueryEmbeddingCache:
+    """
+    LRU acotado (con TTL opcional) de embeddings de consulta ya normalizados,
+    indexado por (modelo, texto normalizado). Las consultas de `rag_lookup` son
+    plantillas con pocas variantes, así que casi siempre evitan el forward del encoder.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[1] < self.ttl):
+                self._data.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self._misses += 1
+            return None
+
+    def put(self, key, emb: np.ndarray):
+        emb.setflags(write=False)
+        with self._lock:
+            self._data[key] = (emb, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {"hits": self._hits, "misses": self._misses, "size": len(self._data),
+                    "maxsize": self.maxsize, "hit_ratio": self._hits / total if total else 0.0}
+
+
+class MetadataIndex:
+    """
+    Índice invertido valor → filas para un campo de `meta`. Los valores se mantienen
+    ordenados, así sirve tanto para igualdad como para rangos (p. ej. fechas ISO).
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._keys = None
+        self._arrays = {}
+
+    def add(self, value, row: int):
+        if value is None:
+            return
+        if value not in self._rows:
+            self._rows[value] = []
+            self._keys = None
+        self._rows[value].append(row)
+        self._arrays.pop(value, None)
+
+    def _array(self, value) -> np.ndarray:
+        arr = self._arrays.get(value)
+        if arr is None:
+            arr = self._arrays[value] = np.array(self._rows.get(value, ()), dtype=np.intp)
+        return arr
+
+    def equals(self, values) -> np.ndarray:
+        if isinstance(values, (list, tuple, set, frozenset)):
+            partes = [self._array(v) for v in values if v in self._rows]
+            return np.unique(np.concatenate(partes)) if partes else np.empty(0, dtype=np.intp)
+        return self._array(values) if values in self._rows else np.empty(0, dtype=np.intp)
+
+    def between(self, desde=None, hasta=None) -> np.ndarray:
+        if self._keys is None:
+            self._keys = sorted(self._rows)
+        i = bisect_left(self._keys, desde) if desde is not None else 0
+        j = bisect_right(self._keys, hasta) if hasta is not None else len(self._keys)
+        partes = [self._array(v) for v in self._keys[i:j]]
+        return np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.intp)
+
 
 class SimpleVectorStore:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        self.model = SentenceTransformer(model_name)
-        self.docs = []
-        self.embeddings = None
+    """
+    Vectorstore en memoria con búsqueda por similitud coseno.
+
+    Los embeddings se guardan ya normalizados en una matriz float32 C-contigua,
+    así cada consulta es un único producto matriz-vector seguido de un top-k
+    con `argpartition`, sin renormalizar ni ordenar todo el corpus.
+
+    Con `quantization` 'int8' o 'float16' se mantiene además una copia cuantizada
+    de la matriz (4× o 2× más chica) que es la que se recorre en cada consulta; los
+    mejores `rerank`·k candidatos se re-puntúan con los vectores float32, que al
+    cargar desde disco quedan en el mmap y solo se leen para esas filas.
+
+    Los campos de `meta` listados en `index_fields` tienen índices invertidos y
+    se pueden usar como filtro `where` en `query`/`query_many`:
+      - igualdad: {"moneda": "USD"} o pertenencia: {"moneda": ["USD", "EUR"]}
+      - rango:    {"fecha": {"desde": "2025-08-01", "hasta": "2025-08-10"}}
+    Solo se puntúan las filas que cumplen el filtro.
+
+    La ingesta es incremental: la matriz vive en un buffer con crecimiento
+    geométrico, `upsert` usa `doc['id']` como clave (solo re-embebe textos nuevos
+    o modificados) y los borrados son lápidas que se compactan cuando superan
+    `compact_ratio` de las filas.
+
+    Las búsquedas leen docs, matriz, lápidas e índices bajo el lock de lectura; las
+    escrituras del estado (agregar filas, lápidas, compactar, cargar) toman el de
+    escritura, así una consulta nunca mezcla filas de antes y después de una compactación.
+    El encode de los textos nuevos queda fuera del lock exclusivo.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, model=None,
+                 query_cache_size: int = 4096, query_cache_ttl: Optional[float] = None,
+                 index_fields: Sequence[str] = ('moneda', 'fecha'), compact_ratio: float = 0.25,
+                 quantization: str = VECTORSTORE_QUANTIZATION, rerank: int = VECTORSTORE_RERANK):
+        self.model_name = model_name
+        self.quantization = validar(quantization)
+        self.rerank = max(0, rerank)
+        # `model` permite inyectar cualquier encoder con `.encode(texts)` (benchmarks, pruebas);
+        # si no, se crea con `crear_encoder(model_name)` recién en el primer encode
+        self._model = model
+        self._model_lock = threading.Lock()
+        self.query_cache = QueryEmbeddingCache(query_cache_size, query_cache_ttl) if query_cache_size else None
+        self.index_fields = tuple(index_fields)
+        self.compact_ratio = compact_ratio
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._rw = _LectoresEscritor()
+        self._storage_path = None
+        self._persisted_rows = 0
+        self._deleted_since_save = set()
+        self._needs_rewrite = False
+        self._set_state([], None)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = crear_encoder(self.model_name)
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._model is not None
+
+    def warmup(self):
+        """Carga el modelo y ejecuta un encode de prueba; pensado para correr en segundo plano tras el arranque."""
+        self.model.encode(["warmup"], show_progress_bar=False)
+
+    @property
+    def embeddings(self):
+        return self._matrix
+
+    def __len__(self) -> int:
+        return len(self.docs) - len(self._dead_rows)
+
+    def live_docs(self):
+        """Documentos vigentes (sin lápidas), en orden de inserción."""
+        with self._rw.lectura():
+            docs = list(self.docs)
+            alive = self._alive[:len(docs)].copy()
+        return (d for i, d in enumerate(docs) if alive[i])
+
+    def index_nbytes(self) -> int:
+        """Bytes de la matriz que recorre cada búsqueda (la cuantizada y sus escalas, si hay)."""
+        if self._matrix is None:
+            return 0
+        if self._qmatrix is None:
+            return self._matrix.nbytes
+        return self._qmatrix.nbytes + (self._qscales.nbytes if self._qscales is not None else 0)
+
+    def _set_state(self, docs: list, matrix: Optional[np.ndarray], alive: Optional[np.ndarray] = None,
+                   quantized: Optional[tuple] = None):
+        """
+        Reemplaza todo el contenido. Ante ids repetidos queda viva solo la última fila.
+        `quantized` (códigos, escalas) evita recalcular la matriz cuantizada.
+        """
+        self.docs = list(docs)
+        n = len(self.docs)
+        self._qbuf = self._qscales_buf = self._qmatrix = self._qscales = None
+        if self.quantization != 'float32' and matrix is not None and n:
+            self._qbuf, self._qscales_buf = quantized or cuantizar(matrix[:n], self.quantization)
+            self._qmatrix = self._qbuf[:n]
+            self._qscales = self._qscales_buf[:n] if self._qscales_buf is not None else None
+        self._buf = matrix
+        self._matrix = matrix[:n] if matrix is not None and n else None
+        self._alive = np.ones(n, dtype=bool) if alive is None else np.array(alive, dtype=bool)
+        self._id_to_row = {}
+        for row, d in enumerate(self.docs):
+            doc_id = d.get('id')
+            if doc_id is None or not self._alive[row]:
+                continue
+            prev = self._id_to_row.get(doc_id)
+            if prev is not None:
+                self._alive[prev] = False
+            self._id_to_row[doc_id] = row
+        self._refresh_dead()
+        self._rebuild_indexes()
+
+    def _refresh_dead(self):
+        self._dead_rows = np.flatnonzero(~self._alive[:len(self.docs)])
+
+    def _reserve(self, extra: int, dim: int):
+        """Garantiza capacidad para `extra` filas más, duplicando el buffer si hace falta."""
+        n = len(self.docs)
+        need = n + extra
+        if self._buf is not None and self._buf.shape[1] != dim:
+            raise ValueError(f"Dimensión de embedding {dim} distinta de la del store ({self._buf.shape[1]})")
+        # un buffer mmap de solo lectura (recién cargado o guardado) se copia al heap en la primera
+        # escritura; `save` lo vuelve a mapear (ver `_remap`)
+        if self._buf is None or need > self._buf.shape[0] or not self._buf.flags.writeable:
+            cap = max(need, 64, 2 * (self._buf.shape[0] if self._buf is not None else 0))
+            buf = np.empty((cap, dim), dtype=np.float32)
+            if n:
+                buf[:n] = self._buf[:n]
+            self._buf = buf
+        if self.quantization != 'float32':
+            self._qbuf = _grow(self._qbuf, n, self._buf.shape[0], (dim,),
+                               np.int8 if self.quantization == 'int8' else np.float16)
+            if self.quantization == 'int8':
+                self._qscales_buf = _grow(self._qscales_buf, n, self._buf.shape[0], (), np.float32)
+        if need > self._alive.shape[0]:
+            alive = np.zeros(self._buf.shape[0], dtype=bool)
+            alive[:n] = self._alive[:n]
+            self._alive = alive
+
+    def _append_rows(self, docs: list, embs: np.ndarray):
+        start = len(self.docs)
+        self._reserve(len(docs), embs.shape[1])
+        end = start + len(docs)
+        self._buf[start:end] = embs
+        if self._qbuf is not None:
+            codigos, escalas = cuantizar(embs, self.quantization)
+            self._qbuf[start:end] = codigos
+            if escalas is not None:
+                self._qscales_buf[start:end] = escalas
+        self._alive[start:end] = True
+        self.docs.extend(docs)
+        if self._qbuf is not None:
+            self._qmatrix = self._qbuf[:end]
+            self._qscales = self._qscales_buf[:end] if self._qscales_buf is not None else None
+        self._matrix = self._buf[:end]
+        self._index_docs(start, docs)
+        for row, d in enumerate(docs, start):
+            if d.get('id') is not None:
+                self._id_to_row[d['id']] = row
+
+    def _kill_rows(self, rows):
+        if not rows:
+            return
+        self._alive[rows] = False
+        self._deleted_since_save.update(r for r in rows if r < self._persisted_rows)
+        self._refresh_dead()
 
     def add_documents(self, docs: list):
-        texts = [d['text'] for d in docs]
-        embs = self.model.encode(texts, show_progress_bar=False)
-        if self.embeddings is None:
-            self.embeddings = np.array(embs)
+        """Agrega documentos; los que traen un `id` ya existente se actualizan (ver `upsert`)."""
+        return self.upsert(docs)
+
+    def upsert(self, docs: list, embeddings: Optional[np.ndarray] = None) -> dict:
+        """
+        Inserta o actualiza por `doc['id']`. Solo se codifican los textos nuevos o
+        modificados; si cambió únicamente el `meta` se reutiliza el embedding anterior.
+        Los documentos sin id siempre se agregan. `embeddings` (alineado con `docs`)
+        permite pasar vectores ya calculados, p. ej. por un pool de procesos.
+        """
+        ultimos = {}
+        sin_id = []
+        for pos, d in enumerate(docs):
+            if d.get('id') is None:
+                sin_id.append((d, pos))
+            else:
+                ultimos[d['id']] = (d, pos)
+        with self._write_lock:
+            pendientes = []  # (doc, fila anterior o None, posición en `docs`)
+            sin_cambios = 0
+            for doc_id, (d, pos) in ultimos.items():
+                row = self._id_to_row.get(doc_id)
+                if row is not None:
+                    old = self.docs[row]
+                    if old.get('text') == d['text'] and (old.get('meta') or {}) == (d.get('meta') or {}):
+                        sin_cambios += 1
+                        continue
+                pendientes.append((d, row, pos))
+            pendientes.extend((d, None, pos) for d, pos in sin_id)
+            if not pendientes:
+                return {'insertados': 0, 'actualizados': 0, 'sin_cambios': sin_cambios, 'codificados': 0}
+
+            a_codificar = [i for i, (d, row, _) in enumerate(pendientes)
+                           if row is None or self.docs[row].get('text') != d['text']]
+            codificados = None
+            if a_codificar and embeddings is not None:
+                codificados = _normalize_rows(np.asarray(embeddings)[[pendientes[i][2] for i in a_codificar]])
+            elif a_codificar:
+                codificados = _normalize_rows(self.model.encode([pendientes[i][0]['text'] for i in a_codificar],
+                                                                show_progress_bar=False))
+            dim = codificados.shape[1] if codificados is not None else self._buf.shape[1]
+            embs = np.empty((len(pendientes), dim), dtype=np.float32)
+            if codificados is not None:
+                embs[a_codificar] = codificados
+            ya_codificados = set(a_codificar)
+            reusar = [i for i in range(len(pendientes)) if i not in ya_codificados]
+            if reusar:
+                embs[reusar] = self._matrix[[pendientes[i][1] for i in reusar]]
+
+            viejas = [row for _, row, _ in pendientes if row is not None]
+            with self._rw.escritura():
+                self._append_rows([d for d, _, _ in pendientes], embs)
+                self._kill_rows(viejas)
+            self._maybe_compact()
+            return {'insertados': len(pendientes) - len(viejas), 'actualizados': len(viejas),
+                    'sin_cambios': sin_cambios, 'codificados': len(a_codificar)}
+
+    def pending_texts(self, docs: list) -> list:
+        """Posiciones de `docs` cuyo texto habría que codificar en un `upsert` (nuevos o con texto distinto)."""
+        out = []
+        with self._rw.lectura():
+            for pos, d in enumerate(docs):
+                row = self._id_to_row.get(d.get('id')) if d.get('id') is not None else None
+                if row is None or self.docs[row].get('text') != d['text']:
+                    out.append(pos)
+        return out
+
+    def delete(self, ids) -> int:
+        """Marca como borrados los documentos con esos ids. Devuelve cuántos existían."""
+        with self._write_lock:
+            with self._rw.escritura():
+                rows = [self._id_to_row.pop(i) for i in ids if i in self._id_to_row]
+                self._kill_rows(rows)
+            self._maybe_compact()
+            return len(rows)
+
+    def _maybe_compact(self):
+        if self.compact_ratio and len(self._dead_rows) > self.compact_ratio * len(self.docs):
+            self.compact()
+
+    def compact(self) -> int:
+        """Elimina físicamente las filas borradas. Devuelve cuántas se descartaron."""
+        with self._write_lock:
+            keep = np.flatnonzero(self._alive[:len(self.docs)])
+            removed = len(self.docs) - keep.size
+            if removed == 0:
+                return 0
+            matrix = np.ascontiguousarray(self._matrix[keep]) if keep.size else None
+            quantized = None
+            if self._qmatrix is not None and keep.size:
+                quantized = (self._qmatrix[keep], self._qscales[keep] if self._qscales is not None else None)
+            # las copias se arman fuera del lock exclusivo; el reemplazo es un solo paso para los lectores
+            with self._rw.escritura():
+                self._set_state([self.docs[i] for i in keep], matrix, quantized=quantized)
+            # la numeración de filas cambió: el próximo save reescribe el directorio completo
+            self._needs_rewrite = True
+            self._deleted_since_save = set()
+            return removed
+
+    def _index_docs(self, start: int, docs: list):
+        for row, d in enumerate(docs, start):
+            meta = d.get('meta') or {}
+            for field, index in self._indexes.items():
+                index.add(meta.get(field), row)
+
+    def _rebuild_indexes(self):
+        self._indexes = {f: MetadataIndex() for f in self.index_fields}
+        self._index_docs(0, self.docs)
+
+    def _filter_rows(self, where: dict) -> np.ndarray:
+        """Filas que cumplen todas las condiciones de `where` (intersección de índices)."""
+        rows = None
+        for field, cond in where.items():
+            if field not in self._indexes:
+                raise ValueError(f"Campo '{field}' no indexado (index_fields={self.index_fields})")
+            index = self._indexes[field]
+            if isinstance(cond, dict):
+                matched = index.between(cond.get('desde'), cond.get('hasta'))
+            else:
+                matched = index.equals(cond)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            if rows.size == 0:
+                break
+        return rows[self._alive[rows]]
+
+    def _encode(self, texts: list) -> np.ndarray:
+        metrics.EMBEDDING_BATCH.observe(len(texts))
+        with metrics.cronometro(metrics.EMBEDDING_SECONDS, "embedding"):
+            return _normalize_rows(self.model.encode(texts, show_progress_bar=False))
+
+    def _encode_queries(self, texts: list) -> np.ndarray:
+        if self.query_cache is None:
+            return self._encode(texts)
+        keys = [(self.model_name, _normalize_text(t)) for t in texts]
+        cached = [self.query_cache.get(key) for key in keys]
+        # solo se codifican (en un único batch) los textos distintos que no estaban en cache
+        faltantes = list(dict.fromkeys(key for key, emb in zip(keys, cached) if emb is None))
+        if faltantes:
+            nuevos = self._encode([key[1] for key in faltantes])
+            for key, emb in zip(faltantes, nuevos):
+                self.query_cache.put(key, emb)
+            por_key = dict(zip(faltantes, nuevos))
+            cached = [emb if emb is not None else por_key[key] for key, emb in zip(keys, cached)]
+        return np.stack(cached)
+
+    def query_cache_stats(self) -> dict:
+        return self.query_cache.stats() if self.query_cache is not None else {}
+
+    def _scores_buffer(self, n: int) -> np.ndarray:
+        # buffer de puntajes reutilizado por hilo para no alocar n floats en cada consulta
+        buf = getattr(self._local, 'scores', None)
+        if buf is None or buf.shape[0] != n:
+            buf = self._local.scores = np.empty(n, dtype=np.float32)
+        return buf
+
+    def _quantized(self, matrix: np.ndarray):
+        """(códigos, escalas) alineados con `matrix`, o (None, None) sin cuantización."""
+        codes = self._qmatrix
+        if codes is None:
+            return None, None
+        n = matrix.shape[0]
+        scales = self._qscales
+        return codes[:n], scales[:n] if scales is not None else None
+
+    def _ranked(self, q_emb: np.ndarray, sims: np.ndarray, k: int, matrix: np.ndarray,
+                rows: Optional[np.ndarray] = None, aproximado: bool = False):
+        """
+        Resultados del top-k de `sims` (puntajes de `rows`, o de todas las filas). Si los
+        puntajes salen de la matriz cuantizada, los `rerank`·k mejores se re-puntúan con
+        los embeddings float32 y el top-k sale de esos puntajes exactos.
+        """
+        if aproximado and self.rerank:
+            cand = _top_k(sims, k * self.rerank)
+            cand = cand[sims[cand] > -np.inf]
+            exactos = matrix[cand if rows is None else rows[cand]] @ q_emb
+            sims[cand] = exactos
+            idxs = cand[np.argsort(exactos)[::-1][:k]]
         else:
-            self.embeddings = np.vstack([self.embeddings, embs])
-        self.docs.extend(docs)
+            idxs = _top_k(sims, k)
+        if rows is None:
+            return [{'score': float(sims[i]), 'doc': self.docs[i]} for i in idxs if sims[i] > -np.inf]
+        return [{'score': float(sims[i]), 'doc': self.docs[rows[i]]} for i in idxs if sims[i] > -np.inf]
+
+    def _search(self, q_emb: np.ndarray, k: int, rows: Optional[np.ndarray] = None):
+        """Top-k sobre un embedding de consulta ya normalizado, opcionalmente sobre un subconjunto de filas."""
+        matrix = self._matrix
+        codes, scales = self._quantized(matrix)
+        if rows is None:
+            if codes is None:
+                sims = np.matmul(matrix, q_emb, out=self._scores_buffer(matrix.shape[0]))
+            else:
+                sims = puntajes(codes, scales, q_emb)
+            dead = self._dead_rows
+            if dead.size:
+                sims[dead[dead < sims.shape[0]]] = -np.inf
+        elif codes is None:
+            sims = matrix[rows] @ q_emb
+        else:
+            sims = puntajes(codes[rows], scales[rows] if scales is not None else None, q_emb)
+        return self._ranked(q_emb, sims, k, matrix, rows, aproximado=codes is not None)
 
-    def query(self, text: str, k: int = 3):
-        if self.embeddings is None or len(self.docs) == 0:
+    def _search_many(self, q_embs: np.ndarray, k: int, rows: Optional[np.ndarray] = None):
+        matrix = self._matrix
+        codes, scales = self._quantized(matrix)
+        if codes is not None:
+            if rows is not None:
+                codes, scales = codes[rows], scales[rows] if scales is not None else None
+            sims = puntajes(codes, scales, np.ascontiguousarray(q_embs.T)).T
+        else:
+            sims = q_embs @ (matrix if rows is None else matrix[rows]).T
+        if rows is None:
+            dead = self._dead_rows
+            if dead.size:
+                sims[:, dead[dead < sims.shape[1]]] = -np.inf
+        return [self._ranked(q, row, k, matrix, rows, aproximado=codes is not None) for q, row in zip(q_embs, sims)]
+
+    def query(self, text: str, k: int = 3, where: Optional[dict] = None):
+        if self._matrix is None or len(self) == 0:
             return []
-        q_emb = self.model.encode([text], show_progress_bar=False)[0]
-        sims = cosine_similarity([q_emb], self.embeddings)[0]
-        idxs = np.argsort(sims)[::-1][:k]
+        # el encode va fuera del lock: el filtro y la búsqueda se hacen sobre el mismo estado
+        q_emb = self._encode_queries([text])[0]
+        with self._rw.lectura():
+            if self._matrix is None:
+                return []
+            rows = self._filter_rows(where) if where else None
+            if rows is not None and rows.size == 0:
+                return []
+            with metrics.cronometro(metrics.SEARCH_SECONDS, "busqueda", kind="single"):
+                return self._search(q_emb, k, rows)
+
+    def _search_many_filtered(self, q_embs: np.ndarray, k: int, rows_list: list):
+        """
+        Top-k con un filtro distinto por consulta: un solo producto matricial sobre la
+        unión de las filas candidatas y después se enmascara lo que no aplica a cada consulta.
+        """
+        union = np.unique(np.concatenate(rows_list))
+        if union.size == 0:
+            return [[] for _ in rows_list]
+        matrix = self._matrix
+        codes, scales = self._quantized(matrix)
+        if codes is None:
+            sims = q_embs @ matrix[union].T
+        else:
+            sims = puntajes(codes[union], scales[union] if scales is not None else None,
+                            np.ascontiguousarray(q_embs.T)).T
         results = []
-        for i in idxs:
-            results.append({'score': float(sims[i]), 'doc': self.docs[i]})
+        for q, row, rows in zip(q_embs, sims, rows_list):
+            row[~np.isin(union, rows, assume_unique=True)] = -np.inf
+            results.append(self._ranked(q, row, k, matrix, union, aproximado=codes is not None))
         return results
 
+    def query_many(self, texts: list, k: int = 3, where=None):
+        """
+        Igual que `query` para varias consultas: un solo encode y un solo producto matricial.
+        `where` puede ser un filtro común o una lista con un filtro (o None) por consulta.
+        """
+        if self._matrix is None or len(self) == 0:
+            return [[] for _ in texts]
+        if not texts:
+            return []
+        if isinstance(where, (list, tuple)):
+            if len(where) != len(texts):
+                raise ValueError("where debe tener un filtro por consulta")
+            if not any(where):
+                where = None
+        q_embs = self._encode_queries(list(texts))
+        with self._rw.lectura():
+            if self._matrix is None:
+                return [[] for _ in texts]
+            if isinstance(where, (list, tuple)):
+                live = None if all(where) else np.flatnonzero(self._alive[:len(self.docs)])
+                rows_list = [self._filter_rows(w) if w else live for w in where]
+                with metrics.cronometro(metrics.SEARCH_SECONDS, "busqueda", kind="filtered"):
+                    return self._search_many_filtered(q_embs, k, rows_list)
+            rows = self._filter_rows(where) if where else None
+            if rows is not None and rows.size == 0:
+                return [[] for _ in texts]
+            with metrics.cronometro(metrics.SEARCH_SECONDS, "busqueda", kind="many"):
+                return self._search_many(q_embs, k, rows)
+
+    # --- Persistencia ---
+    # Formato en directorio:
+    #   manifest.json   versión, modelo, dimensión y cantidad de filas
+    #   embeddings.npy  matriz float32 normalizada, se abre con mmap (compartida vía page cache)
+    #   embeddings.q.npy / scales.npy  matriz cuantizada (int8 o float16) y escalas por fila (int8),
+    #                   solo si el store usa cuantización; también se abren con mmap
+    #   docs.sqlite     documentos (id, text, meta JSON, lápida) indexados por fila e id
+    # `save` sobre el mismo directorio solo agrega las filas nuevas y marca las lápidas;
+    # una reescritura completa compacta antes de escribir.
+
+    async def aquery(self, text: str, k: int = 3, where: Optional[dict] = None):
+        """`query` ejecutado en el executor acotado de encode (para nodos async)."""
+        loop = asyncio.get_running_loop()
+        # se copia el contexto para que los tiempos lleguen al desglose de la request
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(_executor(), ctx.run, partial(self.query, text, k, where))
+
+    async def aquery_many(self, texts: list, k: int = 3, where=None):
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(_executor(), ctx.run, partial(self.query_many, texts, k, where))
+
     def save(self, path: str):
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        payload = {'docs': self.docs, 'embeddings': self.embeddings}
-        with open(path, 'wb') as f:
-            pickle.dump(payload, f)
+        with self._write_lock:
+            if os.path.isdir(path) and self._storage_path == os.path.abspath(path) and self._can_append(path):
+                self._append_to_dir(path)
+            else:
+                self.compact()
+                self._write_dir(path)
+            self._remap(path)
+            self._storage_path = os.path.abspath(path)
+            self._persisted_rows = len(self.docs)
+            self._deleted_since_save = set()
+            self._needs_rewrite = False
+
+    def _remap(self, path: str):
+        """
+        Tras guardar, la matriz (y la cuantizada) vuelven a ser el mmap de los archivos escritos:
+        la copia al heap que hace la primera escritura sobre un store cargado dura solo hasta el
+        `save` siguiente, y después el proceso comparte de nuevo las páginas con los demás workers.
+        """
+        n = len(self.docs)
+        if not n or self._matrix is None:
+            return
+        matrix = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode='r')
+        codes = scales = None
+        if self._qmatrix is not None:
+            codes = np.load(os.path.join(path, QUANTIZED_FILE), mmap_mode='r')
+            if self._qscales is not None:
+                scales = np.load(os.path.join(path, SCALES_FILE), mmap_mode='r')
+        with self._rw.escritura():
+            self._buf, self._matrix = matrix, matrix[:n]
+            if codes is not None:
+                self._qbuf, self._qmatrix = codes, codes[:n]
+                self._qscales_buf, self._qscales = scales, scales[:n] if scales is not None else None
+
+    def _manifest(self) -> dict:
+        dim = int(self._matrix.shape[1]) if self._matrix is not None else 0
+        return {'version': FORMAT_VERSION, 'model_name': self.model_name, 'dim': dim,
+                'count': len(self.docs), 'dtype': 'float32', 'normalized': True,
+                'quantization': self.quantization}
+
+    @staticmethod
+    def _read_manifest(path: str) -> dict:
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_manifest(self, path: str):
+        tmp = os.path.join(path, MANIFEST_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest(), f, indent=2)
+        os.replace(tmp, os.path.join(path, MANIFEST_FILE))
+
+    @staticmethod
+    def _create_docs_table(conn):
+        conn.execute('CREATE TABLE IF NOT EXISTS docs (row INTEGER PRIMARY KEY, id TEXT, text TEXT NOT NULL, meta TEXT, '
+                     'deleted INTEGER NOT NULL DEFAULT 0)')
+        conn.execute('CREATE INDEX IF NOT EXISTS docs_id ON docs(id)')
+
+    def _doc_rows(self, start: int):
+        for row in range(start, len(self.docs)):
+            d = self.docs[row]
+            yield row, d.get('id'), d['text'], json.dumps(d.get('meta') or {}, ensure_ascii=False), int(not self._alive[row])
+
+    def _write_dir(self, path: str):
+        """Escritura completa en un directorio temporal que luego reemplaza al anterior."""
+        path = os.path.abspath(path)
+        tmp = path + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        matrix = self._matrix if self._matrix is not None else np.empty((0, 0), dtype=np.float32)
+        np.save(os.path.join(tmp, EMBEDDINGS_FILE), np.ascontiguousarray(matrix, dtype=np.float32))
+        if self._qmatrix is not None:
+            np.save(os.path.join(tmp, QUANTIZED_FILE), np.ascontiguousarray(self._qmatrix))
+            if self._qscales is not None:
+                np.save(os.path.join(tmp, SCALES_FILE), np.ascontiguousarray(self._qscales))
+        with sqlite3.connect(os.path.join(tmp, DOCS_FILE)) as conn:
+            self._create_docs_table(conn)
+            conn.executemany('INSERT INTO docs VALUES (?, ?, ?, ?, ?)', self._doc_rows(0))
+        conn.close()
+        self._write_manifest(tmp)
+        old = path + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _can_append(self, path: str) -> bool:
+        try:
+            manifest = self._read_manifest(path)
+        except (OSError, ValueError):
+            return False
+        return (not self._needs_rewrite and manifest.get('version') == FORMAT_VERSION
+                and manifest.get('count') == self._persisted_rows
+                and self._matrix is not None and manifest.get('dim') == self._matrix.shape[1]
+                and manifest.get('quantization', 'float32') == self.quantization
+                and len(self.docs) >= self._persisted_rows)
+
+    def _append_to_dir(self, path: str):
+        """Agrega a los .npy y al SQLite solo las filas posteriores a las ya persistidas y marca las lápidas."""
+        start = self._persisted_rows
+        arrays = [(EMBEDDINGS_FILE, self._matrix)]
+        if self._qmatrix is not None:
+            arrays.append((QUANTIZED_FILE, self._qmatrix))
+            if self._qscales is not None:
+                arrays.append((SCALES_FILE, self._qscales))
+        for name, arr in arrays:
+            if not _append_npy(os.path.join(path, name), arr, start):
+                # el header no tiene espacio para crecer en el lugar: reescritura completa
+                self._write_dir(path)
+                return
+        with sqlite3.connect(os.path.join(path, DOCS_FILE)) as conn:
+            conn.execute('DELETE FROM docs WHERE row >= ?', (start,))
+            conn.executemany('INSERT INTO docs VALUES (?, ?, ?, ?, ?)', self._doc_rows(start))
+            conn.executemany('UPDATE docs SET deleted = 1 WHERE row = ?', [(r,) for r in sorted(self._deleted_since_save)])
+        conn.close()
+        self._write_manifest(path)
 
     def load(self, path: str):
+        if os.path.isfile(path):
+            return self._load_pickle(path)
+        manifest = self._read_manifest(path)
+        version = manifest.get('version')
+        if version not in (1, FORMAT_VERSION):
+            raise ValueError(f"Versión de vectorstore no soportada: {version}")
+        if manifest.get('model_name') != self.model_name:
+            raise ValueError(f"El vectorstore fue creado con {manifest.get('model_name')}, no con {self.model_name}")
+        # un encoder remoto (servicio de embeddings) comprueba que sirve el mismo modelo y dimensión
+        verificar = getattr(self._model, 'verificar', None)
+        if verificar is not None:
+            verificar(self.model_name, manifest.get('dim') or None)
+        count = manifest['count']
+        matrix = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode='r')
+        quantized = None
+        if count and self.quantization != 'float32' and manifest.get('quantization') == self.quantization:
+            codes = np.load(os.path.join(path, QUANTIZED_FILE), mmap_mode='r')[:count]
+            scales = np.load(os.path.join(path, SCALES_FILE), mmap_mode='r')[:count] if self.quantization == 'int8' else None
+            quantized = (codes, scales)
+        # la versión 1 no tenía columna de lápidas
+        deleted_col = 'deleted' if version >= 2 else '0'
+        with sqlite3.connect(f"file:{os.path.join(path, DOCS_FILE)}?mode=ro", uri=True) as conn:
+            cur = conn.execute(f'SELECT id, text, meta, {deleted_col} FROM docs WHERE row < ? ORDER BY row', (count,))
+            rows = cur.fetchall()
+        conn.close()
+        docs = [{'id': id_, 'text': text, 'meta': json.loads(meta) if meta else {}} for id_, text, meta, _ in rows]
+        alive_disk = np.array([not deleted for *_, deleted in rows], dtype=bool)
+        with self._write_lock:
+            with self._rw.escritura():
+                self._set_state(docs, matrix[:count] if count else None, alive_disk, quantized)
+            self._storage_path = os.path.abspath(path)
+            self._persisted_rows = count
+            # ids duplicados de versiones anteriores quedan como lápidas a persistir
+            self._deleted_since_save = set(np.flatnonzero(alive_disk & ~self._alive).tolist())
+            self._needs_rewrite = version != FORMAT_VERSION
+
+    def refresh(self, path: str) -> bool:
+        """
+        Vuelve a cargar `path` si otro proceso lo guardó con otra cantidad de filas (`count`
+        del manifest). Es para los workers que solo leen el store que escribe el recolector
+        líder: la recarga abre de nuevo los .npy con mmap, así la matriz sigue compartida.
+        Devuelve True si recargó.
+        """
+        try:
+            count = self._read_manifest(path).get('count')
+        except (OSError, ValueError):
+            return False
+        if self._storage_path == os.path.abspath(path) and count == self._persisted_rows:
+            return False
+        self.load(path)
+        return True
+
+    def _load_pickle(self, path: str):
+        """Formato anterior (un único pickle con docs y embeddings). Ver scripts/migrate_vectorstore.py."""
         with open(path, 'rb') as f:
             payload = pickle.load(f)
-        self.docs = payload['docs']
-        self.embeddings = payload['embeddings']
+        embs = payload['embeddings']
+        with self._write_lock:
+            with self._rw.escritura():
+                self._set_state(payload['docs'], _normalize_rows(embs) if embs is not None else None)
+            self._storage_path = None
+            self._persisted_rows = 0
+            self._deleted_since_save = set()
+            self._needs_rewrite = False
@@ -0,0 +1,218 @@
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+# Segundos que puede tardar una respuesta de /ask de punta a punta (0 = sin límite).
+# Debe ser mayor que cada timeout por llamada (CHACO_TIMEOUT, CHACO_PDF_TIMEOUT, LLM_TIMEOUT):
+# así un upstream colgado agota su propio timeout dentro de la request y cuenta como fallo.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "10"))
+# Por debajo de esto no vale la pena empezar una llamada a upstream: se responde con lo que haya
+DEADLINE_MINIMO = float(os.getenv("DEADLINE_MINIMO", "0.05"))
+# Fallos consecutivos que abren un circuito y segundos que queda abierto antes de probar de nuevo
+BREAKER_FALLOS = int(os.getenv("BREAKER_FALLOS", "3"))
+BREAKER_ENFRIAMIENTO = float(os.getenv("BREAKER_ENFRIAMIENTO", "30"))
+
+CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+_CODIGO_ESTADO = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Se agotó el presupuesto de tiempo de la request antes de llamar al upstream."""
+
+
+class CircuitOpen(RuntimeError):
+    """El circuito del upstream está abierto: la llamada se rechaza sin salir a la red."""
+
+
+# --- Presupuesto de tiempo por request ---
+# Instante (time.monotonic) en que vence la request en curso; None = sin límite.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+def nuevo_deadline(segundos: float = REQUEST_DEADLINE) -> Optional[float]:
+    return time.monotonic() + segundos if segundos and segundos > 0 else None
+
+
+@contextmanager
+def con_deadline(deadline: Optional[float]):
+    """Durante el bloque, `restante` y `timeout_para` descuentan del `deadline` dado."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def sin_deadline():
+    """Para trabajo compartido entre requests (refrescos single-flight): usa sus timeouts completos."""
+    return con_deadline(None)
+
+
+def restante(maximo: float) -> float:
+    """Lo que queda del presupuesto, acotado a `maximo` (nunca negativo)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return maximo
+    return max(0.0, min(maximo, deadline - time.monotonic()))
+
+
+def timeout_para(maximo: float) -> float:
+    """Timeout para una llamada a upstream; `DeadlineExceeded` si ya no queda tiempo útil."""
+    timeout = restante(maximo)
+    if timeout < DEADLINE_MINIMO:
+        raise DeadlineExceeded("se agotó el tiempo de la request")
+    return timeout
+
+
+def vencido() -> bool:
+    return restante(DEADLINE_MINIMO) < DEADLINE_MINIMO
+
+
+def en_presupuesto(func: Callable) -> Callable:
+    """
+    Envuelve un nodo del grafo: mientras corre, el presupuesto es el `deadline` del estado.
+    Conserva la firma (LangGraph le pasa `config` si la pide).
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def asincrono(state, *args, **kwargs):
+            with con_deadline(state.get("deadline")):
+                return await func(state, *args, **kwargs)
+        return asincrono
+
+    @functools.wraps(func)
+    def sync(state, *args, **kwargs):
+        with con_deadline(state.get("deadline")):
+            return func(state, *args, **kwargs)
+    return sync
+
+
+# --- Circuit breaker ---
+class CircuitBreaker:
+    """
+    Circuito por upstream:
+
+    - cerrado: las llamadas pasan; `fallos` errores seguidos lo abren.
+    - abierto: se rechaza sin llamar durante `enfriamiento` segundos.
+    - semiabierto: pasa una sola llamada de prueba; si sale bien se cierra,
+      si falla vuelve a abrirse por otro `enfriamiento`.
+
+    El llamador informa el resultado con `exito`, `fallo` o `neutro` (la llamada no dice
+    nada del upstream: se canceló o la cortó el presupuesto de la request).
+    """
+
+    def __init__(self, nombre: str, fallos: int = BREAKER_FALLOS, enfriamiento: float = BREAKER_ENFRIAMIENTO):
+        self.nombre = nombre
+        self.fallos = max(1, fallos)
+        self.enfriamiento = enfriamiento
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._consecutivos = 0
+        self._abierto_en = 0.0
+        self._probando = False
+        self._stats = {"exitos": 0, "fallos": 0, "rechazadas": 0, "aperturas": 0}
+
+    def _pasar_a(self, estado: str):
+        self._estado = estado
+        metrics.CIRCUIT_TRANSITIONS.inc(upstream=self.nombre, estado=estado)
+        if estado == ABIERTO:
+            self._abierto_en = time.monotonic()
+            self._stats["aperturas"] += 1
+            log.warning("circuito %s abierto tras %d fallos; se vuelve a probar en %.0fs",
+                        self.nombre, self._consecutivos, self.enfriamiento)
+        elif estado == CERRADO:
+            log.info("circuito %s cerrado: el upstream respondió", self.nombre)
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._estado == ABIERTO and time.monotonic() - self._abierto_en >= self.enfriamiento:
+                return SEMIABIERTO
+            return self._estado
+
+    def permitir(self) -> bool:
+        """True si la llamada puede salir; en semiabierto solo la primera (la de prueba)."""
+        with self._lock:
+            if self._estado == ABIERTO and time.monotonic() - self._abierto_en >= self.enfriamiento:
+                self._pasar_a(SEMIABIERTO)
+            if self._estado == CERRADO or (self._estado == SEMIABIERTO and not self._probando):
+                self._probando = self._estado == SEMIABIERTO
+                return True
+            self._stats["rechazadas"] += 1
+        metrics.CIRCUIT_REJECTED.inc(upstream=self.nombre)
+        return False
+
+    def rechaza(self) -> bool:
+        """Consulta sin tomar el turno de prueba: True (y cuenta el rechazo) si está abierto y sin vencer."""
+        with self._lock:
+            abierto = self._estado == ABIERTO and time.monotonic() - self._abierto_en < self.enfriamiento
+            if abierto:
+                self._stats["rechazadas"] += 1
+        if abierto:
+            metrics.CIRCUIT_REJECTED.inc(upstream=self.nombre)
+        return abierto
+
+    def exito(self):
+        with self._lock:
+            self._stats["exitos"] += 1
+            self._consecutivos = 0
+            self._probando = False
+            if self._estado != CERRADO:
+                self._pasar_a(CERRADO)
+
+    def fallo(self):
+        with self._lock:
+            self._stats["fallos"] += 1
+            self._consecutivos += 1
+            self._probando = False
+            if self._estado == SEMIABIERTO or (self._estado == CERRADO and self._consecutivos >= self.fallos):
+                self._pasar_a(ABIERTO)
+
+    def neutro(self):
+        with self._lock:
+            self._probando = False
+
+    def verificar(self):
+        """`CircuitOpen` si la llamada no puede salir."""
+        if not self.permitir():
+            raise CircuitOpen(f"{self.nombre} no responde (circuito abierto)")
+
+    def stats(self) -> Dict:
+        estado = self.estado
+        with self._lock:
+            abierto = time.monotonic() - self._abierto_en if estado != CERRADO else None
+            return {**self._stats, "estado": estado, "fallos_consecutivos": self._consecutivos,
+                    "abierto_hace_segundos": abierto}
+
+
+_circuitos: Dict[str, CircuitBreaker] = {}
+_circuitos_lock = threading.Lock()
+
+
+def circuito(nombre: str) -> CircuitBreaker:
+    """Circuito compartido por el proceso para el upstream `nombre` (se crea en el primer uso)."""
+    c = _circuitos.get(nombre)
+    if c is None:
+        with _circuitos_lock:
+            c = _circuitos.setdefault(nombre, CircuitBreaker(nombre))
+    return c
+
+
+def circuitos_stats() -> Dict[str, Dict]:
+    return {nombre: c.stats() for nombre, c in list(_circuitos.items())}
+
+
+@metrics.REGISTRY.colector
+def _metricas_de_circuitos():
+    return [("circuit_breaker_state", "gauge", "Estado del circuito por upstream (0 cerrado, 1 semiabierto, 2 abierto)",
+             [({"upstream": n}, _CODIGO_ESTADO[c.estado]) for n, c in list(_circuitos.items())])]
@@ -0,0 +1,206 @@
+import datetime as dt
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from ..intent import MONEDA_BASE, moneda_iso
+from ..rag.timeseries import FUENTE_BCP, RateHistoryStore
+from .cotizaciones_tool import aget_cotizaciones_chaco, frescura_chaco, get_cotizaciones_chaco
+
+# Días hacia atrás que se aceptan para una fecha sin publicación del BCP (fines de semana, feriados)
+_MAX_DIAS_SIN_DATO = 7
+_MATRICES_HISTORICAS = 64
+
+
+class MatrizCruzada:
+    """
+    Tipos cruzados de un snapshot: vectores compra/venta en guaraníes (PYG = 1)
+    y las matrices N×N derivadas en un solo paso vectorizado.
+
+    - `directa[a, b]`: unidades de `b` que se reciben por 1 de `a` operando con la
+      casa de cambios (se vende `a` al precio de compra y se compra `b` al de venta).
+    - `media[a, b]`: tipo medio, sin spread.
+    """
+
+    def __init__(self, isos: List[str], compra: np.ndarray, venta: np.ndarray, fuente: str, fecha: str):
+        self.isos = isos
+        self.indice = {iso: i for i, iso in enumerate(isos)}
+        self.compra, self.venta = compra, venta
+        self.fuente, self.fecha = fuente, fecha
+        medio = (compra + venta) / 2.0
+        self.directa = np.outer(compra, 1.0 / venta)
+        self.media = np.outer(medio, 1.0 / medio)
+
+    def __contains__(self, iso: str) -> bool:
+        return iso in self.indice
+
+    def convertir(self, monto: float, origen: str, destino: str) -> Dict[str, Any]:
+        a, b = self.indice[origen], self.indice[destino]
+        tasa, media = float(self.directa[a, b]), float(self.media[a, b])
+        return {
+            "monto": monto,
+            "origen": origen,
+            "destino": destino,
+            "resultado": monto * tasa,
+            "tasa": tasa,
+            "tasa_media": media,
+            "spread_pct": (1.0 - tasa / media) * 100.0 if media else 0.0,
+            "fuente": self.fuente,
+            "fecha": self.fecha,
+        }
+
+
+def _matriz_chaco(filas: List[Dict[str, Any]]) -> MatrizCruzada:
+    validas = [f for f in filas if (f.get("compra") or 0) > 0 and (f.get("venta") or 0) > 0
+               and f["moneda"] != MONEDA_BASE]
+    isos = [MONEDA_BASE] + [f["moneda"] for f in validas]
+    compra = np.array([1.0] + [f["compra"] for f in validas], dtype=np.float64)
+    venta = np.array([1.0] + [f["venta"] for f in validas], dtype=np.float64)
+    # fecha y fuente del snapshot (día en que se descargó, API o PDF), no las de la consulta
+    metas = [f.get("meta") or {} for f in validas]
+    fecha = max((m["fecha"] for m in metas if m.get("fecha")), default=dt.date.today().isoformat())
+    fuente = next((m["fuente"] for m in metas if m.get("fuente")), "Cambios Chaco")
+    return MatrizCruzada(isos, compra, venta, fuente, fecha)
+
+
+class ConversionEngine:
+    """
+    Conversión entre cualquier par de monedas a partir de cotizaciones contra el guaraní.
+
+    Hoy usa el snapshot de Cambios Chaco (con spread de compra/venta); la matriz se
+    recalcula solo cuando cambia el snapshot y lleva su fecha. Si ese snapshot es el
+    último bueno porque el upstream no responde, el resultado trae `desactualizado`
+    y `edad_segundos` como las demás respuestas con datos de hoy. Para fechas pasadas usa la serie de `historial`
+    (valores de referencia del BCP o, en fechas sin dato del BCP, el promedio de compra y venta
+    que guardó el recolector; sin spread), con un cache LRU de matrices por fecha.
+    """
+
+    def __init__(self, historial: Optional[RateHistoryStore] = None):
+        self.historial = historial
+        self._lock = threading.Lock()
+        self._filas_chaco = None
+        self._chaco: Optional[MatrizCruzada] = None
+        self._historicas: "OrderedDict[tuple, MatrizCruzada]" = OrderedDict()
+        self._stats = {"matrices_chaco": 0, "matrices_historicas": 0, "conversiones": 0}
+
+    # --- Matrices ---
+    def _de_snapshot(self, filas: List[Dict[str, Any]]) -> MatrizCruzada:
+        with self._lock:
+            # el cache de Cambios Chaco devuelve el mismo objeto mientras no haya snapshot nuevo
+            if filas is not self._filas_chaco:
+                self._chaco = _matriz_chaco(filas)
+                self._filas_chaco = filas
+                self._stats["matrices_chaco"] += 1
+            return self._chaco
+
+    def matriz_historica(self, fecha: dt.date) -> Optional[MatrizCruzada]:
+        """
+        Valores de la serie en `fecha` o hasta `_MAX_DIAS_SIN_DATO` días antes; la matriz
+        lleva como fuente las de los puntos usados.
+        """
+        if self.historial is None:
+            return None
+        monedas = self.historial.monedas()
+        clave = (fecha, tuple((m, self.historial.version(m)) for m in monedas))
+        with self._lock:
+            matriz = self._historicas.get(clave)
+            if matriz is not None:
+                self._historicas.move_to_end(clave)
+                return matriz
+        isos, valores, fuentes = [MONEDA_BASE], [1.0], set()
+        limite = np.datetime64(fecha, "D")
+        for m in monedas:
+            if m == MONEDA_BASE:
+                continue
+            fechas, vals, origen = self.historial.serie_con_fuentes(m)
+            i = int(np.searchsorted(fechas, limite, side="right")) - 1
+            if i >= 0 and (limite - fechas[i]).astype(int) <= _MAX_DIAS_SIN_DATO:
+                isos.append(m)
+                valores.append(float(vals[i]))
+                fuentes.add(origen[i])
+        if len(isos) == 1:
+            return None
+        vector = np.array(valores, dtype=np.float64)
+        # el BCP primero; los puntos del recolector son promedios de compra y venta
+        fuente = " y ".join(sorted(fuentes, key=lambda f: (f != FUENTE_BCP, f)))
+        if fuentes != {FUENTE_BCP}:
+            fuente += " (promedio de compra y venta)"
+        matriz = MatrizCruzada(isos, vector, vector, fuente, fecha.isoformat())
+        with self._lock:
+            self._historicas[clave] = matriz
+            self._stats["matrices_historicas"] += 1
+            while len(self._historicas) > _MATRICES_HISTORICAS:
+                self._historicas.popitem(last=False)
+        return matriz
+
+    # --- Conversión ---
+    @staticmethod
+    def _argumentos(origen: str, destino: str, fecha) -> Tuple[str, str, Optional[dt.date]]:
+        if isinstance(fecha, str) and fecha:
+            try:
+                fecha = dt.date.fromisoformat(fecha)
+            except ValueError:
+                raise ValueError(f"Fecha inválida: {fecha} (usar YYYY-MM-DD)")
+        if fecha and fecha > dt.date.today():
+            raise ValueError(f"No hay cotizaciones futuras: {fecha.isoformat()} es posterior a hoy")
+        if not fecha or fecha == dt.date.today():
+            fecha = None
+        return moneda_iso(origen), moneda_iso(destino), fecha
+
+    def _resolver(self, matriz: Optional[MatrizCruzada], monto: float, origen: str, destino: str,
+                  fecha: Optional[dt.date], frescura: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        chaco = matriz
+        # hoy: si Cambios Chaco no opera alguna de las dos monedas, se usa el último dato de la serie
+        if fecha is None and (matriz is None or origen not in matriz or destino not in matriz):
+            matriz = self.matriz_historica(dt.date.today())
+        elif fecha is not None:
+            matriz = self.matriz_historica(fecha)
+        if matriz is None:
+            raise ValueError("No hay cotizaciones disponibles para convertir"
+                             + (f" al {fecha.isoformat()}" if fecha else ""))
+        for iso in (origen, destino):
+            if iso not in matriz:
+                raise ValueError(f"No hay cotización de {iso} ({matriz.fuente}, {matriz.fecha})")
+        with self._lock:
+            self._stats["conversiones"] += 1
+        resultado = matriz.convertir(float(monto), origen, destino)
+        if matriz is chaco and frescura:
+            resultado.update(frescura)
+        return resultado
+
+    def convertir(self, monto: float, origen: str, destino: str = MONEDA_BASE, fecha=None) -> Dict[str, Any]:
+        origen, destino, fecha = self._argumentos(origen, destino, fecha)
+        if fecha is not None:
+            return self._resolver(None, monto, origen, destino, fecha)
+        matriz = self._de_snapshot(get_cotizaciones_chaco())
+        return self._resolver(matriz, monto, origen, destino, fecha, frescura_chaco())
+
+    async def aconvertir(self, monto: float, origen: str, destino: str = MONEDA_BASE, fecha=None) -> Dict[str, Any]:
+        origen, destino, fecha = self._argumentos(origen, destino, fecha)
+        if fecha is not None:
+            return self._resolver(None, monto, origen, destino, fecha)
+        matriz = self._de_snapshot(await aget_cotizaciones_chaco())
+        return self._resolver(matriz, monto, origen, destino, fecha, frescura_chaco())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, historicas_en_cache=len(self._historicas))
+
+
+# Modelo de entrada para la herramienta MCP
+class ConversionInput(BaseModel):
+    monto: float = 1.0
+    origen: str
+    destino: str = MONEDA_BASE
+    fecha: Optional[str] = None
+
+
+def texto_conversion(r: Dict[str, Any]) -> str:
+    texto = (f"{r['monto']:.2f} {r['origen']} = {r['resultado']:.2f} {r['destino']} "
+             f"(tipo {r['tasa']:.6g}, fuente {r['fuente']}, {r['fecha']})")
+    if r["spread_pct"] > 0.0005:
+        texto += f"\nTipo medio {r['tasa_media']:.6g}; spread de compra/venta {r['spread_pct']:.2f} %."
+    return texto
@@ -1,52 +1,40 @@
 import requests
-from bs4 import BeautifulSoup
-import pdfplumber
+import asyncio
+import hashlib
 import io
-import base64
-import pandas as pd
+import logging
+import os
+import re
+import sys
+import threading
+import time
 import datetime as dt
-from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Callable
 
-URL_BASE = "https://www.cambioschaco.com.py/api/branch_office/1/exchange"
+from .. import metrics
+from ..intent import ISO_CONOCIDOS, buscar_monedas, moneda_iso
+from ..resilience import CircuitOpen, DeadlineExceeded, circuito, restante, sin_deadline, timeout_para, vencido
+
+log = logging.getLogger(__name__)
+
+# Configurables para apuntar a un doble local (benchmarks, pruebas de carga)
+URL_BASE = os.getenv("CHACO_API_URL", "https://www.cambioschaco.com.py/api/branch_office/1/exchange")
 HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; cotizaciones-agent/1.0)"}
-URL_PDF = URL_BASE + "/pdf"
-
-def _normalize_moneda(moneda: str) -> str:
-    m = moneda.strip().lower()
-    mapping = {
-        'USD': ['dólar', 'dolar', 'usd', 'dollar', 'dólar usa', 'dolar usa'],
-        'JPY': ['yen', 'jpy', 'yen japonés', 'yen japones'],
-        'GBP': ['libra', 'gbp', 'libra esterlina'],
-        'CHF': ['franco suizo', 'chf'],
-        'SEK': ['corona sueca', 'sek'],
-        'DKK': ['corona danesa', 'dkk'],
-        'NOK': ['corona noruega', 'nok'],
-        'BRL': ['real', 'brl', 'real brasileño'],
-        'ARS': ['peso argentino', 'ars'],
-        'CAD': ['dólar canadiense', 'cad'],
-        'ZAR': ['rand', 'zar'],
-        'XDR': ['derechos especiales de giro', 'deg', 'xdr'],
-        'XAU': ['onza de oro', 'oro', 'xau'],
-        'CLP': ['peso chileno', 'clp'],
-        'EUR': ['euro', 'eur'],
-        'UYU': ['peso uruguayo', 'uyu'],
-        'AUD': ['dólar australiano', 'aud'],
-        'CNY': ['yuan', 'renminbi', 'cny', 'yuan chino'],
-        'SGD': ['dólar de singapur', 'sgd'],
-        'BOB': ['boliviano', 'bob'],
-        'PEN': ['sol peruano', 'pen'],
-        'NZD': ['dólar neozelandés', 'nzd'],
-        'MXN': ['peso mexicano', 'mxn'],
-        'COP': ['peso colombiano', 'cop'],
-        'TWD': ['dólar taiwanés', 'twd'],
-        'AED': ['dirham', 'emiratos', 'aed'],
-        'PYG': ['guaraní', 'guarani', 'gs', 'pyg']
-    }
-    
-    for iso, aliases in mapping.items():
-        if m in aliases or any(alias in m for alias in aliases):
-            return iso
-    return m.upper()  # Si no se reconoce, devolver en mayúsculas por si ya es ISO
+URL_PDF = os.getenv("CHACO_PDF_URL", URL_BASE + "/pdf")
+
+# Segundos que un snapshot de Cambios Chaco se considera fresco, y ventana extra
+# durante la cual se sirve el snapshot vencido mientras se refresca en segundo plano.
+CHACO_CACHE_TTL = float(os.getenv("CHACO_CACHE_TTL", "60"))
+CHACO_CACHE_STALE = float(os.getenv("CHACO_CACHE_STALE", "300"))
+# Segundos sin revalidar el PDF de respaldo (después se usa un GET condicional)
+CHACO_PDF_TTL = float(os.getenv("CHACO_PDF_TTL", "300"))
+# Timeouts de cada request a upstream (se acortan a lo que le quede a la request en curso)
+CHACO_TIMEOUT = float(os.getenv("CHACO_TIMEOUT", "4"))
+CHACO_PDF_TIMEOUT = float(os.getenv("CHACO_PDF_TIMEOUT", "5"))
+# Edad a partir de la cual una cotización servida se marca como desactualizada
+# (último snapshot bueno mientras el upstream no responde)
+CHACO_MAX_EDAD = float(os.getenv("CHACO_MAX_EDAD", str(CHACO_CACHE_TTL + CHACO_CACHE_STALE)))
 
 def _safe_get_number(x) -> Optional[float]:
     try:
@@ -54,21 +42,85 @@ def _safe_get_number(x) -> Optional[float]:
     except (TypeError, ValueError):
         return None
 
-def get_cotizaciones_chaco() -> List[Dict[str, Any]]:
+
+@contextmanager
+def _upstream(nombre: str, timeout: float):
+    """
+    Mide una request a upstream; el bloque usa `r["timeout"]` y anota el código en `r["status"]`
+    (si no, queda "error"). El timeout se acorta a lo que le queda a la request (`DeadlineExceeded`
+    si ya no queda) y el circuito de `nombre` rechaza la llamada si el upstream viene fallando.
+    """
+    try:
+        r = {"status": "error", "timeout": timeout_para(timeout)}
+    except DeadlineExceeded:
+        metrics.DEADLINE_EXCEEDED.inc(etapa=nombre)
+        raise
+    c = circuito(nombre)
+    c.verificar()
+    try:
+        with metrics.cronometro(metrics.UPSTREAM_SECONDS, f"upstream.{nombre}", upstream=nombre):
+            yield r
+    except BaseException as e:
+        r["error"] = e
+        if not isinstance(e, Exception):
+            r["status"] = "cancelado"
+        raise
+    finally:
+        metrics.UPSTREAM_RESPONSES.inc(upstream=nombre, status=r["status"])
+        _informar(c, r, timeout)
+
+
+def _es_timeout(e: Optional[BaseException]) -> bool:
+    if isinstance(e, (requests.Timeout, TimeoutError)):
+        return True
+    httpx = sys.modules.get("httpx")   # solo si ya lo importó el cliente async
+    return httpx is not None and isinstance(e, httpx.TimeoutException)
+
+
+def _informar(c, r: Dict[str, Any], timeout: float):
+    """
+    Resultado de la request para el circuito. Solo es neutro lo que no dice nada del upstream:
+    una cancelación, o un timeout que venció porque la request se quedó sin presupuesto
+    (timeout acortado y sin tiempo restante). Los 5xx, 429 y demás errores de red son fallos.
+    """
+    status = r["status"]
+    if status.isdigit() and int(status) < 500 and status != "429":
+        c.exito()
+    elif status == "cancelado" or (_es_timeout(r.get("error")) and r["timeout"] < timeout and vencido()):
+        c.neutro()
+    else:
+        c.fallo()
+
+
+def _error_esperado(e: Exception) -> bool:
+    """Circuito abierto o request sin tiempo: no se llamó al upstream, no hace falta loguearlo."""
+    return isinstance(e, (CircuitOpen, DeadlineExceeded))
+
+
+def _fetch_cotizaciones_chaco() -> List[Dict[str, Any]]:
     """
     Llama a la API y devuelve una lista de dicts normalizados:
     [{'moneda': 'USD', 'compra': 7150.0, 'venta': 7270.0, 'meta': {...}}, ...]
     Maneja estructuras que vienen como {"items": [...]} o como lista directa.
+    Propaga las excepciones de red/JSON: el cache decide si sirve un snapshot anterior.
     """
-    try:
-        resp = requests.get(URL_BASE, timeout=8, headers=HEADERS)
-        resp.raise_for_status()
-        data = resp.json()
-    except Exception as e:
-        # en caso de error devolvemos lista vacía (el caller decide qué hacer)
-        print(f"[get_cotizaciones_chaco] error al obtener datos: {e}")
-        return []
+    with _upstream("chaco_json", CHACO_TIMEOUT) as r:
+        resp = requests.get(URL_BASE, timeout=r["timeout"], headers=HEADERS)
+        r["status"] = str(resp.status_code)
+    resp.raise_for_status()
+    return _parse_chaco_payload(resp.json())
+
+
+async def _afetch_cotizaciones_chaco() -> List[Dict[str, Any]]:
+    """Versión async de `_fetch_cotizaciones_chaco` (cliente httpx compartido)."""
+    with _upstream("chaco_json", CHACO_TIMEOUT) as r:
+        resp = await _async_client().get(URL_BASE, timeout=r["timeout"], headers=HEADERS)
+        r["status"] = str(resp.status_code)
+    resp.raise_for_status()
+    return _parse_chaco_payload(resp.json())
+
 
+def _parse_chaco_payload(data) -> List[Dict[str, Any]]:
     rows: List[Dict[str, Any]] = []
 
     # Normalizar a una lista de elementos para iterar
@@ -142,6 +194,258 @@ def get_cotizaciones_chaco() -> List[Dict[str, Any]]:
 
     return rows
 
+class SnapshotCache:
+    """
+    Cache de proceso para el snapshot completo de Cambios Chaco.
+
+    - Dentro de `ttl` segundos se sirve el snapshot en memoria (hit).
+    - Entre `ttl` y `ttl + stale_ttl` se sirve el snapshot vencido y se lanza
+      un único refresco en segundo plano (stale-while-revalidate).
+    - Si no hay snapshot utilizable, las llamadas concurrentes comparten una sola
+      consulta al upstream (single-flight). Si esa consulta falla se sigue sirviendo el
+      último snapshot bueno, sin importar su edad (ver `edad` y `CHACO_MAX_EDAD`).
+    Las esperas se acotan al tiempo que le queda a la request (`src/resilience.py`).
+    Las búsquedas por moneda son acceso directo a un dict indexado por ISO.
+
+    Con `externo` (lo activa el recolector de `src/collector.py`) nunca se consulta el
+    upstream: se sirve lo último que se publicó con `publicar`, sea cual sea su edad.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], ttl: float = CHACO_CACHE_TTL,
+                 stale_ttl: float = CHACO_CACHE_STALE, wait_timeout: float = 10.0,
+                 aloader: Optional[Callable[[], Any]] = None):
+        self._loader = loader
+        self._aloader = aloader
+        self._atask: Optional[asyncio.Task] = None
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._inflight: Optional[threading.Event] = None
+        self._rows: Optional[List[Dict[str, Any]]] = None
+        self._by_iso: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = 0.0
+        self.externo = False
+        self._stats = {"hits": 0, "misses": 0, "stale_hits": 0, "refreshes": 0, "errors": 0}
+
+    def _store(self, rows: List[Dict[str, Any]], edad: float = 0.0):
+        with self._lock:
+            self._stats["refreshes"] += 1
+            # una respuesta vacía no pisa un snapshot válido anterior
+            if rows or self._rows is None:
+                self._rows = rows
+                self._by_iso = {r["moneda"]: r for r in rows}
+                self._fetched_at = time.monotonic() - edad
+
+    def publicar(self, rows: List[Dict[str, Any]], edad: float = 0.0):
+        """Reemplaza el snapshot por uno obtenido afuera (`edad`: segundos desde que se descargó)."""
+        self._store(rows, edad)
+
+    def _local(self):
+        """Modo `externo`: el snapshot publicado, sin tocar el upstream (se llama con el lock tomado)."""
+        if self._rows is None:
+            self._stats["misses"] += 1
+        elif time.monotonic() - self._fetched_at < self.ttl:
+            self._stats["hits"] += 1
+        else:
+            self._stats["stale_hits"] += 1
+        return self._snapshot()
+
+    def _record_error(self, e: Exception):
+        if not _error_esperado(e):
+            log.warning("error al obtener el snapshot de Cambios Chaco: %s", e)
+        with self._lock:
+            self._stats["errors"] += 1
+
+    def _refresh(self, event: threading.Event):
+        try:
+            self._store(self._loader())
+        except Exception as e:
+            self._record_error(e)
+        finally:
+            with self._lock:
+                if self._inflight is event:
+                    self._inflight = None
+            event.set()
+
+    def _snapshot(self):
+        rows = self._rows if self._rows is not None else []
+        return rows, self._by_iso
+
+    def get(self):
+        """Devuelve (rows, by_iso) respetando TTL, stale-while-revalidate y single-flight."""
+        with self._lock:
+            if self.externo:
+                return self._local()
+            age = time.monotonic() - self._fetched_at
+            if self._rows is not None and age < self.ttl:
+                self._stats["hits"] += 1
+                return self._snapshot()
+            if self._rows is not None and age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                if self._inflight is None:
+                    self._inflight = threading.Event()
+                    threading.Thread(target=self._refresh, args=(self._inflight,), daemon=True).start()
+                return self._snapshot()
+            self._stats["misses"] += 1
+            event = self._inflight
+            leader = event is None
+            if leader:
+                event = self._inflight = threading.Event()
+        if leader:
+            self._refresh(event)
+        else:
+            event.wait(restante(self.wait_timeout))
+        with self._lock:
+            return self._snapshot()
+
+    def lookup(self, moneda_iso: str) -> Optional[Dict[str, Any]]:
+        _, by_iso = self.get()
+        return by_iso.get(moneda_iso)
+
+    # --- Variante async (mismo snapshot y contadores, single-flight con una tarea compartida) ---
+    async def _arefresh(self):
+        try:
+            # la tarea es compartida: no la acota el presupuesto de la request que la creó
+            with sin_deadline():
+                self._store(await self._aloader())
+        except Exception as e:
+            self._record_error(e)
+
+    def _refresh_task(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        task = self._atask
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = self._atask = loop.create_task(self._arefresh())
+        return task
+
+    async def aget(self):
+        if self._aloader is None:
+            return await asyncio.to_thread(self.get)
+        with self._lock:
+            if self.externo:
+                return self._local()
+            age = time.monotonic() - self._fetched_at
+            if self._rows is not None and age < self.ttl:
+                self._stats["hits"] += 1
+                return self._snapshot()
+            if self._rows is not None and age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                self._refresh_task()
+                return self._snapshot()
+            self._stats["misses"] += 1
+            task = self._refresh_task()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), restante(self.wait_timeout))
+        except asyncio.TimeoutError:
+            pass
+        with self._lock:
+            return self._snapshot()
+
+    async def alookup(self, moneda_iso: str) -> Optional[Dict[str, Any]]:
+        _, by_iso = await self.aget()
+        return by_iso.get(moneda_iso)
+
+    def edad(self) -> Optional[float]:
+        """Segundos desde que se descargó el snapshot vigente (None si no hay)."""
+        with self._lock:
+            return time.monotonic() - self._fetched_at if self._rows is not None else None
+
+    def invalidate(self):
+        with self._lock:
+            self._rows = None
+            self._by_iso = {}
+            self._fetched_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            age = time.monotonic() - self._fetched_at if self._rows is not None else None
+        total = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["stale_hits"]) / total if total else 0.0
+        stats["age_seconds"] = age
+        return stats
+
+
+_http_client = None
+
+def _async_client():
+    """Cliente httpx.AsyncClient compartido por el proceso (import diferido)."""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(headers=HEADERS, follow_redirects=True)
+    return _http_client
+
+async def aclose_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+_chaco_cache = SnapshotCache(_fetch_cotizaciones_chaco, aloader=_afetch_cotizaciones_chaco)
+
+
+def get_cotizaciones_chaco() -> List[Dict[str, Any]]:
+    """
+    Devuelve el snapshot (cacheado) de todas las monedas de Cambios Chaco.
+    En caso de error sin snapshot previo devuelve lista vacía (el caller decide qué hacer).
+    """
+    rows, _ = _chaco_cache.get()
+    return rows
+
+
+def chaco_cache_stats() -> Dict[str, Any]:
+    """Contadores de hit/miss del cache de Cambios Chaco."""
+    return _chaco_cache.stats()
+
+
+async def aget_cotizaciones_chaco() -> List[Dict[str, Any]]:
+    rows, _ = await _chaco_cache.aget()
+    return rows
+
+
+def publicar_snapshot(rows: List[Dict[str, Any]], edad: float = 0.0):
+    """Publica un snapshot obtenido por el recolector en segundo plano."""
+    _chaco_cache.publicar(rows, edad)
+
+
+def usar_snapshot_externo(activo: bool = True):
+    """
+    Con `activo`, las requests solo leen el snapshot publicado por el recolector:
+    nunca consultan la API ni el PDF (el recolector ya cae al PDF si la API falla).
+    """
+    _chaco_cache.externo = activo
+
+
+def _frescura(edad: Optional[float]) -> Dict[str, Any]:
+    """Marca explícita cuando se sirve el último dato bueno porque el upstream no responde."""
+    if edad is None or edad <= CHACO_MAX_EDAD:
+        return {}
+    return {"desactualizado": True, "edad_segundos": round(edad)}
+
+
+def frescura_chaco() -> Dict[str, Any]:
+    """`desactualizado` y `edad_segundos` del snapshot de Cambios Chaco que se está sirviendo (vacío si está al día)."""
+    return _frescura(_chaco_cache.edad())
+
+
+def _formato_html(c: Optional[Dict[str, Any]], edad: Optional[float] = None) -> Dict[str, Any]:
+    if c:
+        return {
+            "result": {
+                "moneda": c["moneda"],
+                "compra": c["compra"],
+                "venta": c["venta"]
+            },
+            "source": c.get("meta", {}).get("fuente", "Cambios Chaco"),
+            "date": c.get("meta", {}).get("fecha"),
+            **_frescura(edad),
+        }
+    # Si no encontramos en la API, devolvemos formato vacío (el agente puede usar RAG entonces)
+    return {"result": None, "source": "Cambios Chaco - no encontrado", "date": dt.datetime.now().strftime("%Y-%m-%d")}
+
 
 def get_cotizacion_html(moneda_iso: str) -> Dict[str, Any]:
     """
@@ -153,81 +457,333 @@ def get_cotizacion_html(moneda_iso: str) -> Dict[str, Any]:
       "date": "2025-08-11"
     }
     Si no encuentra devuelve {"result": None, "source": "...", "date": ...}
+    Si el snapshot es el último bueno y superó `CHACO_MAX_EDAD`, agrega
+    "desactualizado": True y "edad_segundos".
     """
     moneda_iso = (moneda_iso or "").strip().upper()
-    cotizaciones = get_cotizaciones_chaco()
-    for c in cotizaciones:
-        if c.get("moneda") == moneda_iso:
-            return {
-                "result": {
-                    "moneda": c["moneda"],
-                    "compra": c["compra"],
-                    "venta": c["venta"]
-                },
-                "source": c.get("meta", {}).get("fuente", "Cambios Chaco"),
-                "date": c.get("meta", {}).get("fecha")
-            }
+    return _formato_html(_chaco_cache.lookup(moneda_iso), _chaco_cache.edad())
 
-    # Si no encontramos en la API, devolvemos formato vacío (el agente puede usar RAG entonces)
-    return {"result": None, "source": "Cambios Chaco - no encontrado", "date": dt.datetime.now().strftime("%Y-%m-%d")}
+async def aget_cotizacion_html(moneda_iso: str) -> Dict[str, Any]:
+    moneda_iso = (moneda_iso or "").strip().upper()
+    return _formato_html(await _chaco_cache.alookup(moneda_iso), _chaco_cache.edad())
 
 def find_cotizacion_html(moneda: str):
-    key = _normalize_moneda(moneda)
-    r = get_cotizacion_html(moneda)
+    key = moneda_iso(moneda)
+    r = get_cotizacion_html(key)
     if r and r.get("result"):
         return r
     return None
 
-def get_cotizaciones_pdf_bytes():
-    """Descarga el PDF (bytes) y lo retorna. Puede ser usado por pdfplumber."""
-    resp = requests.get(URL_PDF, timeout=10)
-    resp.raise_for_status()
-    return resp.content
-
-def parse_pdf_bytes_for_table(pdf_bytes):
-    """Usa pdfplumber para extraer tablas del PDF y devolver lista de dicts similar a HTML."""
-    rows = []
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            for table in tables:
-                for row in table:
-                    if not row or len(row) < 3:
-                        continue
-                    moneda = (row[0] or '').strip()
-                    compra_raw = (row[1] or '').strip()
-                    venta_raw = (row[2] or '').strip()
-                    def to_float(x):
-                        try:
-                            return float(x.replace('.','').replace(',','.'))
-                        except:
-                            try:
-                                return float(x.replace(',','.'))
-                            except:
-                                return None
-                    compra = to_float(compra_raw)
-                    venta = to_float(venta_raw)
-                    rows.append({'moneda': moneda, 'compra': compra, 'venta': venta})
-    return rows
+async def afind_cotizacion_html(moneda: str):
+    r = await aget_cotizacion_html(moneda_iso(moneda))
+    if r and r.get("result"):
+        return r
+    return None
+
+def _pdf_to_float(x):
+    try:
+        return float(x.replace('.','').replace(',','.'))
+    except (AttributeError, ValueError):
+        try:
+            return float(x.replace(',','.'))
+        except (AttributeError, ValueError):
+            return None
+
+
+def _filas_de_pagina(page):
+    """Filas {'moneda', 'compra', 'venta'} de las tablas de una página."""
+    for table in page.extract_tables():
+        for row in table:
+            if not row or len(row) < 3:
+                continue
+            yield {
+                'moneda': (row[0] or '').strip(),
+                'compra': _pdf_to_float((row[1] or '').strip()),
+                'venta': _pdf_to_float((row[2] or '').strip()),
+            }
+
+
+def _iso_de_fila(nombre: str) -> Optional[str]:
+    """ISO de la moneda de una fila del PDF: código explícito si lo hay, si no por alias."""
+    if not nombre:
+        return None
+    for token in re.findall(r"\b[A-Z]{3}\b", nombre.upper()):
+        if token in ISO_CONOCIDOS:
+            return token
+    # el alias más largo gana ("dólar canadiense" es CAD, no USD)
+    monedas = buscar_monedas(nombre)
+    return monedas[0] if monedas else None
+
+
+class PdfTableCache:
+    """
+    Cache de la tabla del PDF de Cambios Chaco (fallback cuando la API JSON no responde).
+
+    - Dentro de `ttl` segundos no se hace ninguna consulta; después se revalida con un
+      GET condicional (If-None-Match / If-Modified-Since). Un 304, o un 200 con el mismo
+      hash de contenido, conserva lo ya parseado.
+    - El parseo (`extract_tables`, lo más caro) avanza página por página y se detiene en
+      cuanto aparece la moneda pedida; una consulta posterior por otra moneda retoma
+      desde la página siguiente.
+    - Las filas quedan en un dict por ISO, así que las búsquedas repetidas no cuestan nada.
+    - Si la revalidación falla se sigue sirviendo el PDF anterior (`edad` dice desde cuándo).
+    """
+
+    def __init__(self, url: str = URL_PDF, ttl: float = CHACO_PDF_TTL):
+        self.url = url
+        self.ttl = ttl
+        self._lock = threading.Lock()        # protege el estado
+        self._fetch_lock = threading.Lock()  # una sola descarga a la vez (hilos)
+        self._parse_lock = threading.Lock()  # un solo parseo a la vez
+        self._atask: Optional[asyncio.Task] = None
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._hash: Optional[str] = None
+        self._pdf_bytes: Optional[bytes] = None
+        self._checked_at = 0.0
+        self._validado_en = 0.0   # última respuesta buena del upstream (200 o 304)
+        self._by_iso: Dict[str, Dict[str, Any]] = {}
+        self._next_page = 0
+        self._total_pages: Optional[int] = None
+        self._stats = {"descargas": 0, "no_modificado": 0, "mismo_hash": 0, "paginas_parseadas": 0,
+                       "hits": 0, "errores": 0}
+
+    # --- Red ---
+    def _fresco(self) -> bool:
+        return self._pdf_bytes is not None and time.monotonic() - self._checked_at < self.ttl
+
+    def _headers_condicionales(self) -> Dict[str, str]:
+        headers = dict(HEADERS)
+        if self._pdf_bytes is not None:
+            if self._etag:
+                headers["If-None-Match"] = self._etag
+            if self._last_modified:
+                headers["If-Modified-Since"] = self._last_modified
+        return headers
+
+    def _aplicar(self, status: int, headers, content: bytes):
+        with self._lock:
+            self._checked_at = self._validado_en = time.monotonic()
+            if status == 304 and self._pdf_bytes is not None:
+                self._stats["no_modificado"] += 1
+                return
+            self._stats["descargas"] += 1
+            self._etag = headers.get("ETag") or self._etag
+            self._last_modified = headers.get("Last-Modified") or self._last_modified
+            digest = hashlib.sha256(content).hexdigest()
+            if digest == self._hash:
+                self._stats["mismo_hash"] += 1
+                return
+            # PDF nuevo: se descarta lo parseado del anterior
+            self._hash = digest
+            self._pdf_bytes = content
+            self._by_iso = {}
+            self._next_page = 0
+            self._total_pages = None
+
+    def _error(self, e: Exception):
+        esperado = _error_esperado(e)
+        if not esperado:
+            log.warning("error al revalidar el PDF de Cambios Chaco: %s", e)
+        with self._lock:
+            self._stats["errores"] += 1
+            if self._pdf_bytes is None:
+                raise e
+            # se sigue sirviendo el PDF anterior; reintentar recién al vencer el TTL
+            # (con el circuito abierto o sin tiempo no se llamó: se reintenta en la próxima consulta)
+            if not esperado:
+                self._checked_at = time.monotonic()
+
+    def revalidar(self):
+        if self._fresco():
+            return
+        with self._fetch_lock:
+            if self._fresco():
+                return
+            try:
+                with _upstream("chaco_pdf", CHACO_PDF_TIMEOUT) as r:
+                    resp = requests.get(self.url, timeout=r["timeout"], headers=self._headers_condicionales())
+                    r["status"] = str(resp.status_code)
+                if resp.status_code != 304:
+                    resp.raise_for_status()
+                self._aplicar(resp.status_code, resp.headers, resp.content)
+            except Exception as e:
+                self._error(e)
+
+    async def _arevalidar(self):
+        try:
+            with sin_deadline(), _upstream("chaco_pdf", CHACO_PDF_TIMEOUT) as r:
+                resp = await _async_client().get(self.url, timeout=r["timeout"], headers=self._headers_condicionales())
+                r["status"] = str(resp.status_code)
+            if resp.status_code != 304:
+                resp.raise_for_status()
+            self._aplicar(resp.status_code, resp.headers, resp.content)
+        except Exception as e:
+            self._error(e)
+
+    async def arevalidar(self):
+        if self._fresco():
+            return
+        loop = asyncio.get_running_loop()
+        task = self._atask
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = self._atask = loop.create_task(self._arevalidar())
+        try:
+            # la descarga sigue en segundo plano aunque esta request se quede sin tiempo
+            await asyncio.wait_for(asyncio.shield(task), restante(CHACO_PDF_TIMEOUT))
+        except asyncio.TimeoutError:
+            if self._pdf_bytes is None:
+                metrics.DEADLINE_EXCEEDED.inc(etapa="chaco_pdf")
+                raise DeadlineExceeded("se agotó el tiempo de la request esperando el PDF")
+
+    # --- Parseo incremental ---
+    def _resuelto(self, iso: str) -> bool:
+        return iso in self._by_iso or self._total_pages is not None and self._next_page >= self._total_pages
+
+    def _parsear_hasta(self, iso: str):
+        """Parsea páginas pendientes hasta encontrar `iso` (o agotar el PDF)."""
+        import pdfplumber  # import diferido: solo se usa en el fallback PDF
+
+        with self._parse_lock:
+            with self._lock:
+                if self._resuelto(iso):
+                    return
+                pdf_bytes, hash_actual, desde = self._pdf_bytes, self._hash, self._next_page
+            with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+                total = len(pdf.pages)
+                for i in range(desde, total):
+                    with metrics.cronometro(metrics.PDF_PARSE_SECONDS, "pdf.pagina"):
+                        filas = list(_filas_de_pagina(pdf.pages[i]))
+                    metrics.PDF_PAGES.inc()
+                    with self._lock:
+                        if self._hash != hash_actual:
+                            return  # llegó otro PDF mientras se parseaba
+                        self._stats["paginas_parseadas"] += 1
+                        for fila in filas:
+                            fila_iso = _iso_de_fila(fila["moneda"])
+                            if fila_iso and (fila["compra"] is not None or fila["venta"] is not None):
+                                self._by_iso.setdefault(fila_iso, {**fila, "nombre": fila["moneda"], "moneda": fila_iso})
+                        self._next_page = i + 1
+                        self._total_pages = total
+                        if iso in self._by_iso:
+                            return
+
+    def _resultado(self, iso: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            fila = self._by_iso.get(iso)
+            if fila is not None:
+                self._stats["hits"] += 1
+            return fila
+
+    def _sin_tiempo_para_parsear(self) -> bool:
+        if vencido():
+            metrics.DEADLINE_EXCEEDED.inc(etapa="pdf_parse")
+            return True
+        return False
+
+    def lookup(self, moneda_iso: str) -> Optional[Dict[str, Any]]:
+        self.revalidar()
+        if not moneda_iso:
+            return None
+        if not self._resuelto(moneda_iso) and not self._sin_tiempo_para_parsear():
+            self._parsear_hasta(moneda_iso)
+        return self._resultado(moneda_iso)
+
+    async def alookup(self, moneda_iso: str) -> Optional[Dict[str, Any]]:
+        await self.arevalidar()
+        if not moneda_iso:
+            return None
+        if not self._resuelto(moneda_iso) and not self._sin_tiempo_para_parsear():
+            # extract_tables es CPU intensivo: fuera del event loop
+            await asyncio.to_thread(self._parsear_hasta, moneda_iso)
+        return self._resultado(moneda_iso)
+
+    def filas(self) -> List[Dict[str, Any]]:
+        """Todas las filas del PDF vigente (revalida y parsea las páginas que falten)."""
+        self.revalidar()
+        self._parsear_hasta("")   # ningún ISO vacío: recorre todas las páginas pendientes
+        with self._lock:
+            return list(self._by_iso.values())
+
+    def edad(self) -> Optional[float]:
+        """Segundos desde la última respuesta buena del upstream (None si no hay PDF)."""
+        with self._lock:
+            return time.monotonic() - self._validado_en if self._pdf_bytes is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "monedas": len(self._by_iso), "paginas": self._total_pages,
+                    "etag": self._etag, "last_modified": self._last_modified}
+
+
+_pdf_cache = PdfTableCache()
+
+
+def pdf_cache_stats() -> Dict[str, Any]:
+    return _pdf_cache.stats()
+
 
 def find_cotizacion_pdf(moneda: str):
-    key = _normalize_moneda(moneda)
-    pdf_bytes = get_cotizaciones_pdf_bytes()
-    rows = parse_pdf_bytes_for_table(pdf_bytes)
-    for r in rows:
-        if key in r['moneda'].lower() or r['moneda'].lower() in key:
-            return r
-    return None
+    return _pdf_cache.lookup(moneda_iso(moneda))
+
+
+async def afind_cotizacion_pdf(moneda: str):
+    return await _pdf_cache.alookup(moneda_iso(moneda))
+
+
+def descargar_snapshot():
+    """
+    Snapshot completo desde el upstream, sin pasar por el cache: (filas, "json") de la API
+    o, si falla o viene vacía, (filas, "pdf") de la tabla del PDF con el mismo formato.
+    Propaga el error del PDF si ninguna de las dos fuentes responde.
+    """
+    try:
+        filas = _fetch_cotizaciones_chaco()
+        if filas:
+            return filas, "json"
+    except Exception as e:
+        log.warning("API de Cambios Chaco no disponible, se usa el PDF: %s", e)
+    fecha = dt.datetime.now().strftime("%Y-%m-%d")
+    filas = [{"moneda": f["moneda"], "compra": f["compra"], "venta": f["venta"],
+              "meta": {"fecha": fecha, "fuente": "Cambios Chaco (PDF)"}} for f in _pdf_cache.filas()]
+    return filas, "pdf"
+
+
+def _formato_pdf(fila: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "result": {"moneda": fila["moneda"], "compra": fila["compra"], "venta": fila["venta"]},
+        "source": "Cambios Chaco (PDF)",
+        "date": dt.datetime.now().strftime("%Y-%m-%d"),
+        **_frescura(_pdf_cache.edad()),
+    }
+
 
 # Helper combined: primero HTML, luego PDF como fallback
 def get_cotizacion(moneda: str):
     res = find_cotizacion_html(moneda)
     if res:
         return {'source':'html','result':res}
+    if _chaco_cache.externo:
+        # el snapshot del recolector ya incluye el PDF si la API no respondía
+        return {'source': None, 'result': None}
     try:
         res_pdf = find_cotizacion_pdf(moneda)
         if res_pdf:
-            return {'source':'pdf','result':res_pdf}
+            return {'source':'pdf','result':_formato_pdf(res_pdf)}
+    except Exception as e:
+        pass
+    return {'source': None, 'result': None}
+
+async def aget_cotizacion(moneda: str):
+    res = await afind_cotizacion_html(moneda)
+    if res:
+        return {'source':'html','result':res}
+    if _chaco_cache.externo:
+        return {'source': None, 'result': None}
+    try:
+        res_pdf = await afind_cotizacion_pdf(moneda)
+        if res_pdf:
+            return {'source':'pdf','result':_formato_pdf(res_pdf)}
     except Exception as e:
         pass
     return {'source': None, 'result': None}
@@ -0,0 +1,17 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# los tests importan `src` y `scripts` como paquetes desde la raíz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# los archivos que los módulos abren al importarse (p. ej. `src.api`) van a un directorio temporal, no a data/
+_DATOS = tempfile.mkdtemp(prefix="cotizaciones-tests-")
+atexit.register(shutil.rmtree, _DATOS, ignore_errors=True)
+for _var, _nombre in (("VECTORSTORE_PATH", "vectorstore"), ("LLM_CACHE_PATH", "llm_cache.sqlite"),
+                      ("LLM_CUPO_PATH", "llm_cupo.sqlite"), ("COLLECTOR_STATE", "collector_state.json")):
+    os.environ[_var] = os.path.join(_DATOS, _nombre)
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["EMBEDDINGS_WARMUP"] = "0"
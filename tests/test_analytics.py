@@ -0,0 +1,85 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from scripts.fakes import serie_sintetica
+from src.rag.analytics import RateAnalytics, _Indicadores
+from src.rag.timeseries import FUENTE_BCP, RateHistoryStore
+
+HASTA = dt.date(2025, 8, 29)
+
+
+def _historial(dias: int) -> RateHistoryStore:
+    historial = RateHistoryStore()
+    historial.add_many((m, f, v) for f, m, v in serie_sintetica(dias, hasta=HASTA) if m == "USD")
+    return historial
+
+
+def _iguales(a: RateAnalytics, b: RateAnalytics, moneda: str = "USD"):
+    ia, ib = a._actuales(moneda), b._actuales(moneda)
+    for campo in ("fechas", "valores", "fuentes"):
+        np.testing.assert_array_equal(getattr(ia, campo), getattr(ib, campo), err_msg=campo)
+    for campo in _Indicadores.__slots__[4:]:
+        np.testing.assert_allclose(getattr(ia, campo), getattr(ib, campo), rtol=1e-9, err_msg=campo)
+    for rango in ((None, None), ("2025-06-02", "2025-07-15"), ("2025-08-01", None)):
+        ra, rb = a.resumen(moneda, *rango), b.resumen(moneda, *rango)
+        if rb is None:                                     # rango sin cotizaciones
+            assert ra is None
+            continue
+        assert ra.keys() == rb.keys()
+        for clave, valor in rb.items():
+            if isinstance(valor, float):
+                assert ra[clave] == pytest.approx(valor, rel=1e-9), clave
+            else:
+                assert ra[clave] == valor, clave
+
+
+def test_dias_nuevos_recalculan_solo_la_cola():
+    historial = _historial(90)
+    analitica = RateAnalytics(historial, ventana=5)
+    analitica.actualizar()
+    assert analitica.recalculados == 90
+
+    historial.add_many([("USD", "2025-09-01", 7400.0), ("USD", "2025-09-02", 7390.5, "Cambios Chaco")])
+    analitica.actualizar("USD")
+    assert analitica.recalculados == 92                    # solo las dos cotizaciones nuevas
+    _iguales(analitica, RateAnalytics(historial, ventana=5))
+
+
+def test_una_correccion_recalcula_desde_esa_fecha():
+    historial = _historial(60)
+    analitica = RateAnalytics(historial, ventana=5)
+    analitica.actualizar()
+    fechas, valores = historial.serie("USD")
+    historial.add("USD", str(fechas[40]), float(valores[40]) + 25)    # el BCP corrige un valor
+    analitica.actualizar("USD")
+    assert analitica.recalculados == 60 + 20
+    _iguales(analitica, RateAnalytics(historial, ventana=5))
+
+
+def test_valores_repetidos_no_recalculan_nada():
+    historial = _historial(30)
+    analitica = RateAnalytics(historial)
+    analitica.actualizar()
+    fechas, valores = historial.serie("USD")
+    historial.add("USD", str(fechas[-1]), float(valores[-1]))        # el mismo snapshot otra vez
+    analitica.actualizar("USD")
+    assert analitica.recalculados == 30
+    _iguales(analitica, RateAnalytics(historial))
+
+
+def test_resumen_de_un_rango_coincide_con_el_calculo_directo():
+    historial = _historial(120)
+    analitica = RateAnalytics(historial)
+    fechas, valores = historial.serie("USD")
+    i, j = 30, 75
+    r = analitica.resumen("USD", str(fechas[i]), str(fechas[j - 1]))
+    tramo = valores[i:j]
+    pct = np.diff(tramo) / tramo[:-1] * 100
+    assert r["cotizaciones"] == j - i
+    assert r["media"] == pytest.approx(tramo.mean())
+    assert r["volatilidad_pct"] == pytest.approx(pct.std(), rel=1e-6)
+    assert r["minimo"]["valor"] == tramo.min() and r["maximo"]["valor"] == tramo.max()
+    assert r["variacion"] == pytest.approx(tramo[-1] - tramo[0])
+    assert r["fuentes"] == {FUENTE_BCP: j - i}
@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src.llm import PRIORIDAD_BATCH, LLMUnavailable
+from src.mcp import MCPRegistry
+from src.rag.timeseries import RateHistoryStore
+from src.tools import cotizaciones_tool as ct
+from src.tools.conversion import ConversionEngine
+
+FILAS = [{"moneda": m, "compra": c, "venta": v, "meta": {"fecha": "2025-08-20", "fuente": "Cambios Chaco"}}
+         for m, c, v in (("USD", 7300, 7400), ("BRL", 1300, 1400), ("EUR", 8000, 8200))]
+
+
+class LLMContado:
+    """`llm.analyze` de prueba: anota cada llamada y falla con `errores[moneda]` si lo hay."""
+
+    def __init__(self, errores=None):
+        self.llamadas = []
+        self.errores = errores or {}
+
+    async def __call__(self, moneda, compra, venta, source, contexto, question, priority):
+        self.llamadas.append((moneda, priority))
+        if moneda in self.errores:
+            raise self.errores[moneda]
+        return f"análisis de {moneda}"
+
+
+@pytest.fixture
+def lote(monkeypatch):
+    """POST /ask/batch con el snapshot fijo y sin histórico; `lote(errores)` devuelve (enviar, llm de prueba)."""
+    cache = ct.SnapshotCache(lambda: [])
+    cache.externo = True
+    cache.publicar([dict(f) for f in FILAS])
+    monkeypatch.setattr(ct, "_chaco_cache", cache)
+    historial = RateHistoryStore()
+    monkeypatch.setattr(api, "historial", historial)
+    monkeypatch.setattr(api, "analitica", None)
+    monkeypatch.setattr(api, "conversor", ConversionEngine(historial))
+    cliente = TestClient(api.app)
+
+    def preparar(errores=None):
+        llm = LLMContado(errores)
+        mcp = MCPRegistry()
+        mcp.register("llm.analyze", lambda **kw: None, async_func=llm)
+        monkeypatch.setattr(api, "mcp", mcp)
+
+        def enviar(preguntas):
+            respuesta = cliente.post("/ask/batch", json={"questions": preguntas})
+            assert respuesta.status_code == 200
+            return respuesta.json()["resultados"]
+        return enviar, llm
+
+    return preparar
+
+
+def test_resultados_en_el_orden_de_entrada(lote):
+    enviar, _ = lote()
+    preguntas = ["¿Qué opinas del euro?", "¿cuántos reales son 100 dólares?", "¿Qué opinas del dólar?"]
+    resultados = enviar(preguntas)
+    assert [r["question"] for r in resultados] == preguntas
+    assert resultados[0]["reporte"] == "análisis de EUR"
+    assert resultados[1]["reporte"].startswith("100.00 USD = ")
+    assert resultados[2]["reporte"] == "análisis de USD"
+
+
+def test_una_llamada_al_llm_por_clave_distinta(lote):
+    enviar, llm = lote()
+    resultados = enviar(["¿Qué opinas del dólar?", "¿qué opinás del dolar?", "Que opinas del dolar",
+                         "¿Qué opinas del euro?"])
+    assert [r["reporte"] for r in resultados] == ["análisis de USD"] * 3 + ["análisis de EUR"]
+    assert sorted(llm.llamadas) == [("EUR", PRIORIDAD_BATCH), ("USD", PRIORIDAD_BATCH)]
+
+
+def test_errores_por_item(lote):
+    enviar, _ = lote(errores={"EUR": RuntimeError("backend caído"), "BRL": LLMUnavailable("Cupo diario del LLM agotado")})
+    resultados = enviar(["¿Qué opinas del euro?", "¿Qué opinas del dólar?", "¿Qué opinas del real?"])
+    assert resultados[0] == {"question": "¿Qué opinas del euro?", "error": "backend caído"}
+    assert resultados[1]["reporte"] == "análisis de USD"
+    # sin LLM, el ítem no falla: se responde solo con los datos
+    assert resultados[2]["reporte"].startswith("(Análisis con IA no disponible: Cupo diario del LLM agotado)")
+    assert "Compra 1300 | Venta 1400" in resultados[2]["reporte"]
@@ -0,0 +1,179 @@
+import datetime as dt
+import json
+import time
+
+import numpy as np
+import pytest
+
+from src.collector import RateCollector
+from src.rag.encoders import HashingEncoder
+from src.rag.timeseries import RateHistoryStore
+from src.rag.vectorstore import SimpleVectorStore
+from src.tools import cotizaciones_tool as ct
+
+
+def _fila(moneda: str, fecha: str, compra: float, venta: float) -> dict:
+    return {"moneda": moneda, "compra": compra, "venta": venta, "meta": {"fecha": fecha, "fuente": "Cambios Chaco"}}
+
+
+class Upstream:
+    """`descargar` de prueba: devuelve las filas cargadas y cuenta las consultas."""
+
+    def __init__(self, filas=None):
+        self.filas = filas or [_fila("USD", "2025-08-20", 7300, 7400)]
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        return [dict(f) for f in self.filas], "json"
+
+
+def _store() -> SimpleVectorStore:
+    return SimpleVectorStore(model_name="hashing", model=HashingEncoder())
+
+
+def _estado(path: str, ts: float, filas=None):
+    """Archivo de estado como lo deja un líder anterior."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"ts": ts, "origen": "json", "filas": filas or [_fila("USD", "2025-08-20", 7300, 7400)]}, f)
+
+
+def _esperar(condicion, timeout: float = 5.0) -> bool:
+    limite = time.monotonic() + timeout
+    while not condicion():
+        if time.monotonic() > limite:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture(autouse=True)
+def cache_aislado(monkeypatch):
+    # el recolector publica en el cache de snapshots del módulo
+    monkeypatch.setattr(ct, "_chaco_cache", ct.SnapshotCache(lambda: []))
+
+
+@pytest.fixture
+def recolectores():
+    creados = []
+
+    def crear(*args, **kwargs) -> RateCollector:
+        creados.append(RateCollector(*args, **kwargs))
+        return creados[-1]
+
+    yield crear
+    for r in creados:
+        r.stop()
+
+
+def test_seguidor_recarga_las_filas_que_guardo_el_lider(tmp_path, recolectores):
+    path, estado = str(tmp_path / "vs"), str(tmp_path / "estado.json")
+    base = _store()
+    base.upsert([{"id": "bcp", "text": "El 2025-08-19 el BCP cotizó USD a 7250", "meta": {"moneda": "USD"}}])
+    base.save(path)
+    store_lider, store_seguidor = _store(), _store()
+    store_lider.load(path)
+    store_seguidor.load(path)
+
+    lider = recolectores(store_lider, store_path=path, state_path=estado, descargar=Upstream())
+    seguidor = recolectores(store_seguidor, store_path=path, state_path=estado, descargar=Upstream())
+    assert lider.es_lider() and not seguidor.es_lider()
+
+    assert lider.recolectar()
+    assert seguidor.recolectar()
+    assert seguidor.stats()["recargas"] == 1
+    assert len(store_seguidor) == 2
+    assert isinstance(store_seguidor.embeddings, np.memmap)      # recargado con mmap, no copiado al heap
+    docs = store_seguidor.query("Cambios Chaco USD 2025-08-20", k=1, where={"moneda": "USD"})
+    assert docs[0]["doc"]["id"] == "2025-08-20_USD_chaco"
+
+    # sin filas nuevas en disco no se vuelve a cargar
+    assert seguidor.recolectar()
+    assert seguidor.stats()["recargas"] == 1
+
+
+def test_un_solo_lider_y_el_lock_se_libera_al_parar(tmp_path, recolectores):
+    estado = str(tmp_path / "estado.json")
+    a, b, c = (recolectores(state_path=estado, descargar=Upstream()) for _ in range(3))
+    assert a.es_lider()
+    assert not b.es_lider() and not c.es_lider()
+    assert a.es_lider()                                   # reentrante para quien ya lo tiene
+    assert a.stats()["lider"] and not b.stats()["lider"]
+
+    a.stop()
+    assert not a.stats()["lider"]
+    assert b.es_lider() and not c.es_lider()
+
+
+def test_seguidor_publica_el_estado_del_lider(tmp_path, recolectores):
+    estado = str(tmp_path / "estado.json")
+    upstream = Upstream()
+    lider = recolectores(state_path=estado, descargar=upstream)
+    historial = RateHistoryStore()
+    seguidor = recolectores(historial=historial, state_path=estado, descargar=Upstream())
+    assert lider.es_lider()
+
+    assert seguidor.recolectar() and seguidor.stats()["estado"] == 0   # el líder todavía no guardó nada
+    assert lider.recolectar()
+    assert seguidor.recolectar()
+    assert seguidor.stats()["estado"] == 1
+    assert ct._chaco_cache.lookup("USD")["compra"] == 7300
+    assert historial.exact("USD", "2025-08-20")["valor_guaranies"] == 7350
+
+    assert seguidor.recolectar() and seguidor.stats()["estado"] == 1   # mismo estado: no se republica
+    upstream.filas = [_fila("USD", "2025-08-21", 7310, 7410)]
+    assert lider.recolectar()
+    assert seguidor.recolectar()
+    assert seguidor.stats()["estado"] == 2
+    assert ct._chaco_cache.lookup("USD")["compra"] == 7310
+    assert historial.exact("USD", "2025-08-21")["valor_guaranies"] == 7360
+    assert upstream.llamadas == 2                         # el seguidor nunca consulta el upstream
+
+
+def test_backfill_restaura_la_serie_y_el_ultimo_snapshot(tmp_path, recolectores):
+    estado = str(tmp_path / "estado.json")
+    store = _store()
+    store.upsert([
+        {"id": "2025-08-18_USD_chaco", "text": "El 2025-08-18 Cambios Chaco cotizó USD",
+         "meta": {"fecha": "2025-08-18", "moneda": "USD", "compra": 7280, "venta": 7380, "fuente": "Cambios Chaco"}},
+        {"id": "bcp", "text": "El 2025-08-18 el BCP cotizó BRL a 1310",
+         "meta": {"fecha": "2025-08-18", "moneda": "BRL", "valor_guaranies": 1310}},
+    ])
+    historial = RateHistoryStore()
+    historial.add("USD", "2025-08-19", 7250)                 # fecha con dato del BCP: no se pisa
+    hace_una_semana = time.time() - 7 * 86400
+    _estado(estado, hace_una_semana, [_fila("USD", "2025-08-19", 7290, 7390), _fila("EUR", "2025-08-19", 8000, 8200)])
+
+    recolector = recolectores(store, historial, state_path=estado, descargar=Upstream())
+    recolector.backfill()
+    assert historial.exact("USD", "2025-08-18")["valor_guaranies"] == 7330   # del doc de Chaco ya indexado
+    assert historial.exact("BRL", "2025-08-18") is None               # los docs del BCP no son del recolector
+    assert historial.exact("USD", "2025-08-19")["valor_guaranies"] == 7250
+    assert historial.exact("EUR", "2025-08-19")["valor_guaranies"] == 8100
+    assert ct._chaco_cache.lookup("EUR")["venta"] == 8200
+    assert "2025-08-19_EUR_chaco" in {d["id"] for d in store.live_docs()}   # el líder indexa el estado guardado
+
+    stats = recolector.stats()
+    assert stats["estado"] == 1 and stats["edad_segundos"] >= 7 * 86400
+    ultimo, hoy = dt.date.fromtimestamp(hace_una_semana), dt.date.today()
+    esperados = [(ultimo + dt.timedelta(days=i)).isoformat() for i in range(1, (hoy - ultimo).days)
+                 if (ultimo + dt.timedelta(days=i)).weekday() < 5]
+    assert stats["dias_sin_snapshot"] == esperados and len(esperados) in (4, 5)
+
+
+def test_estado_vencido_se_recolecta_al_arrancar(tmp_path, recolectores):
+    estado = str(tmp_path / "estado.json")
+    _estado(estado, time.time() - 7200)
+    upstream = Upstream()
+    recolectores(state_path=estado, intervalo=3600, descargar=upstream).start()
+    assert _esperar(lambda: upstream.llamadas == 1)      # catch-up: no espera un intervalo completo
+
+
+def test_estado_reciente_espera_el_resto_del_intervalo(tmp_path, recolectores):
+    estado = str(tmp_path / "estado.json")
+    _estado(estado, time.time() - 60)
+    upstream = Upstream()
+    recolector = recolectores(state_path=estado, intervalo=3600, descargar=upstream).start()
+    time.sleep(0.2)
+    assert upstream.llamadas == 0
+    assert recolector.stats()["estado"] == 1              # arrancó sirviendo el snapshot guardado
@@ -0,0 +1,127 @@
+import asyncio
+import datetime as dt
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import app
+from src.rag.timeseries import FUENTE_BCP, RateHistoryStore
+from src.tools import cotizaciones_tool as ct
+from src.tools.conversion import ConversionEngine, MatrizCruzada
+
+
+def _fila(moneda: str, compra: float, venta: float, fecha: str = "2025-08-20", fuente: str = "Cambios Chaco") -> dict:
+    return {"moneda": moneda, "compra": compra, "venta": venta, "meta": {"fecha": fecha, "fuente": fuente}}
+
+
+FILAS = [_fila("USD", 7300, 7400), _fila("BRL", 1300, 1400), _fila("EUR", 8000, 8200)]
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    """Cache de Cambios Chaco aislado, en modo recolector: sirve lo publicado sin salir a la red."""
+    cache = ct.SnapshotCache(lambda: [])
+    cache.externo = True
+    monkeypatch.setattr(ct, "_chaco_cache", cache)
+
+    def publicar(filas=FILAS, edad: float = 0.0):
+        cache.publicar([dict(f) for f in filas], edad)
+
+    return publicar
+
+
+def test_conversion_lleva_la_fecha_y_fuente_del_snapshot(snapshot):
+    snapshot([_fila("USD", 7300, 7400, "2025-08-20", "Cambios Chaco (PDF)")])
+    r = ConversionEngine().convertir(100, "USD")
+    assert r["fecha"] == "2025-08-20"                     # no la fecha de hoy
+    assert r["fuente"] == "Cambios Chaco (PDF)"
+
+
+def test_snapshot_viejo_marca_la_conversion_desactualizada(snapshot):
+    conversor = ConversionEngine()
+    snapshot()
+    assert "desactualizado" not in conversor.convertir(100, "USD")
+
+    snapshot(edad=ct.CHACO_MAX_EDAD + 120)
+    for r in (conversor.convertir(100, "USD", "BRL"), asyncio.run(conversor.aconvertir(100, "USD", "BRL"))):
+        assert r["desactualizado"] is True
+        assert r["edad_segundos"] >= ct.CHACO_MAX_EDAD + 120
+
+
+def test_conversion_historica_no_se_marca_desactualizada(snapshot):
+    historial = RateHistoryStore()
+    ayer = dt.date.today() - dt.timedelta(days=1)
+    historial.add("USD", ayer, 7350)
+    snapshot(edad=ct.CHACO_MAX_EDAD + 120)
+    r = ConversionEngine(historial).convertir(100, "USD", fecha=ayer.isoformat())
+    assert r["fecha"] == ayer.isoformat() and "desactualizado" not in r
+
+
+# --- Matriz de tipos cruzados ---
+def test_tipo_directo_vende_a_la_compra_y_compra_a_la_venta():
+    m = MatrizCruzada(["PYG", "USD", "BRL"], np.array([1.0, 7300, 1300]), np.array([1.0, 7400, 1400]),
+                      "Cambios Chaco", "2025-08-20")
+    assert m.directa[m.indice["USD"], m.indice["BRL"]] == pytest.approx(7300 / 1400)
+    assert m.directa[m.indice["BRL"], m.indice["USD"]] == pytest.approx(1300 / 7400)
+    assert m.media[m.indice["USD"], m.indice["BRL"]] == pytest.approx(7350 / 1350)
+
+    r = m.convertir(100, "USD", "BRL")
+    assert r["resultado"] == pytest.approx(100 * 7300 / 1400)
+    assert r["spread_pct"] == pytest.approx((1 - (7300 / 1400) / (7350 / 1350)) * 100)
+    assert m.convertir(1, "USD", "PYG")["resultado"] == 7300       # vender dólares: precio de compra
+    assert m.convertir(7400, "PYG", "USD")["resultado"] == pytest.approx(1)   # comprarlos: precio de venta
+
+
+def test_moneda_que_chaco_no_opera_usa_la_serie_historica(snapshot):
+    snapshot()
+    historial = RateHistoryStore()
+    historial.add("ARS", dt.date.today() - dt.timedelta(days=2), 6.0)
+    r = ConversionEngine(historial).convertir(1000, "ARS")
+    assert r["resultado"] == pytest.approx(6000)
+    assert r["fuente"] == FUENTE_BCP and r["spread_pct"] == 0
+    assert ConversionEngine(historial).convertir(1, "USD")["fuente"] == "Cambios Chaco"   # las que opera, del snapshot
+
+
+def test_fecha_sin_dato_busca_hasta_siete_dias_antes():
+    historial = RateHistoryStore()
+    historial.add("USD", "2025-08-01", 7300)
+    conversor = ConversionEngine(historial)
+    assert conversor.convertir(1, "USD", fecha="2025-08-08")["resultado"] == 7300
+    with pytest.raises(ValueError, match="No hay cotizaciones"):
+        conversor.convertir(1, "USD", fecha="2025-08-09")
+    with pytest.raises(ValueError, match="No hay cotizaciones"):
+        conversor.convertir(1, "USD", fecha="2025-07-31")          # nunca con datos posteriores
+
+
+def test_la_matriz_se_arma_una_vez_por_snapshot(snapshot):
+    conversor = ConversionEngine()
+    snapshot()
+    for destino in ("PYG", "BRL", "EUR"):
+        conversor.convertir(1, "USD", destino)
+    assert conversor.stats()["matrices_chaco"] == 1
+    snapshot([_fila("USD", 7310, 7410)])
+    assert conversor.convertir(1, "USD")["resultado"] == 7310
+    assert conversor.stats()["matrices_chaco"] == 2
+
+
+def test_la_matriz_historica_se_recalcula_si_cambia_la_serie():
+    historial = RateHistoryStore()
+    historial.add("USD", "2025-08-01", 7300)
+    conversor = ConversionEngine(historial)
+    conversor.convertir(1, "USD", fecha="2025-08-04")
+    conversor.convertir(2, "USD", fecha="2025-08-04")
+    assert conversor.stats()["matrices_historicas"] == 1
+    historial.add("USD", "2025-08-04", 7320)
+    assert conversor.convertir(1, "USD", fecha="2025-08-04")["resultado"] == 7320
+    assert conversor.stats()["matrices_historicas"] == 2
+
+
+def test_fecha_futura_se_rechaza(snapshot):
+    snapshot()
+    manana = (dt.date.today() + dt.timedelta(days=1)).isoformat()
+    with pytest.raises(ValueError, match="futuras"):
+        ConversionEngine().convertir(1, "USD", fecha=manana)
+
+    respuesta = TestClient(app).post("/convert", json={"monto": 1, "origen": "USD", "fecha": manana})
+    assert respuesta.status_code == 422 and "futuras" in respuesta.json()["detail"]
@@ -0,0 +1,23 @@
+import datetime
+import json
+
+import pytest
+
+from scripts.bench_intent import CAMPOS, CORPUS
+from src.intent import parse_intent
+
+with open(CORPUS, encoding="utf-8") as f:
+    FILAS = [json.loads(linea) for linea in f if linea.strip()]
+
+
+@pytest.mark.parametrize("fila", FILAS, ids=[f["texto"] for f in FILAS])
+def test_corpus(fila):
+    intent = parse_intent(fila["texto"], datetime.date.fromisoformat(fila["hoy"]))
+    obtenido = {c: list(getattr(intent, c)) if c == "monedas" else getattr(intent, c) for c in CAMPOS}
+    assert obtenido == {c: fila.get(c) for c in CAMPOS}
+
+
+@pytest.mark.parametrize("texto", ["no encuentro el dólar de hoy", "quiero encontrar el euro",
+                                   "el contrato en dólares", "un dólar incomparable"])
+def test_palabras_que_contienen_una_pista_de_comparacion(texto):
+    assert parse_intent(texto, datetime.date(2025, 8, 14)).tipo != "comparacion"
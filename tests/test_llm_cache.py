@@ -0,0 +1,122 @@
+import asyncio
+import contextlib
+import time
+
+import pytest
+
+from src import llm, resilience
+from src.llm import LLMGateway, StubBackend
+from src.llm_cache import LLMAnswerCache
+from src.mcp import MCPRegistry, analyze_with_llm_stream
+
+DATOS = dict(moneda="USD", compra=7000.0, venta=7100.0, source="Cambios Chaco", contexto="USD en guaraníes (BCP) ...")
+
+
+def _key(question: str, **cambios) -> str:
+    return LLMAnswerCache.key(**{**DATOS, **cambios}, question=question)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMAnswerCache(str(tmp_path / "llm_cache.sqlite"), ttl=3600, max_entries=100)
+
+
+def test_la_clave_agrupa_preguntas_con_la_misma_intencion():
+    base = _key("cómo viene el dólar estos días")
+    assert _key("¿Cómo viene el DÓLAR estos dias?") == base
+    assert _key("tendencia del dólar en los últimos días") == base
+    assert _key("cómo viene el dólar estos días", priority=5) == base   # la prioridad no cambia la respuesta
+
+
+def test_la_clave_cambia_con_la_moneda_o_con_los_datos():
+    base = _key("cómo viene el dólar estos días")
+    assert _key("cómo viene el euro estos días") != base
+    assert _key("cómo viene el dólar estos días", compra=7010.0) != base
+    assert _key("cómo viene el dólar estos días", contexto="otro resumen") != base
+
+
+def test_sin_intencion_reconocida_solo_agrupa_el_mismo_texto():
+    assert _key("hola, qué tal?") == _key("hola que tal")
+    assert _key("hola que tal") != _key("que hora es")
+
+
+def test_get_put_y_persistencia(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    cache = LLMAnswerCache(path)
+    key = _key("cómo viene el dólar estos días")
+    assert cache.get(key) is None
+    cache.put(key, "el dólar sube")
+    assert cache.get(key) == "el dólar sube"
+    assert LLMAnswerCache(path).get(key) == "el dólar sube"   # sobrevive al reinicio
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_las_entradas_vencen_con_el_ttl(tmp_path):
+    cache = LLMAnswerCache(str(tmp_path / "llm_cache.sqlite"), ttl=0.05)
+    cache.put("k", "respuesta")
+    assert cache.get("k") == "respuesta"
+    time.sleep(0.06)
+    assert cache.get("k") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_limite_de_entradas_descarta_la_menos_usada(tmp_path):
+    cache = LLMAnswerCache(str(tmp_path / "llm_cache.sqlite"), max_entries=2)
+    cache.put("a", "1")
+    time.sleep(0.01)
+    cache.put("b", "2")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "3")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+
+
+def test_wrap_llama_una_vez_y_no_guarda_respuestas_vacias(cache):
+    llamadas = []
+
+    def analizar(**kwargs):
+        llamadas.append(kwargs["question"])
+        return "" if "vacía" in kwargs["question"] else "análisis"
+
+    cacheado = cache.wrap(analizar)
+    assert cacheado(**DATOS, question="cómo viene el dólar estos días") == "análisis"
+    assert cacheado(**DATOS, question="tendencia del dólar en los últimos días") == "análisis"
+    assert len(llamadas) == 1
+    cacheado(**DATOS, question="respuesta vacía")
+    cacheado(**DATOS, question="respuesta vacía")
+    assert len(llamadas) == 3
+
+
+def test_awrap_stream_guarda_al_terminar_y_entrega_el_hit_entero(cache):
+    async def astream(**kwargs):
+        for parte in ("el dólar ", "viene ", "estable"):
+            yield parte
+
+    cacheado = cache.awrap_stream(astream)
+
+    async def leer():
+        return [p async for p in cacheado(**DATOS, question="cómo viene el dólar estos días")]
+
+    assert asyncio.run(leer()) == ["el dólar ", "viene ", "estable"]
+    assert asyncio.run(leer()) == ["el dólar viene estable"]
+
+
+def test_stream_abandonado_libera_el_turno_del_gateway_enseguida(cache, monkeypatch):
+    # la cadena real de /ask/stream: MCPRegistry.astream → awrap_stream → analyze_with_llm_stream → gateway
+    gateway = LLMGateway(backend=StubBackend(latencia_ms=500), max_concurrency=1, cupo_path=None)
+    monkeypatch.setattr(llm, "_gateway", gateway)
+    monkeypatch.setattr(resilience, "_circuitos", {})
+    mcp = MCPRegistry()
+    mcp.register("llm.analyze", lambda **kw: None, stream_func=cache.awrap_stream(analyze_with_llm_stream))
+
+    async def abandonar():
+        async with contextlib.aclosing(mcp.astream("llm.analyze", **DATOS, question="¿y el dólar?")) as fragmentos:
+            async for _ in fragmentos:
+                break                                  # el cliente se desconecta tras el primer fragmento
+        return gateway.stats()["en_vuelo"]
+
+    assert asyncio.run(abandonar()) == 0
+    assert cache.get(_key("¿y el dólar?")) is None        # una respuesta a medias no se guarda
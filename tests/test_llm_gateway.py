@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from src import llm, resilience
+from src.agent import aanalizar_con_llm, analizar_con_llm
+from src.llm import PRIORIDAD_BATCH, PRIORIDAD_INTERACTIVA, LLMGateway, LLMUnavailable, StubBackend
+from src.mcp import MCPRegistry, analyze_with_llm, analyze_with_llm_async
+
+
+class StubRegistrado(StubBackend):
+    """StubBackend que anota el orden de las llamadas y cuántas hubo a la vez."""
+
+    def __init__(self, latencia_ms: float = 50):
+        super().__init__(latencia_ms)
+        self.prompts = []
+        self.en_curso = self.pico = 0
+
+    async def agenerate(self, prompt, model, **kwargs):
+        self.prompts.append(prompt)
+        self.en_curso += 1
+        self.pico = max(self.pico, self.en_curso)
+        try:
+            return await super().agenerate(prompt, model, **kwargs)
+        finally:
+            self.en_curso -= 1
+
+
+@pytest.fixture(autouse=True)
+def circuitos_limpios(monkeypatch):
+    monkeypatch.setattr(resilience, "_circuitos", {})
+
+
+def _gateway(backend=None, cupo_path=None, **kwargs) -> LLMGateway:
+    return LLMGateway(backend=backend or StubRegistrado(), cupo_path=cupo_path, **kwargs)
+
+
+def test_interactivo_se_atiende_antes_que_batch():
+    backend = StubRegistrado(latencia_ms=100)
+    gateway = _gateway(backend, max_concurrency=1)
+
+    async def main():
+        primera = asyncio.create_task(gateway.agenerate("ocupa", priority=PRIORIDAD_BATCH))
+        await asyncio.sleep(0.02)
+        # las dos esperan al mismo turno; la interactiva llegó después pero pasa primero
+        batch = asyncio.create_task(gateway.agenerate("batch", priority=PRIORIDAD_BATCH))
+        await asyncio.sleep(0.01)
+        interactiva = asyncio.create_task(gateway.agenerate("interactiva", priority=PRIORIDAD_INTERACTIVA))
+        await asyncio.gather(primera, batch, interactiva)
+
+    asyncio.run(main())
+    assert backend.prompts == ["ocupa", "interactiva", "batch"]
+
+
+def test_tope_de_concurrencia():
+    backend = StubRegistrado(latencia_ms=50)
+    gateway = _gateway(backend, max_concurrency=2)
+
+    async def main():
+        return await asyncio.gather(*(gateway.agenerate(f"p{i}") for i in range(6)))
+
+    assert len(asyncio.run(main())) == 6
+    assert backend.pico == 2
+    stats = gateway.stats()
+    assert stats["admitidas"] == 6 and stats["en_vuelo"] == 0
+
+
+def test_cupo_por_minuto_agotado():
+    gateway = _gateway(rpm=2, rpd=100, max_wait=0.2)
+    gateway.generate("uno")
+    gateway.generate("dos")
+    t0 = time.monotonic()
+    with pytest.raises(LLMUnavailable, match="saturado"):
+        gateway.generate("tres")
+    assert time.monotonic() - t0 < 1                   # espera a lo sumo `max_wait`
+    assert gateway.stats()["rechazadas"] == 1
+
+
+def test_cupo_diario_agotado_rechaza_sin_esperar():
+    gateway = _gateway(rpm=100, rpd=1, max_wait=5)
+    asyncio.run(gateway.agenerate("uno"))
+    t0 = time.monotonic()
+    with pytest.raises(LLMUnavailable, match="Cupo diario"):
+        asyncio.run(gateway.agenerate("dos"))
+    assert time.monotonic() - t0 < 0.1
+
+
+def test_cupo_compartido_entre_workers_y_reinicios(tmp_path):
+    path = str(tmp_path / "llm_cupo.sqlite")
+    worker_a = _gateway(cupo_path=path, rpm=100, rpd=2, max_wait=0.1)
+    worker_b = _gateway(cupo_path=path, rpm=100, rpd=2, max_wait=0.1)
+    worker_a.generate("uno")
+    worker_b.generate("dos")
+    with pytest.raises(LLMUnavailable, match="Cupo diario"):
+        worker_a.generate("tres")
+    # un proceso nuevo no arranca con el cupo lleno
+    reiniciado = _gateway(cupo_path=path, rpm=100, rpd=2, max_wait=0.1)
+    assert reiniciado.stats()["tokens_dia"] < 1
+    with pytest.raises(LLMUnavailable, match="Cupo diario"):
+        reiniciado.generate("cuatro")
+
+
+def _estado() -> dict:
+    # sin fecha ni histórico: hace falta el LLM
+    return {"question": "¿conviene comprar dólares?", "moneda": "USD",
+            "datos_procesados": {"moneda": "USD", "compra": 7300, "venta": 7400, "source": "cambioschaco"}}
+
+
+def test_sin_cupo_responde_solo_con_datos(monkeypatch):
+    gateway = _gateway(rpm=100, rpd=1, max_wait=1)
+    gateway.generate("consume el único turno del día")
+    monkeypatch.setattr(llm, "_gateway", gateway)
+    mcp = MCPRegistry()
+    mcp.register("llm.analyze", analyze_with_llm, async_func=analyze_with_llm_async)
+
+    for resultado in (analizar_con_llm(_estado(), mcp), asyncio.run(aanalizar_con_llm(_estado(), mcp))):
+        assert resultado["respaldo"] is True
+        assert resultado["reporte"].startswith("(Análisis con IA no disponible: Cupo diario del LLM agotado)")
+        assert "Compra 7300 | Venta 7400" in resultado["reporte"]
@@ -0,0 +1,76 @@
+import pytest
+
+from scripts.fakes import FakeChaco, pdf_paginas
+from src import resilience
+from src.tools.cotizaciones_tool import PdfTableCache
+
+pytest.importorskip("pdfplumber")
+
+ENCABEZADO = ["Moneda", "Compra", "Venta"]
+PAGINAS = [
+    [ENCABEZADO, ["Dolar americano USD", "7.300,00", "7.400,00"], ["Real BRL", "1.300,00", "1.400,00"]],
+    [ENCABEZADO, ["Euro EUR", "8.000,00", "8.200,00"], ["Peso argentino ARS", "5,50", "6,50"]],
+    [ENCABEZADO, ["Yen JPY", "47,00", "49,00"]],
+]
+
+
+@pytest.fixture(autouse=True)
+def circuitos_limpios(monkeypatch):
+    monkeypatch.setattr(resilience, "_circuitos", {})
+
+
+@pytest.fixture
+def chaco():
+    doble = FakeChaco()
+    doble.pdf = pdf_paginas(PAGINAS)
+    yield doble.start()
+    doble.stop()
+
+
+def test_304_conserva_lo_ya_parseado(chaco):
+    cache = PdfTableCache(chaco.url_pdf, ttl=0)           # revalida en cada consulta
+    assert cache.lookup("USD")["compra"] == 7300
+    assert cache.stats()["etag"]
+
+    assert cache.lookup("USD")["venta"] == 7400
+    assert chaco.requests["pdf"] == 2 and chaco.requests["no_modificado"] == 1
+    stats = cache.stats()
+    assert stats["descargas"] == 1 and stats["no_modificado"] == 1
+    assert stats["paginas_parseadas"] == 1                # no se volvió a parsear
+
+
+def test_mismo_contenido_sin_etag_no_se_reparsea(chaco):
+    chaco.etag = False
+    cache = PdfTableCache(chaco.url_pdf, ttl=0)
+    assert cache.lookup("USD")["compra"] == 7300
+    assert cache.lookup("USD")["compra"] == 7300
+    stats = cache.stats()
+    assert stats["descargas"] == 2 and stats["mismo_hash"] == 1 and stats["no_modificado"] == 0
+    assert stats["etag"] is None and stats["paginas_parseadas"] == 1
+
+
+def test_pdf_nuevo_descarta_lo_parseado(chaco):
+    cache = PdfTableCache(chaco.url_pdf, ttl=0)
+    assert cache.lookup("USD")["compra"] == 7300
+    chaco.pdf = pdf_paginas([[ENCABEZADO, ["Dolar americano USD", "7.310,00", "7.410,00"]]])
+    assert cache.lookup("USD")["compra"] == 7310
+    assert cache.lookup("EUR") is None                    # ya no está en el PDF vigente
+    assert cache.stats()["descargas"] == 2 and cache.stats()["paginas"] == 1
+
+
+def test_el_parseo_para_en_la_pagina_de_la_moneda_y_retoma_en_la_siguiente(chaco):
+    cache = PdfTableCache(chaco.url_pdf, ttl=3600)
+    assert cache.lookup("BRL")["venta"] == 1400
+    assert cache.stats()["paginas_parseadas"] == 1 and cache.stats()["paginas"] == 3
+
+    assert cache.lookup("USD")["compra"] == 7300         # misma página: sin parsear nada
+    assert cache.stats()["paginas_parseadas"] == 1
+    assert cache.lookup("ARS")["compra"] == 5.5          # retoma en la página 2, no desde el principio
+    assert cache.stats()["paginas_parseadas"] == 2
+
+    assert cache.lookup("CHF") is None                   # recorre lo que falta y no la encuentra
+    assert cache.stats()["paginas_parseadas"] == 3
+    assert cache.lookup("CHF") is None                   # PDF agotado: no se vuelve a parsear
+    assert sorted(f["moneda"] for f in cache.filas()) == ["ARS", "BRL", "EUR", "JPY", "USD"]
+    assert cache.stats()["paginas_parseadas"] == 3
+    assert chaco.requests["pdf"] == 1                    # dentro del TTL no se consulta el upstream
@@ -0,0 +1,203 @@
+import asyncio
+import socket
+import time
+
+import pytest
+import requests
+
+from src import resilience
+from src.llm import LLMGateway, LLMUnavailable
+from src.resilience import (ABIERTO, CERRADO, SEMIABIERTO, CircuitBreaker, CircuitOpen, DeadlineExceeded,
+                            circuito, con_deadline, en_presupuesto, nuevo_deadline, restante, sin_deadline,
+                            timeout_para, vencido)
+from src.tools.cotizaciones_tool import _upstream
+
+
+@pytest.fixture(autouse=True)
+def circuitos_limpios(monkeypatch):
+    # cada test arranca con los circuitos del proceso cerrados
+    monkeypatch.setattr(resilience, "_circuitos", {})
+
+
+# --- Circuit breaker ---
+def test_fallos_seguidos_abren_el_circuito():
+    c = CircuitBreaker("prueba", fallos=3, enfriamiento=60)
+    c.fallo()
+    c.fallo()
+    c.exito()                                    # un éxito reinicia la cuenta
+    c.fallo()
+    c.fallo()
+    assert c.estado == CERRADO
+    c.fallo()
+    assert c.estado == ABIERTO
+    assert not c.permitir()
+    with pytest.raises(CircuitOpen):
+        c.verificar()
+    assert c.stats()["rechazadas"] == 2
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba():
+    c = CircuitBreaker("prueba", fallos=1, enfriamiento=0.05)
+    c.fallo()
+    assert c.rechaza()
+    time.sleep(0.06)
+    assert c.estado == SEMIABIERTO
+    assert not c.rechaza()                       # consultar no toma el turno de prueba
+    assert c.permitir()
+    assert not c.permitir()
+    c.exito()
+    assert c.estado == CERRADO
+    assert c.permitir() and c.permitir()
+
+
+def test_si_la_prueba_falla_vuelve_a_abrirse():
+    c = CircuitBreaker("prueba", fallos=2, enfriamiento=0.05)
+    c.fallo()
+    c.fallo()
+    time.sleep(0.06)
+    assert c.permitir()
+    c.fallo()                                    # en semiabierto alcanza un fallo
+    assert c.estado == ABIERTO
+    assert c.stats()["aperturas"] == 2
+
+
+def test_neutro_libera_la_prueba_sin_cerrar_ni_abrir():
+    c = CircuitBreaker("prueba", fallos=1, enfriamiento=0.05)
+    c.fallo()
+    time.sleep(0.06)
+    assert c.permitir()
+    c.neutro()
+    assert c.estado == SEMIABIERTO
+    assert c.permitir()                          # la siguiente llamada puede hacer la prueba
+
+
+# --- Presupuesto de la request ---
+def test_restante_y_timeout_para_descuentan_del_deadline():
+    assert nuevo_deadline(0) is None
+    assert restante(5) == 5
+    with con_deadline(nuevo_deadline(0.2)):
+        assert 0 < restante(5) <= 0.2
+        assert timeout_para(5) <= 0.2
+        assert not vencido()
+        with sin_deadline():
+            assert restante(5) == 5
+        time.sleep(0.2)
+        assert restante(5) == 0
+        assert vencido()
+        with pytest.raises(DeadlineExceeded):
+            timeout_para(5)
+    assert restante(5) == 5
+
+
+def test_en_presupuesto_toma_el_deadline_del_estado():
+    @en_presupuesto
+    def nodo(state):
+        return restante(10)
+
+    @en_presupuesto
+    async def anodo(state):
+        return restante(10)
+
+    estado = {"deadline": nuevo_deadline(1)}
+    assert nodo(estado) <= 1
+    assert asyncio.run(anodo(estado)) <= 1
+    assert nodo({"deadline": None}) == 10
+
+
+# --- Clasificación de las requests a Cambios Chaco ---
+def _puerto_cerrado() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pedir(url: str, maximo: float = 4):
+    try:
+        with _upstream("chaco_prueba", maximo) as r:
+            r["status"] = str(requests.get(url, timeout=r["timeout"]).status_code)
+    except requests.RequestException:
+        pass
+
+
+def test_errores_de_red_cuentan_como_fallo_aunque_haya_deadline():
+    url = f"http://127.0.0.1:{_puerto_cerrado()}/"
+    # deadline menor que CHACO_TIMEOUT: el timeout se acorta, pero la conexión rechazada no es un timeout
+    with con_deadline(nuevo_deadline(2)):
+        for _ in range(3):
+            _pedir(url)
+    c = circuito("chaco_prueba")
+    assert c.estado == ABIERTO
+    with pytest.raises(CircuitOpen), con_deadline(nuevo_deadline(2)):
+        _pedir(url)
+
+
+def test_timeout_por_falta_de_presupuesto_es_neutro():
+    # el socket escucha pero nunca responde: la request agota su timeout
+    with socket.socket() as servidor:
+        servidor.bind(("127.0.0.1", 0))
+        servidor.listen(8)
+        url = f"http://127.0.0.1:{servidor.getsockname()[1]}/"
+        for _ in range(3):
+            with con_deadline(nuevo_deadline(0.2)):
+                _pedir(url)
+        c = circuito("chaco_prueba")
+        assert c.estado == CERRADO and c.stats()["fallos"] == 0
+
+        # el mismo timeout sin acortar por el deadline sí es un fallo del upstream
+        _pedir(url, maximo=0.2)
+        assert c.stats()["fallos"] == 1
+
+
+@pytest.mark.parametrize("status, resultado", [("200", "exitos"), ("404", "exitos"),
+                                               ("429", "fallos"), ("503", "fallos")])
+def test_codigos_de_respuesta(status, resultado):
+    with _upstream("chaco_prueba", 4) as r:
+        r["status"] = status
+    assert circuito("chaco_prueba").stats()[resultado] == 1
+
+
+def test_cancelacion_es_neutra():
+    with pytest.raises(asyncio.CancelledError):
+        with _upstream("chaco_prueba", 4):
+            raise asyncio.CancelledError()
+    stats = circuito("chaco_prueba").stats()
+    assert (stats["exitos"], stats["fallos"]) == (0, 0)
+
+
+# --- Clasificación de las llamadas al LLM ---
+class BackendLento:
+    nombre = "llm_prueba"
+
+    def __init__(self, segundos: float):
+        self.segundos = segundos
+
+    def generate(self, prompt, model, **kwargs):
+        time.sleep(self.segundos)
+        return "respuesta tardía"
+
+    async def agenerate(self, prompt, model, **kwargs):
+        await asyncio.sleep(self.segundos)
+        return "respuesta tardía"
+
+
+def test_llm_cortado_por_el_deadline_es_neutro():
+    gateway = LLMGateway(backend=BackendLento(0.5), cupo_path=None)
+
+    async def main():
+        with con_deadline(nuevo_deadline(0.15)):
+            await gateway.agenerate("hola")
+
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable, match="plazo"):
+            asyncio.run(main())
+    assert circuito("llm_prueba").stats()["fallos"] == 0
+
+
+def test_llm_sync_que_responde_despues_del_deadline_es_fallo():
+    gateway = LLMGateway(backend=BackendLento(0.3), cupo_path=None)
+    for _ in range(3):
+        with con_deadline(nuevo_deadline(0.15)):
+            assert gateway.generate("hola") == "respuesta tardía"
+    assert circuito("llm_prueba").estado == ABIERTO
+    with pytest.raises(LLMUnavailable, match="circuito abierto"), con_deadline(nuevo_deadline(5)):
+        gateway.generate("hola")
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+from src.tools.cotizaciones_tool import SnapshotCache
+
+FILAS = [{"moneda": "USD", "compra": 7000, "venta": 7100}, {"moneda": "EUR", "compra": 8000, "venta": 8200}]
+
+
+class Loader:
+    """Loader que cuenta llamadas; `demora` simula el upstream y `error` lo hace fallar."""
+
+    def __init__(self, filas=FILAS, demora=0.0):
+        self.filas, self.demora = filas, demora
+        self.llamadas = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.llamadas += 1
+        time.sleep(self.demora)
+        if self.error:
+            raise self.error
+        return [dict(f) for f in self.filas]
+
+
+def test_dentro_del_ttl_no_consulta_el_upstream():
+    loader = Loader()
+    cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+    rows, by_iso = cache.get()
+    assert [r["moneda"] for r in rows] == ["USD", "EUR"]
+    assert by_iso["EUR"]["venta"] == 8200
+    assert cache.lookup("USD")["compra"] == 7000
+    assert loader.llamadas == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+
+
+def test_vencido_sirve_el_snapshot_y_refresca_una_vez_en_segundo_plano():
+    loader = Loader()
+    cache = SnapshotCache(loader, ttl=0.05, stale_ttl=60)
+    cache.get()
+    time.sleep(0.06)
+    loader.filas, loader.demora = [{"moneda": "USD", "compra": 7050, "venta": 7150}], 0.2
+
+    t0 = time.monotonic()
+    respuestas = [cache.lookup("USD")["compra"] for _ in range(5)]
+    assert time.monotonic() - t0 < 0.15          # nadie esperó al refresco
+    assert respuestas == [7000] * 5
+    assert cache.stats()["stale_hits"] == 5
+
+    deadline = time.monotonic() + 2
+    while cache.lookup("USD")["compra"] != 7050 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert cache.lookup("USD")["compra"] == 7050
+    assert loader.llamadas == 2                  # un solo refresco para las cinco lecturas vencidas
+
+
+def test_sin_snapshot_las_llamadas_concurrentes_comparten_una_consulta():
+    loader = Loader(demora=0.2)
+    cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+    resultados = []
+
+    def leer():
+        resultados.append(cache.lookup("EUR"))
+
+    hilos = [threading.Thread(target=leer) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert loader.llamadas == 1
+    assert all(r and r["compra"] == 8000 for r in resultados)
+
+
+def test_si_el_refresco_falla_sigue_el_ultimo_snapshot_bueno():
+    loader = Loader()
+    cache = SnapshotCache(loader, ttl=0.01, stale_ttl=0.01)
+    cache.get()
+    time.sleep(0.03)
+    loader.error = ConnectionError("upstream caído")
+    rows, _ = cache.get()
+    assert [r["moneda"] for r in rows] == ["USD", "EUR"]
+    assert cache.stats()["errors"] == 1
+    assert cache.edad() >= 0.03
+
+
+def test_respuesta_vacia_no_pisa_un_snapshot_valido():
+    loader = Loader()
+    cache = SnapshotCache(loader, ttl=0.01, stale_ttl=0.01)
+    cache.get()
+    time.sleep(0.03)
+    loader.filas = []
+    assert cache.lookup("USD")["compra"] == 7000
+
+
+def test_modo_externo_no_consulta_el_upstream():
+    loader = Loader()
+    cache = SnapshotCache(loader, ttl=0.01, stale_ttl=0.01)
+    cache.externo = True
+    assert cache.get() == ([], {})
+    cache.publicar([{"moneda": "BRL", "compra": 1300, "venta": 1400}], edad=3600)
+    assert cache.lookup("BRL")["venta"] == 1400
+    assert loader.llamadas == 0
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_aget_comparte_una_sola_tarea_de_refresco():
+    llamadas = []
+
+    async def aloader():
+        llamadas.append(1)
+        await asyncio.sleep(0.05)
+        return [dict(f) for f in FILAS]
+
+    cache = SnapshotCache(Loader(), ttl=60, stale_ttl=60, aloader=aloader)
+
+    async def main():
+        return await asyncio.gather(*(cache.alookup("USD") for _ in range(10)))
+
+    resultados = asyncio.run(main())
+    assert len(llamadas) == 1
+    assert all(r["compra"] == 7000 for r in resultados)
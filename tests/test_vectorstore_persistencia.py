@@ -0,0 +1,143 @@
+import json
+import os
+import pickle
+import sqlite3
+
+import numpy as np
+import pytest
+
+from src.rag.encoders import HashingEncoder
+from src.rag.vectorstore import DOCS_FILE, EMBEDDINGS_FILE, MANIFEST_FILE, SimpleVectorStore
+
+
+def _doc(i: int, moneda: str = "USD") -> dict:
+    fecha = f"2025-08-{i % 28 + 1:02d}"
+    return {"id": f"{moneda}-{i}", "text": f"El {fecha} la cotización de {moneda} fue {7000 + i} guaraníes",
+            "meta": {"moneda": moneda, "fecha": fecha}}
+
+
+def _store(**kwargs) -> SimpleVectorStore:
+    return SimpleVectorStore(model_name="hashing", model=HashingEncoder(), **kwargs)
+
+
+def _ids(resultados) -> list:
+    return [r["doc"]["id"] for r in resultados]
+
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_save_y_load_devuelven_las_mismas_busquedas(tmp_path, quantization):
+    store = _store(quantization=quantization)
+    store.upsert([_doc(i) for i in range(20)] + [_doc(i, "EUR") for i in range(20)])
+    path = str(tmp_path / "vs")
+    store.save(path)
+
+    cargado = _store(quantization=quantization)
+    cargado.load(path)
+    assert len(cargado) == 40
+    assert isinstance(cargado.embeddings, np.memmap)   # se abre con mmap, no se copia al heap
+    for pregunta, where in (("cotización de USD el 2025-08-05", None), ("EUR", {"moneda": "EUR"})):
+        assert _ids(cargado.query(pregunta, k=5, where=where)) == _ids(store.query(pregunta, k=5, where=where))
+
+
+def test_save_sobre_el_mismo_directorio_solo_agrega_filas(tmp_path):
+    store = _store()
+    store.upsert([_doc(i) for i in range(10)])
+    path = str(tmp_path / "vs")
+    store.save(path)
+    inodo = os.stat(os.path.join(path, EMBEDDINGS_FILE)).st_ino
+
+    store.upsert([_doc(i) for i in range(10, 15)])
+    store.save(path)
+    assert os.stat(os.path.join(path, EMBEDDINGS_FILE)).st_ino == inodo   # mismo archivo, no reescritura
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        assert json.load(f)["count"] == 15
+
+    cargado = _store()
+    cargado.load(path)
+    assert len(cargado) == 15
+    assert _ids(cargado.query("USD 2025-08-14", k=1)) == _ids(store.query("USD 2025-08-14", k=1))
+
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_save_vuelve_a_mapear_la_matriz_tras_escribir(tmp_path, quantization):
+    path = str(tmp_path / "vs")
+    inicial = _store(quantization=quantization)
+    inicial.upsert([_doc(i) for i in range(10)])
+    inicial.save(path)
+    store = _store(quantization=quantization)
+    store.load(path)
+
+    store.upsert([_doc(i, "EUR") for i in range(5)])
+    assert not isinstance(store.embeddings, np.memmap)   # la escritura copió la matriz al heap
+    esperado = _ids(store.query("EUR 2025-08-03", k=3))
+    store.save(path)
+    assert isinstance(store.embeddings, np.memmap)       # y el save la devuelve al mmap compartido
+    if quantization != "float32":
+        assert isinstance(store._qmatrix, np.memmap)
+    assert _ids(store.query("EUR 2025-08-03", k=3)) == esperado
+
+    # se puede seguir escribiendo sobre el store re-mapeado
+    store.upsert([_doc(i, "BRL") for i in range(3)])
+    store.save(path)
+    assert len(store) == 18 and isinstance(store.embeddings, np.memmap)
+
+
+def test_un_save_interrumpido_no_deja_filas_a_medias(tmp_path):
+    store = _store()
+    store.upsert([_doc(i) for i in range(10)])
+    path = str(tmp_path / "vs")
+    store.save(path)
+
+    # corte a mitad de un append: bytes y una fila en SQLite de más, sin actualizar el manifest
+    with open(os.path.join(path, EMBEDDINGS_FILE), "ab") as f:
+        f.write(b"\x00" * 1000)
+    with sqlite3.connect(os.path.join(path, DOCS_FILE)) as conn:
+        conn.execute("INSERT INTO docs VALUES (10, 'basura', 'fila a medias', '{}', 0)")
+    conn.close()
+
+    cargado = _store()
+    cargado.load(path)
+    assert len(cargado) == 10
+    assert "basura" not in {d["id"] for d in cargado.live_docs()}
+
+    # el próximo save descarta lo que quedó de la escritura interrumpida
+    cargado.upsert([_doc(i) for i in range(10, 12)])
+    cargado.save(path)
+    otro = _store()
+    otro.load(path)
+    assert sorted(d["id"] for d in otro.live_docs()) == sorted(f"USD-{i}" for i in range(12))
+    assert otro.embeddings.shape == (12, 384)
+
+
+def test_reescritura_completa_ignora_un_directorio_temporal_viejo(tmp_path):
+    path = str(tmp_path / "vs")
+    os.makedirs(path + ".tmp")
+    with open(os.path.join(path + ".tmp", "resto"), "w") as f:
+        f.write("de un save cortado")
+    store = _store()
+    store.upsert([_doc(i) for i in range(5)])
+    store.save(path)
+    assert not os.path.exists(path + ".tmp")
+    cargado = _store()
+    cargado.load(path)
+    assert len(cargado) == 5
+
+
+def test_load_rechaza_otro_modelo(tmp_path):
+    store = _store()
+    store.upsert([_doc(0)])
+    path = str(tmp_path / "vs")
+    store.save(path)
+    with pytest.raises(ValueError, match="hashing"):
+        SimpleVectorStore(model_name="otro-modelo", model=HashingEncoder()).load(path)
+
+
+def test_load_del_pickle_anterior(tmp_path):
+    docs = [_doc(i) for i in range(4)]
+    path = str(tmp_path / "vectorstore.pkl")
+    with open(path, "wb") as f:
+        pickle.dump({"docs": docs, "embeddings": HashingEncoder().encode([d["text"] for d in docs])}, f)
+    store = _store()
+    store.load(path)
+    assert len(store) == 4
+    assert _ids(store.query(docs[2]["text"], k=1)) == ["USD-2"]
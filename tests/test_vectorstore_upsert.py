@@ -0,0 +1,128 @@
+import threading
+
+import numpy as np
+import pytest
+
+from src.rag.encoders import HashingEncoder
+from src.rag.vectorstore import SimpleVectorStore
+
+
+class EncoderContador(HashingEncoder):
+    """HashingEncoder que cuenta los textos codificados."""
+
+    def __init__(self):
+        super().__init__()
+        self.textos = 0
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        self.textos += len(texts)
+        return super().encode(texts)
+
+
+def _doc(i: int, texto: str = "", **meta) -> dict:
+    return {"id": str(i), "text": texto or f"cotización USD número {i}",
+            "meta": {"moneda": "USD", "fecha": f"2025-08-{i % 28 + 1:02d}", **meta}}
+
+
+def _store(**kwargs) -> SimpleVectorStore:
+    return SimpleVectorStore(model_name="hashing", model=EncoderContador(), **kwargs)
+
+
+def test_upsert_solo_codifica_textos_nuevos_o_modificados():
+    store = _store()
+    assert store.upsert([_doc(i) for i in range(10)])["insertados"] == 10
+    assert store.model.textos == 10
+
+    res = store.upsert([_doc(0), _doc(1, origen="recolector"), _doc(2, "texto nuevo del 2"), _doc(10)])
+    assert res == {"insertados": 1, "actualizados": 2, "sin_cambios": 1, "codificados": 2}
+    assert store.model.textos == 12          # el cambio solo de meta reutiliza el embedding
+    assert len(store) == 11
+
+    docs = {d["id"]: d for d in store.live_docs()}
+    assert docs["1"]["meta"]["origen"] == "recolector"
+    assert docs["2"]["text"] == "texto nuevo del 2"
+    assert [r["doc"]["text"] for r in store.query("texto nuevo del 2", k=1)] == ["texto nuevo del 2"]
+
+
+def test_ids_repetidos_en_un_mismo_upsert_gana_el_ultimo():
+    store = _store()
+    store.upsert([_doc(1, "primero"), _doc(1, "segundo")])
+    assert [d["text"] for d in store.live_docs()] == ["segundo"]
+
+
+def test_delete_deja_lapidas_que_no_aparecen_en_las_busquedas():
+    store = _store(compact_ratio=0)
+    store.upsert([_doc(i) for i in range(6)])
+    assert store.delete(["2", "3", "no-existe"]) == 2
+    assert len(store) == 4
+    assert len(store.docs) == 6                  # siguen como filas muertas hasta compactar
+    vistos = {r["doc"]["id"] for r in store.query("cotización USD número 2", k=6)}
+    assert vistos == {"0", "1", "4", "5"}
+    filtrados = store.query_many(["USD"], k=6, where=[{"fecha": {"desde": "2025-08-03", "hasta": "2025-08-04"}}])
+    assert filtrados == [[]]
+
+
+def test_compact_automatico_y_busquedas_despues():
+    store = _store(compact_ratio=0.25)
+    store.upsert([_doc(i) for i in range(8)])
+    store.delete(["0", "1"])                     # 2/8 no supera el umbral
+    assert len(store.docs) == 8
+    store.delete(["2"])                          # 3/8 sí: se compacta
+    assert len(store.docs) == len(store) == 5
+    assert store.embeddings.shape[0] == 5
+    assert {r["doc"]["id"] for r in store.query("USD", k=10, where={"moneda": "USD"})} == {"3", "4", "5", "6", "7"}
+    store.upsert([_doc(3, "actualizado")])
+    assert [r["doc"]["id"] for r in store.query("actualizado", k=1)] == ["3"]
+
+
+def test_lapidas_y_compactacion_persisten(tmp_path):
+    path = str(tmp_path / "vs")
+    store = _store(compact_ratio=0)
+    store.upsert([_doc(i) for i in range(6)])
+    store.save(path)
+    store.delete(["1"])
+    store.save(path)                             # append: solo marca la lápida
+    cargado = _store(compact_ratio=0)
+    cargado.load(path)
+    assert sorted(d["id"] for d in cargado.live_docs()) == ["0", "2", "3", "4", "5"]
+
+    cargado.compact()
+    cargado.save(path)                           # numeración nueva: reescritura completa
+    otro = _store()
+    otro.load(path)
+    assert len(otro.docs) == len(otro) == 5
+
+
+def test_dimension_distinta_se_rechaza():
+    store = _store()
+    store.upsert([_doc(0)])
+    with pytest.raises(ValueError, match="Dimensión"):
+        store.upsert([_doc(1)], embeddings=np.ones((1, 8), dtype=np.float32))
+
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_busquedas_concurrentes_con_upsert_y_compactacion(quantization):
+    store = _store(compact_ratio=0.1, quantization=quantization)
+    store.upsert([_doc(i) for i in range(300)])
+    errores, listo = [], threading.Event()
+
+    def lector():
+        while not listo.is_set():
+            try:
+                for r in store.query("cotización USD número 7", k=5, where={"moneda": "USD"}):
+                    assert r["doc"]["meta"]["moneda"] == "USD"
+                store.query_many(["USD 1", "USD 2"], k=3, where=[{"fecha": {"desde": "2025-08-02"}}, None])
+            except Exception as e:               # cualquier error de índices a medias
+                errores.append(repr(e))
+
+    hilos = [threading.Thread(target=lector) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    rng = np.random.default_rng(0)
+    for ronda in range(100):
+        store.upsert([_doc(int(i), f"ronda {ronda} doc {i}") for i in rng.integers(0, 600, 10)])
+        store.delete([str(i) for i in rng.integers(0, 600, 10)])
+    listo.set()
+    for h in hilos:
+        h.join()
+    assert errores == []